@@ -0,0 +1,70 @@
+import argparse
+import json
+import time
+
+import redis
+
+from utils.utils import *
+from utils.bars import DEFAULT_INTERVALS, BarAggregator, CrossVenueSpreads
+from utils.codec import decode_record
+from utils.metrics import serve_metrics
+from utils.publisher import build_publisher
+from utils.ticker_store import bar_channel, bar_latest_key, split_channel
+
+
+def run_aggregator(config, logger, pattern='*:channel:ticker:*'):
+    """
+    订阅全部 ticker 频道，为每个交易所价格与每个跨交易所价差（百分比）维护 1s / 1m / 5m 等周期的 K 线，
+    已完成的 K 线发布到 bar:channel:<周期>s:<series> 并写入 bar:latest:<周期>s；Redis 断开后自动重连
+    """
+    rds = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+    publisher = build_publisher(rds, config, logger, name='bars')
+
+    def on_bar(interval, series, bar):
+        publisher.publish(bar_channel(interval, series), json.dumps(bar), latest=(bar_latest_key(interval), series))
+
+    bars = BarAggregator(config.get('bar_intervals') or DEFAULT_INTERVALS,
+                         rolling_bars=config.get('bar_rolling', 60), on_bar=on_bar,
+                         idle_ms=config.get('bar_idle_ms', 5000))
+    spreads = CrossVenueSpreads()
+    grace_ms = config.get('bar_grace_ms', 200)
+    try:
+        while True:
+            pubsub = rds.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(pattern)
+                logger.info(f"开始聚合: {pattern} 周期={bars.intervals}")
+                while True:
+                    message = pubsub.get_message(timeout=0.1)
+                    if message is not None and message['type'] == 'pmessage':
+                        record = decode_record(message['data'])
+                        if record is not None and record.get('last_price') is not None:
+                            exchange, symbol = split_channel(message['channel'])
+                            price = float(record['last_price'])
+                            ts_ms = float(record.get('ts') or record.get('recv_ms') or time.time() * 1000)
+                            bars.update(f"{exchange}:{symbol}", price, ts_ms)
+                            for a, b, _, spread_pct, spread_ts in spreads.update(exchange, symbol, price, ts_ms):
+                                bars.update(f"spread:{symbol}:{a}:{b}", spread_pct, spread_ts)
+                    bars.sweep(time.time() * 1000, grace_ms)
+            except redis.RedisError as e:
+                logger.error(f"Redis 异常: {e}，5秒后重连")
+                time.sleep(5)
+            finally:
+                pubsub.close()
+    finally:
+        publisher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="K 线聚合进程：由 ticker 频道生成各交易所价格与跨交易所价差的 OHLC")
+    parser.add_argument('--pattern', default='*:channel:ticker:*', help='订阅的频道模式')
+    args = parser.parse_args()
+
+    config = read_config('config.yml')
+    logger = setup_logger('aggregator')
+    serve_metrics(config, 'aggregator', logger)
+
+    try:
+        run_aggregator(config, logger, args.pattern)
+    except KeyboardInterrupt:
+        logger.info("Stopping...")
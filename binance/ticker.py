@@ -1,35 +1,92 @@
 import websocket
-import json
 import time
 import argparse
 from datetime import datetime
 import redis
 from utils.utils import *
+from utils.collector import ExchangeAdapter
+from utils.publisher import build_publisher
+from utils.metrics import FeedMetrics, build_log_sampler, serve_metrics
+from utils.quotes import build_quote_table
+from utils.ticker_store import receive_stamp
+from utils.decoder import Struct, make_frame_parser
+from typing import Optional
 
 
 
-def save_ticker_to_redis(rds, symbol, last_price):
+def save_ticker_to_redis(publisher, symbol, record, recv):
     """
-    只推送ticker数据到 Redis Channel（不做缓存）
+    推送ticker数据到 Redis Channel，并更新 binance:ticker:latest 最新值缓存，publisher 负责批量发送
+    record 含 last_price 与交易所事件时间 ts（毫秒），recv 为 receive_stamp() 的本地收到时间
     """
-    value = json.dumps({
-        "last_price": last_price,
-    }, ensure_ascii=False)
-    rds.publish(f"binance:channel:ticker:{symbol}", value)
+    record.update(recv)
+    publisher.publish_ticker("binance", symbol, record)
 
-def on_message(ws, message):
-    data = json.loads(message)
+# 每个 symbol 订阅的 stream：24 小时 ticker 给出最新成交价，bookTicker 给出买一 / 卖一（ticker 流不含盘口）
+STREAMS = ('ticker', 'bookTicker')
+
+def stream_names(symbols, streams=STREAMS):
+    return [f"{symbol.lower()}@{stream}" for symbol in symbols for stream in streams]
 
+def parse_ticker(data):
+    """
+    解析组合流消息，返回 [(symbol, record), ...]；非行情消息返回 None
+    ticker 帧 record: last_price, ts（事件时间 E，毫秒）, xseq（最后成交 ID L，可用于发现缺口）
+    bookTicker 帧 record: bid, bid_size, ask, ask_size, ts，不含 last_price（由采集端按 symbol 与上一条合并）
+    """
     if 'data' in data and 'stream' in data:
         ticker = data['data']
-        symbol = ticker['s']
-        last_price = ticker['c']
-        if debug:
-            logger.info(f"交易对: {symbol} 最新价: {last_price}")
-            pass
-        save_ticker_to_redis(rds, symbol, last_price)
+        if ticker.get('e') == 'bookTicker':
+            return [(ticker['s'], {"bid": ticker['b'], "bid_size": ticker['B'], "ask": ticker['a'],
+                                   "ask_size": ticker['A'], "ts": ticker.get('E')})]
+        return [(ticker['s'], {"last_price": ticker['c'], "ts": ticker.get('E'), "xseq": ticker.get('L')})]
+    return None
+
+class TickerMsg(Struct):
+    s: str
+    e: str = ""
+    c: Optional[str] = None
+    E: Optional[int] = None
+    L: Optional[int] = None
+    b: Optional[str] = None
+    B: Optional[str] = None
+    a: Optional[str] = None
+    A: Optional[str] = None
+
+class StreamMsg(Struct):
+    stream: str
+    data: TickerMsg
+
+def typed_ticks(msg):
+    t = msg.data
+    if t.e == 'bookTicker':
+        return [(t.s, {"bid": t.b, "bid_size": t.B, "ask": t.a, "ask_size": t.A, "ts": t.E})]
+    return [(t.s, {"last_price": t.c, "ts": t.E, "xseq": t.L})]
+
+# 有 msgspec 时按 StreamMsg 只解出用到的字段，否则整帧解码后走 parse_ticker
+parse_frame = make_frame_parser(parse_ticker, StreamMsg, typed_ticks)
+
+def on_message(ws, message):
+    recv = receive_stamp()
+    started = time.perf_counter()
+    ticks, data = parse_frame(message)
+    feed.frame(time.perf_counter() - started)
+    if ticks is not None:
+        for symbol, record in ticks:
+            feed.tick(symbol)
+            record.update(recv)
+            if quotes.update(symbol, record, recv["recv_ms"]) is None:
+                continue
+            if debug and tick_log.due(symbol):
+                logger.info(f"交易对: {symbol} 最新价: {record['last_price']}")
+            save_ticker_to_redis(publisher, symbol, record, recv)
+            feed.published(symbol)
     else:
         logger.warning(f"收到未知消息: {message}")
+    # 限频窗口内推迟的记录：该连接收到任意一帧时检查是否到期（collector.py 中由定时任务补发）
+    for symbol, record in quotes.due():
+        save_ticker_to_redis(publisher, symbol, record, {})
+        feed.published(symbol)
 
 def on_error(ws, error):
     logger.error(f"Error: {error}")
@@ -41,8 +98,38 @@ def on_close(ws, close_status_code, close_msg):
 def on_open(ws):
     logger.info("WebSocket连接已打开。")
 
+class BinanceAdapter(ExchangeAdapter):
+    name = "binance"
+    # 组合流单连接最多 200 个 stream，且全部写在 URL 里；每个 symbol 占 ticker + bookTicker 两个
+    max_symbols_per_conn = 100
+    _request_id = 0
+
+    def build_url(self, symbols):
+        if not symbols:
+            return "wss://fstream.binance.com/stream"
+        streams = '/'.join(stream_names(symbols))
+        return f"wss://fstream.binance.com/stream?streams={streams}"
+
+    frame_parser = staticmethod(parse_frame)
+
+    def _stream_request(self, method, symbols):
+        BinanceAdapter._request_id += 1
+        return [{"method": method, "params": stream_names(symbols), "id": self._request_id}]
+
+    def build_resubscribe(self, symbols):
+        # 已建立的组合流连接上用 SUBSCRIBE 追加 stream，重连时会通过 URL 一并订阅
+        return self._stream_request("SUBSCRIBE", symbols)
+
+    def build_unsubscribe(self, symbols):
+        return self._stream_request("UNSUBSCRIBE", symbols)
+
+    def on_other(self, data):
+        if not ('result' in data and 'id' in data):
+            self.logger.warning(f"[{self.name}] 收到未知消息: {str(data)[:200]}")
+
 def run_ws(symbols, use_proxy=False, proxy_host=None, proxy_port=None, proxy_type=None):
-    streams = '/'.join([f"{symbol.lower()}@ticker" for symbol in symbols])
+    # ticker 给出最新成交价，bookTicker 给出买一 / 卖一，与 BinanceAdapter 一致
+    streams = '/'.join(stream_names(symbols))
     url = f"wss://fstream.binance.com/stream?streams={streams}"
     logger.info(f"连接URL: {url}")
     ws = websocket.WebSocketApp(
@@ -70,7 +157,13 @@ if __name__ == "__main__":
 
     logger = setup_logger('binance_ticker')
     rds = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+    publisher = build_publisher(rds, config, logger)
+    quotes = build_quote_table(config)
     debug = config['debug']
+    # 采集指标与逐条行情日志采样（见 utils/metrics.py）
+    feed = FeedMetrics('binance')
+    tick_log = build_log_sampler(config)
+    serve_metrics(config, 'binance', logger)
 
 
     while True:
@@ -83,6 +176,7 @@ if __name__ == "__main__":
             )
         except Exception as e:
             logger.error(f"连接异常: {e}")
+        feed.reconnect()
         logger.info("5秒后重试连接...")
         time.sleep(5)
 
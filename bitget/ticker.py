@@ -5,20 +5,26 @@ import argparse
 from datetime import datetime
 import redis
 from utils.utils import *
+from utils.collector import ExchangeAdapter
+from utils.publisher import build_publisher
+from utils.metrics import FeedMetrics, build_log_sampler, serve_metrics
+from utils.quotes import build_quote_table
+from utils.ticker_store import receive_stamp
+from utils.decoder import Struct, make_frame_parser
+from typing import List, Optional
 
 
 WS_URL = "wss://ws.bitget.com/v2/ws/public"
 
 
 
-def save_ticker_to_redis(rds, symbol, last_price):
+def save_ticker_to_redis(publisher, symbol, record, recv):
     """
-    只推送ticker数据到 Redis Channel（不做缓存）
+    推送ticker数据到 Redis Channel，并更新 bitget:ticker:latest 最新值缓存，publisher 负责批量发送
+    record 含 last_price 与交易所事件时间 ts（毫秒），recv 为 receive_stamp() 的本地收到时间
     """
-    value = json.dumps({
-        "last_price": last_price,
-    }, ensure_ascii=False)
-    rds.publish(f"bitget:channel:ticker:{symbol}", value)
+    record.update(recv)
+    publisher.publish_ticker("bitget", symbol, record)
 
 def build_sub_args_ticker(symbols):
     return [
@@ -29,21 +35,74 @@ def build_sub_args_ticker(symbols):
         } for symbol in symbols
     ]
 
-def on_message_ticker(ws, message):
-    data = json.loads(message)
+def parse_ticker(data):
+    """
+    解析 ticker 频道的 snapshot/update 消息，返回 [(symbol, record), ...]；非行情消息返回 None
+    record: last_price, bid, bid_size, ask, ask_size（买一 / 卖一，空串视为缺失）, ts（毫秒）
+    """
     if "action" in data and data.get("action") in ("snapshot", "update"):
         arg = data.get("arg", {})
         if arg.get("channel") == "ticker":
             inst_id = arg.get("instId")
-            for t in data.get("data", []):
-                last_price = t.get("lastPr")
+            ts = data.get("ts")
+            return [(inst_id, {"last_price": t.get("lastPr"), "bid": t.get("bidPr") or None,
+                               "bid_size": t.get("bidSz") or None, "ask": t.get("askPr") or None,
+                               "ask_size": t.get("askSz") or None, "ts": int(t["ts"]) if t.get("ts") else ts})
+                    for t in data.get("data", [])]
+        return []
+    return None
+
+class TickerArg(Struct):
+    channel: str
+    instId: str
+
+class TickerData(Struct):
+    lastPr: str
+    bidPr: str = ""
+    bidSz: str = ""
+    askPr: str = ""
+    askSz: str = ""
+    ts: str = ""
+
+class TickerMsg(Struct):
+    action: str
+    arg: TickerArg
+    data: List[TickerData]
+    ts: Optional[int] = None
+
+def typed_ticks(msg):
+    if msg.action not in ("snapshot", "update") or msg.arg.channel != "ticker":
+        return None
+    inst_id = msg.arg.instId
+    return [(inst_id, {"last_price": t.lastPr, "bid": t.bidPr or None, "bid_size": t.bidSz or None,
+                       "ask": t.askPr or None, "ask_size": t.askSz or None, "ts": int(t.ts) if t.ts else msg.ts})
+            for t in msg.data]
+
+# 有 msgspec 时按 TickerMsg 只解出用到的字段，否则整帧解码后走 parse_ticker
+parse_frame = make_frame_parser(parse_ticker, TickerMsg, typed_ticks)
 
-                if debug:
-                    logger.info(f"交易对: {inst_id} 最新价: {last_price}")
-                save_ticker_to_redis(rds, inst_id, last_price)
+def on_message_ticker(ws, message):
+    recv = receive_stamp()
+    started = time.perf_counter()
+    ticks, data = parse_frame(message)
+    feed.frame(time.perf_counter() - started)
+    if ticks is not None:
+        for inst_id, record in ticks:
+            feed.tick(inst_id)
+            record.update(recv)
+            if quotes.update(inst_id, record, recv["recv_ms"]) is None:
+                continue
+            if debug and tick_log.due(inst_id):
+                logger.info(f"交易对: {inst_id} 最新价: {record['last_price']}")
+            save_ticker_to_redis(publisher, inst_id, record, recv)
+            feed.published(inst_id)
     else:
         if debug:
             logger.debug(f"收到未知消息: {message}")
+    # 限频窗口内推迟的记录：该连接收到任意一帧时检查是否到期（collector.py 中由定时任务补发）
+    for inst_id, record in quotes.due():
+        save_ticker_to_redis(publisher, inst_id, record, {})
+        feed.published(inst_id)
 
 def on_error_ticker(ws, error):
     logger.error(f"Error: {error}")
@@ -60,6 +119,25 @@ def on_open_ticker(ws):
     }
     ws.send(json.dumps(sub))
 
+class BitgetAdapter(ExchangeAdapter):
+    name = "bitget"
+    url = WS_URL
+    app_ping = "ping"
+    # 官方建议单连接订阅少于 50 个频道
+    max_symbols_per_conn = 50
+
+    def build_subscribe(self, symbols):
+        return [{"op": "subscribe", "args": build_sub_args_ticker(symbols)}]
+
+    def build_unsubscribe(self, symbols):
+        return [{"op": "unsubscribe", "args": build_sub_args_ticker(symbols)}]
+
+    frame_parser = staticmethod(parse_frame)
+
+    def on_other(self, data):
+        if data.get("event") == "error":
+            self.logger.error(f"[{self.name}] 订阅错误: {data}")
+
 def run_ws_ticker(symbols_list, use_proxy=False, proxy_host=None, proxy_port=None, proxy_type=None):
     global symbols_ticker
     symbols_ticker = symbols_list
@@ -90,7 +168,13 @@ if __name__ == "__main__":
 
     logger = setup_logger('bitget_ticker')
     rds = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+    publisher = build_publisher(rds, config, logger)
+    quotes = build_quote_table(config)
     debug = config["debug"]
+    # 采集指标与逐条行情日志采样（见 utils/metrics.py）
+    feed = FeedMetrics('bitget')
+    tick_log = build_log_sampler(config)
+    serve_metrics(config, 'bitget', logger)
 
     while True:
         try:
@@ -102,5 +186,6 @@ if __name__ == "__main__":
             )
         except Exception as e:
             logger.error(f"连接异常: {e}")
+        feed.reconnect()
         logger.info("5秒后重试连接...")
         time.sleep(5)
\ No newline at end of file
@@ -6,38 +6,90 @@ import logging
 from datetime import datetime
 import redis
 from utils.utils import *
+from utils.collector import ExchangeAdapter
+from utils.publisher import build_publisher
+from utils.metrics import FeedMetrics, build_log_sampler, serve_metrics
+from utils.quotes import build_quote_table
+from utils.ticker_store import receive_stamp
+from utils.decoder import Struct, make_frame_parser
+from typing import Optional
 
 
-previous_last_price=None
-
-
-def save_ticker_to_redis(rds, symbol, last_price):
+def save_ticker_to_redis(publisher, symbol, record, recv):
     """
-    只推送ticker数据到 Redis Channel（不做缓存）
+    推送ticker数据到 Redis Channel，并更新 bybit:ticker:latest 最新值缓存，publisher 负责批量发送
+    record 含 last_price 与交易所事件时间 ts（毫秒），recv 为 receive_stamp() 的本地收到时间
     """
-    value = json.dumps({
-        "last_price": last_price,
-    }, ensure_ascii=False)
-    rds.publish(f"bybit:channel:ticker:{symbol}", value)
+    record.update(recv)
+    publisher.publish_ticker("bybit", symbol, record)
 
 
-def on_message(ws, message):
-    global previous_last_price
-    data = json.loads(message)
+def parse_ticker(data):
+    """
+    解析 tickers.* 主题消息，返回 [(symbol, record), ...]；delta 帧中没有变化的字段为 None
+    record: last_price, bid, bid_size, ask, ask_size（买一 / 卖一）, ts（毫秒）, xseq（cross sequence cs）
+    """
     topic = data.get("topic", "")
     if topic.startswith("tickers."):
         ticker = data.get("data", {})
         symbol = ticker.get("symbol") or ticker.get("s")
         last_price = ticker.get("lastPrice") or ticker.get("last_price") or ticker.get("lp")
-        if last_price==None:
-            last_price=previous_last_price
-        else:
-            previous_last_price=last_price
-        if debug:
-            logger.info(f"交易对: {symbol} 最新价: {last_price}")
-        save_ticker_to_redis(rds, symbol, last_price)
+        return [(symbol, {"last_price": last_price, "bid": ticker.get("bid1Price"), "bid_size": ticker.get("bid1Size"),
+                          "ask": ticker.get("ask1Price"), "ask_size": ticker.get("ask1Size"),
+                          "ts": data.get("ts"), "xseq": data.get("cs")})]
+    return None
+
+
+class TickerData(Struct):
+    symbol: str
+    lastPrice: Optional[str] = None
+    bid1Price: Optional[str] = None
+    bid1Size: Optional[str] = None
+    ask1Price: Optional[str] = None
+    ask1Size: Optional[str] = None
+
+
+class TickerMsg(Struct):
+    topic: str
+    data: TickerData
+    ts: Optional[int] = None
+    cs: Optional[int] = None
+
+
+def typed_ticks(msg):
+    if not msg.topic.startswith("tickers."):
+        return None
+    t = msg.data
+    return [(t.symbol, {"last_price": t.lastPrice, "bid": t.bid1Price, "bid_size": t.bid1Size,
+                        "ask": t.ask1Price, "ask_size": t.ask1Size, "ts": msg.ts, "xseq": msg.cs})]
+
+
+# 有 msgspec 时按 TickerMsg 只解出用到的字段，否则整帧解码后走 parse_ticker
+parse_frame = make_frame_parser(parse_ticker, TickerMsg, typed_ticks)
+
+
+def on_message(ws, message):
+    recv = receive_stamp()
+    started = time.perf_counter()
+    ticks, data = parse_frame(message)
+    feed.frame(time.perf_counter() - started)
+    if ticks is not None:
+        # delta 帧只带变化的字段，按 symbol 用状态表补齐（不能跨 symbol 沿用上一条的价格）
+        for symbol, record in ticks:
+            feed.tick(symbol)
+            record.update(recv)
+            if quotes.update(symbol, record, recv["recv_ms"]) is None:
+                continue
+            if debug and tick_log.due(symbol):
+                logger.info(f"交易对: {symbol} 最新价: {record['last_price']}")
+            save_ticker_to_redis(publisher, symbol, record, recv)
+            feed.published(symbol)
     else:
         logger.warning(f"收到未知消息: {message}")
+    # 限频窗口内推迟的记录：该连接收到任意一帧时检查是否到期（collector.py 中由定时任务补发）
+    for symbol, record in quotes.due():
+        save_ticker_to_redis(publisher, symbol, record, {})
+        feed.published(symbol)
 
 def on_error(ws, error):
     logger.error(f"Error: {error}")
@@ -53,6 +105,31 @@ def on_open(ws):
     ws.send(json.dumps(sub_msg))
     logger.info(f"已订阅: {args}")
 
+class BybitAdapter(ExchangeAdapter):
+    name = "bybit"
+    url = "wss://stream.bybit.com/v5/public/linear"
+    app_ping = {"op": "ping"}
+    max_symbols_per_conn = 100
+    # 单条 subscribe 请求的 args 个数上限
+    args_per_request = 10
+
+    def _topic_ops(self, op, symbols):
+        args = [f"tickers.{sym.upper()}" for sym in symbols]
+        return [{"op": op, "args": args[i:i + self.args_per_request]}
+                for i in range(0, len(args), self.args_per_request)]
+
+    def build_subscribe(self, symbols):
+        return self._topic_ops("subscribe", symbols)
+
+    def build_unsubscribe(self, symbols):
+        return self._topic_ops("unsubscribe", symbols)
+
+    frame_parser = staticmethod(parse_frame)
+
+    def on_other(self, data):
+        if data.get("op") not in ("subscribe", "unsubscribe", "ping", "pong"):
+            self.logger.warning(f"[{self.name}] 收到未知消息: {str(data)[:200]}")
+
 def run_ws(symbols_list, use_proxy=False, proxy_host=None, proxy_port=None, proxy_type=None):
     url = "wss://stream.bybit.com/v5/public/linear"
     logger.info(f"连接URL: {url}")
@@ -80,7 +157,13 @@ if __name__ == "__main__":
     logger = setup_logger('bybit_ticker')
 
     rds = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+    publisher = build_publisher(rds, config, logger)
+    quotes = build_quote_table(config)
     debug = config['debug']
+    # 采集指标与逐条行情日志采样（见 utils/metrics.py）
+    feed = FeedMetrics('bybit')
+    tick_log = build_log_sampler(config)
+    serve_metrics(config, 'bybit', logger)
     symbols = symbols
 
     while True:
@@ -93,6 +176,7 @@ if __name__ == "__main__":
             )
         except Exception as e:
             logger.error(f"连接异常: {e}")
+        feed.reconnect()
         logger.info("5秒后重试连接...")
         time.sleep(5)
 
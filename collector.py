@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+
+import redis
+import redis.asyncio as aioredis
+
+from utils.utils import *
+from utils.control import CONTROL_CHANNEL, parse_control
+from utils.publisher import build_publisher
+from utils.metrics import build_log_sampler, serve_metrics
+from utils.quotes import build_quote_table
+from binance.ticker import BinanceAdapter
+from bybit.ticker import BybitAdapter
+from okx.ticker import OkxAdapter
+from bitget.ticker import BitgetAdapter
+
+
+# 可插拔的交易所适配器，新增交易所只需在此注册
+ADAPTERS = {
+    'binance': BinanceAdapter,
+    'bybit': BybitAdapter,
+    'okx': OkxAdapter,
+    'bitget': BitgetAdapter,
+}
+
+
+def build_proxy_url(config):
+    if config.get('use_proxy') and config.get('proxy_host') and config.get('proxy_port'):
+        return f"socks5h://{config['proxy_host']}:{config['proxy_port']}"
+    return None
+
+
+async def apply_control(adapters, payload, logger):
+    """
+    执行一条控制命令，直接在现有连接上订阅/取消订阅
+    """
+    try:
+        op, exchange, symbols = parse_control(payload)
+    except ValueError as e:
+        logger.error(f"无效的控制命令: {e} | 原始: {payload[:200]}")
+        return
+    targets = [a for a in adapters if exchange in ('*', a.name)]
+    if not targets:
+        logger.warning(f"控制命令中的交易所未在本进程采集: {exchange}")
+    for adapter in targets:
+        if op == 'subscribe':
+            await adapter.subscribe(symbols)
+        elif op == 'unsubscribe':
+            await adapter.unsubscribe(symbols)
+        else:
+            await adapter.set_symbols(symbols)
+
+
+async def control_loop(adapters, config, logger):
+    """
+    监听 Redis 控制频道，运行时切换订阅；Redis 断开后自动重连
+    """
+    while True:
+        rds = aioredis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+        try:
+            async with rds.pubsub() as pubsub:
+                await pubsub.subscribe(CONTROL_CHANNEL)
+                logger.info(f"已监听控制频道: {CONTROL_CHANNEL}")
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        await apply_control(adapters, message['data'], logger)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"控制频道异常: {e}")
+        finally:
+            await rds.aclose()
+        await asyncio.sleep(1)
+
+
+async def run_collector(exchanges, symbols, config, logger):
+    """
+    单进程单事件循环运行多个交易所行情采集，每个交易所一个协程、各自独立重连，
+    共享同一个 Redis 连接池；推送由 BatchPublisher 的后台线程批量完成，不阻塞事件循环
+    """
+    if config.get('publish_overflow') == 'block':
+        raise ValueError("collector 不支持 publish_overflow=block（会阻塞事件循环）")
+    pool = redis.ConnectionPool(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+    publisher = build_publisher(redis.Redis(connection_pool=pool), config, logger)
+    proxy = build_proxy_url(config)
+
+    shard_limits = config.get('shard_limits') or {}
+    adapters = [
+        ADAPTERS[name](symbols, publisher, logger, debug=config['debug'], proxy=proxy,
+                       max_symbols_per_conn=shard_limits.get(name), quotes=build_quote_table(config),
+                       log_sampler=build_log_sampler(config))
+        for name in exchanges
+    ]
+    logger.info(f"启动采集: exchanges={exchanges}, symbols={symbols}")
+    serve_metrics(config, 'collector', logger)
+    try:
+        await asyncio.gather(control_loop(adapters, config, logger),
+                             *(adapter.run_forever() for adapter in adapters))
+    finally:
+        for adapter in adapters:
+            adapter.stop()
+        publisher.close()
+        pool.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多交易所ticker统一采集进程")
+    parser.add_argument('--exchanges', nargs='+', default=list(ADAPTERS), choices=list(ADAPTERS),
+                        help='要采集的交易所列表，用空格分隔，如 binance bybit')
+    args = parser.parse_args()
+
+    symbols = load_symbols_from_yaml("symbols_list.yml")
+    config = read_config('config.yml')
+    logger = setup_logger('collector')
+
+    try:
+        asyncio.run(run_collector(args.exchanges, symbols, config, logger))
+    except KeyboardInterrupt:
+        logger.info("Stopping...")
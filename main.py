@@ -1,261 +1,381 @@
 import redis
 import threading
 import time
-import json
-import collections
+import argparse
 import signal
 import sys
-import math
 
-import matplotlib
-matplotlib.use('tkagg')  # 可改为 'qt5agg' 或 'agg'（无界面）
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from utils.alerts import build_alert_engine
+from utils.codec import decode_record
+from utils.command import write_command
+from utils.latency import LatencyTracker
+from utils.metrics import REGISTRY, serve_metrics, start_metrics_server, watch_publisher
+from utils.publisher import BatchPublisher
+from utils.spread_engine import SpreadEngine
+from utils.spread_sinks import FileSink, RedisSink, StdoutSink
+from utils.streams import StreamReader, ticker_streams
+from utils.tickbus import TickBusReader
+from utils.ticker_store import load_latest, ticker_channel
+from utils.utils import read_config, setup_logger
 
 
-class DualOscilloscopePlotter:
-    """
-    一个窗口内绘制两条实时曲线（上下两个子图，等高）：
-    - 上图：价差（A - B）
-    - 下图：价差百分比（默认相对 B： (A - B)/B * 100）
-    - x 轴为相对时间（秒），固定 [-window, 0]
-    """
-    def __init__(self, window_seconds=300, fps=25,
-                 title_top="Spread A - B", title_bottom="Spread% vs B",
-                 y_label_top="Spread", y_label_bottom="Spread (%)",
-                 color_top='lime', color_bottom='deepskyblue'):
-        self.window_seconds = window_seconds
-        self.fps = fps
-
-        # 两条曲线的缓冲区
-        self.buf_top = collections.deque(maxlen=10_000)     # (ts, value) for spread
-        self.buf_bottom = collections.deque(maxlen=10_000)  # (ts, value) for spread%
-        self.lock = threading.Lock()
-
-        # 图形与子图（等高）
-        self.fig, (self.ax_top, self.ax_bottom) = plt.subplots(
-            2, 1, figsize=(15, 8), sharex=True, gridspec_kw={'height_ratios': [1, 1]}
-        )
-        self.fig.patch.set_facecolor('#0c0f12')
-
-        # 上图
-        self.line_top, = self.ax_top.plot([], [], color=color_top, linewidth=1.5)
-        self._style_axis(self.ax_top, title_top, "Time (s)", y_label_top)
-
-        # 下图
-        self.line_bottom, = self.ax_bottom.plot([], [], color=color_bottom, linewidth=1.5)
-        self._style_axis(self.ax_bottom, title_bottom, "Time (s)", y_label_bottom)
-
-        plt.tight_layout()
-
-        self.anim = None
-        self._running = False
-
-        # y 轴自适应参数（分别独立）
-        self._last_ylim_update_top = 0
-        self._last_ylim_update_bottom = 0
-        self._ylim_cushion = 0.1
-        self._ylim_min_refresh = 0.2
-
-    def _style_axis(self, ax, title, xlabel, ylabel):
-        ax.set_facecolor('#0c0f12')
-        ax.grid(True, color='#2a2f36', linestyle='--', linewidth=0.6)
-        ax.set_title(title, color='white')
-        ax.set_xlabel(xlabel, color='white')
-        ax.set_ylabel(ylabel, color='white')
-        for spine in ax.spines.values():
-            spine.set_color('#3a4048')
-        ax.tick_params(colors='white')
-
-    def add_point_top(self, value, ts=None):
-        if ts is None:
-            ts = time.time()
-        with self.lock:
-            self.buf_top.append((ts, value))
-
-    def add_point_bottom(self, value, ts=None):
-        if ts is None:
-            ts = time.time()
-        with self.lock:
-            self.buf_bottom.append((ts, value))
-
-    def _get_windowed(self, buf):
-        now = time.time()
-        left = now - self.window_seconds
-        xs, ys = [], []
-        with self.lock:
-            for t, v in buf:
-                if t >= left:
-                    xs.append(t)
-                    ys.append(v)
-        xs = [x - now for x in xs]  # 相对时间：负值在左
-        return xs, ys
-
-    def _update_ylim_axis(self, ax, ys, is_top=True):
-        if not ys:
-            return
-        now = time.time()
-        last_update = self._last_ylim_update_top if is_top else self._last_ylim_update_bottom
-        if now - last_update < self._ylim_min_refresh:
-            return
-        ymin, ymax = min(ys), max(ys)
-        if math.isclose(ymin, ymax):
-            ymin -= 1
-            ymax += 1
-        span = ymax - ymin
-        ymin -= span * self._ylim_cushion
-        ymax += span * self._ylim_cushion
-        ax.set_ylim(ymin, ymax)
-        if is_top:
-            self._last_ylim_update_top = now
-        else:
-            self._last_ylim_update_bottom = now
-
-    def _update(self, _frame):
-        # 上图数据
-        xs_top, ys_top = self._get_windowed(self.buf_top)
-        self.line_top.set_data(xs_top, ys_top)
-        self.ax_top.set_xlim(-self.window_seconds, 0)
-        self._update_ylim_axis(self.ax_top, ys_top, is_top=True)
+# 监听端指标（见 utils/metrics.py）
+LISTENER_TICKS = REGISTRY.counter('listener_ticks_total', '监听端处理的行情数', ('venue',))
+SPREAD_EMITS = REGISTRY.counter('listener_spread_emits_total', '价差输出次数（每次为一个 symbol 行）')
 
-        # 下图数据
-        xs_bottom, ys_bottom = self._get_windowed(self.buf_bottom)
-        self.line_bottom.set_data(xs_bottom, ys_bottom)
-        self.ax_bottom.set_xlim(-self.window_seconds, 0)
-        self._update_ylim_axis(self.ax_bottom, ys_bottom, is_top=False)
 
-        return self.line_top, self.line_bottom
+def parse_tick(payload):
+    """
+    从频道消息中取出 (价格, 记录)，JSON / 二进制格式由 utils/codec.py 自动识别；无法解析时价格为 None
+    """
+    record = decode_record(payload)
+    if record is None or record.get('last_price') is None:
+        return None, None
+    return float(record['last_price']), record
 
-    def start(self, block=False):
-        if self._running:
-            return
-        self._running = True
-        interval_ms = 1000 / self.fps
-        self.anim = FuncAnimation(self.fig, self._update, interval=interval_ms, blit=True)
-        plt.show(block=block)
 
-    def stop(self):
-        self._running = False
-        plt.close(self.fig)
+def book_of(record):
+    """
+    记录中的 (买一, 卖一)，缺失为 None
+    """
+    bid, ask = record.get('bid'), record.get('ask')
+    return (float(bid) if bid is not None else None), (float(ask) if ask is not None else None)
 
 
 class RedisTickerListener:
-    def __init__(self, exchange_1="binance", exchange_2="bybit", symbol="BTCUSDT", host='localhost', port=6379, db=0):
+    """
+    价差监听器：(exchange_1, exchange_2, symbol) 为打印与绘图的主交易对，
+    通过 symbols / exchanges 可同时跟踪更多 symbol × 交易所对（见 utils/spread_engine.py）
+
+    mode:
+        'poll'  每秒取一次最新值计算价差（原有行为）
+        'event' 每条 tick 到达立即重算受影响的价差并输出；conflate_ms > 0 时最多每 conflate_ms 毫秒输出一次，
+                窗口内的多次更新合并为最后一次，不会丢掉最终价格
+
+    headless=True 时不创建绘图器、不导入 matplotlib，价差通过 add_spread_handler 注册的 sink 输出（见 utils/spread_sinks.py）
+
+    transport:
+        'redis' 订阅 Redis 频道（默认，可跨机器）
+        'shm'   轮询同机共享内存总线 tickbus_dir（见 utils/tickbus.py），不经过 Redis；
+                tickbus_poll_us 为没有新数据时的轮询间隔（微秒），0 为忙等。切换命令与初始值仍走 Redis
+        'stream' 按批读取 Redis Stream（采集端 publish_output 为 stream / both，见 utils/streams.py），
+                断线重连后从上次的 ID 继续；stream_group 不为空时以消费组读取并 ack
+    """
+    def __init__(self, exchange_1="binance", exchange_2="bybit", symbol="BTCUSDT", host='localhost', port=6379, db=0,
+                 symbols=None, exchanges=None, mode='poll', conflate_ms=0, send_command=True, headless=False,
+                 transport='redis', tickbus_dir=None, tickbus_poll_us=50,
+                 stream_group=None, stream_consumer=None, stream_per_symbol=False, status_stream=None):
+        if mode not in ('poll', 'event'):
+            raise ValueError(f"mode must be 'poll' or 'event', got {mode!r}")
+        if transport not in ('redis', 'shm', 'stream'):
+            raise ValueError(f"transport must be 'redis', 'shm' or 'stream', got {transport!r}")
+        if transport == 'shm' and not tickbus_dir:
+            raise ValueError("transport='shm' requires tickbus_dir")
+        # 状态行、延迟统计等诊断输出的去向；挂上写 stdout 的 StdoutSink 时改为 stderr，stdout 只留价差 JSONL
+        self.status_stream = status_stream or sys.stdout
+        self.transport = transport
+        self.tickbus_dir = tickbus_dir
+        self.tickbus_poll_us = tickbus_poll_us
+        self.stream_group = stream_group
+        self.stream_consumer = stream_consumer
+        self.stream_per_symbol = stream_per_symbol
         self.exchange_name_list = ['binance', 'bybit', 'okx', 'bitget']
+        self.exchange_1 = exchange_1
+        self.exchange_2 = exchange_2
+        self.symbol = symbol.upper()
 
         self.redis = redis.Redis(host=host, port=port, db=db)
-        self.channels = [f'{exchange_1}:channel:ticker:{symbol}', f'{exchange_2}:channel:ticker:{symbol}']
-        self.publish_command(exchange_1, exchange_2, symbol)
-        self.latest_data = {}
+        symbols = [s.upper() for s in (symbols or [])]
+        if self.symbol not in symbols:
+            symbols.insert(0, self.symbol)
+        exchanges = list(exchanges or [exchange_1, exchange_2])
+        self.engine = SpreadEngine(symbols, exchanges)
+        self.channels = [ticker_channel(exchange_1, self.symbol), ticker_channel(exchange_2, self.symbol)]
+        # 离线回放（见 replay.py）时不向 schedual_bot 发送切换命令
+        if send_command:
+            self.publish_command(exchange_1, exchange_2, symbol)
         self.lock = threading.Lock()
         self._stop_event = threading.Event()
 
-        # 单窗口（等高）双曲线绘图器
-        self.plotter = DualOscilloscopePlotter(
-            window_seconds=300, fps=25,
-            title_top=f"Spread {exchange_1} - {exchange_2} ({symbol})",
-            title_bottom=f"Spread% {exchange_1} vs {exchange_2} ({symbol})",
-            y_label_top="Spread", y_label_bottom="Spread (%)",
-            color_top='lime', color_bottom='deepskyblue'
-        )
-
-        # 用于计算的上一时刻值
-        self.prev_output = {ch: None for ch in self.channels}
+        # 事件驱动模式
+        self.mode = mode
+        self.conflate_ms = conflate_ms
+        self.primary_row = self.engine.symbol_index[self.symbol]
+        self.spread_handlers = []
+        self._pending = {}
+        self._pending_cond = threading.Condition()
+        # 各交易所分阶段延迟直方图（见 utils/latency.py），价差输出延迟记在 'spread' 下
+        self.latency = LatencyTracker()
+        self._tick_counters = {ex: LISTENER_TICKS.labels(ex) for ex in self.engine.exchanges}
+        REGISTRY.function('listener_conflate_pending', '等待合并输出的 symbol 行数', lambda: len(self._pending))
+
+        # 单窗口（等高）双曲线绘图器；matplotlib 只在需要界面时才导入
+        self.plotter = None
+        if not headless:
+            from utils.plotter import DualOscilloscopePlotter
+            self.plotter = DualOscilloscopePlotter(
+                window_seconds=300, fps=25,
+                title_top=f"Spread {exchange_1} - {exchange_2} ({symbol})",
+                title_bottom=f"Spread% {exchange_1} vs {exchange_2} ({symbol})",
+                y_label_top="Spread", y_label_bottom="Spread (%)",
+                color_top='lime', color_bottom='deepskyblue'
+            )
+        # 需要在主线程启动 / 驱动事件循环的界面（绘图器、多交易对看板）
+        self.uis = [self.plotter] if self.plotter is not None else []
 
     def publish_command(self, exchange_a, exchange_b, symbol):
-        self.redis.set('exchange_a', exchange_a)
-        self.redis.set('exchange_b', exchange_b)
-        self.redis.set('symbol', symbol)
-        print(f"已发布: exchange_a={exchange_a}, exchange_b={exchange_b}, symbol={symbol}")
+        version = write_command(self.redis, exchange_a, exchange_b, symbol)
+        self._print(f"已发布: exchange_a={exchange_a}, exchange_b={exchange_b}, symbol={symbol}, version={version}")
+
+    def seed_latest(self):
+        """
+        从各交易所的 latest hash 读取最新价作为初始值，启动/重连后不必等待下一条 tick
+        """
+        for exchange in self.engine.exchanges:
+            try:
+                records = load_latest(self.redis, exchange, self.engine.symbols)
+            except redis.RedisError as e:
+                self._print(f"[seed_latest] 读取最新价失败: {e}")
+                return
+            with self.lock:
+                for symbol, record in records.items():
+                    if record.get('last_price') is not None:
+                        self.engine.update(ticker_channel(exchange, symbol), float(record['last_price']),
+                                           record.get('ts'), *book_of(record))
+
+    def add_spread_handler(self, handler):
+        """
+        注册价差回调 handler(symbol, exchange_a, exchange_b, spread, spread_pct)：
+        event 模式下每次更新触发所有交易所对，poll 模式下每秒触发一次主交易对；handler 有 close() 时在 stop 时调用
+        """
+        self.spread_handlers.append(handler)
+        if isinstance(handler, StdoutSink) and handler.stream is sys.stdout and self.status_stream is sys.stdout:
+            self.status_stream = sys.stderr
+
+    def _print(self, *args):
+        print(*args, file=self.status_stream)
+
+    def attach_dashboard(self, cols=None, window_seconds=300):
+        """
+        创建多交易对看板（utils/plotter.SpreadDashboard），跟踪的每个 symbol × 交易所对一个子图，需 event 模式
+        """
+        from utils.plotter import SpreadDashboard
+        pairs = [(sym, a, b) for sym in self.engine.symbols for a, b in self.engine.pairs]
+        dashboard = SpreadDashboard(pairs, window_seconds=window_seconds, cols=cols)
+        self.add_spread_handler(dashboard)
+        self.uis.append(dashboard)
+        return dashboard
 
     def listen_redis(self):
-        pattern = '*:channel:ticker:*'
+        # 只订阅需要的频道，频道到槽位的映射由 SpreadEngine 完成
         pubsub = self.redis.pubsub()
-        pubsub.psubscribe(pattern)
+        pubsub.subscribe(*self.engine.channels())
 
         for message in pubsub.listen():
             if self._stop_event.is_set():
                 break
-            if message['type'] == 'pmessage':
-                channel = message['channel'].decode()
-                # 只接收目标两个通道
-                for ch in self.channels:
-                    if ch in channel:
-                        try:
-                            payload = message['data']
-                            if isinstance(payload, bytes):
-                                payload = payload.decode('utf-8')
-                            data_json = json.loads(payload)
-                            # 兼容多种字段名
-                            if isinstance(data_json, dict):
-                                if 'last_price' in data_json:
-                                    data = float(data_json['last_price'])
-                                elif 'price' in data_json:
-                                    data = float(data_json['price'])
-                                elif 'last' in data_json:
-                                    data = float(data_json['last'])
-                                else:
-                                    continue
-                            else:
-                                continue
-                            with self.lock:
-                                self.latest_data[ch] = data
-                        except Exception as e:
-                            print(f"[listen_redis] 解析消息异常: {e}")
+            if message['type'] != 'message':
+                continue
+            self.handle_tick(message['channel'], message['data'])
+
+    def listen_shm(self):
+        reader = TickBusReader(self.tickbus_dir, self.engine.exchanges)
+        idle = self.tickbus_poll_us / 1e6
+        try:
+            while not self._stop_event.is_set():
+                items = reader.poll()
+                for channel, payload in items:
+                    self.handle_tick(channel, payload)
+                if not items:
+                    time.sleep(idle)
+        finally:
+            reader.close()
+
+    def listen_stream(self):
+        streams = ticker_streams(self.engine.exchanges, self.engine.symbols, self.stream_per_symbol)
+        reader = StreamReader(self.redis, streams, group=self.stream_group, consumer=self.stream_consumer)
+        REGISTRY.function('listener_stream_lag_seconds', '最近读到的 Stream 消息距现在的秒数',
+                          lambda: None if reader.lag_ms() is None else reader.lag_ms() / 1000.0)
+        # 连接异常由 StreamReader 处理（从上次的 ID 继续、ack 失败留待重试），其余 Redis 异常退避后重试，不让监听线程退出
+        delay = 1.0
+        while not self._stop_event.is_set():
+            try:
+                items = reader.read()
+                for channel, payload, _ in items:
+                    self.handle_tick(channel, payload)
+                reader.ack([entry for _, _, entry in items])
+                delay = 1.0
+            except redis.RedisError as e:
+                self._print(f"[listen_stream] Redis 异常: {e}，{delay:.0f} 秒后重试")
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, 30.0)
+
+    def handle_tick(self, channel, payload, recv_ns=None):
+        """
+        处理一条 ticker 消息（频道名 + 原始负载），返回是否更新了价格；
+        listen_redis 与离线回放（utils/replay.py 的 listener_sink）共用这条路径
+        """
+        if recv_ns is None:
+            recv_ns = time.monotonic_ns()
+        slot = self.engine.slots.get(channel)
+        if slot is None:
+            return False
+        try:
+            price, record = parse_tick(payload)
+        except Exception as e:
+            self._print(f"[listen_redis] 解析消息异常: {e}")
+            return False
+        if price is None:
+            return False
+        venue = self.engine.exchanges[slot[1]]
+        self.latency.record_tick(venue, record, recv_ns)
+        self._tick_counters[venue].inc()
+        with self.lock:
+            row = self.engine.update(channel, price, record.get('ts'), *book_of(record))
+        if self.mode == 'event':
+            self._on_update(row, recv_ns, record.get('ts'))
+        return True
+
+    def _on_update(self, row, recv_ns, exch_ts):
+        if self.conflate_ms <= 0:
+            self.emit_spreads(row, recv_ns, exch_ts)
+            return
+        with self._pending_cond:
+            self._pending[row] = (recv_ns, exch_ts)
+            self._pending_cond.notify()
+
+    def conflate_loop(self):
+        """
+        合并输出：有待输出的行时，距上次输出不足 conflate_ms 则等到窗口结束再统一输出
+        """
+        interval = self.conflate_ms / 1000.0
+        next_emit = 0.0
+        while not self._stop_event.is_set():
+            with self._pending_cond:
+                while not self._pending and not self._stop_event.is_set():
+                    self._pending_cond.wait(timeout=0.5)
+            delay = next_emit - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._pending_cond:
+                pending, self._pending = self._pending, {}
+            for row, (recv_ns, exch_ts) in pending.items():
+                self.emit_spreads(row, recv_ns, exch_ts)
+            next_emit = time.monotonic() + interval
+
+    def emit_spreads(self, row, recv_ns, exch_ts):
+        """
+        输出某个 symbol 行的价差：主交易对写入绘图器，所有交易所对交给 spread_handlers
+        """
+        symbol = self.engine.symbols[row]
+        results = []
+        with self.lock:
+            if row == self.primary_row:
+                primary = self.engine.get(self.symbol, self.exchange_1, self.exchange_2)
+            else:
+                primary = (None, None)
+            if self.spread_handlers:
+                for k, (a, b) in enumerate(self.engine.pairs):
+                    spread = self.engine.spread[row, k]
+                    if spread == spread:  # 跳过 NaN
+                        results.append((a, b, float(spread), float(self.engine.spread_pct[row, k])))
+
+        now = time.time()
+        spread, spread_pct = primary
+        if spread is not None and self.plotter is not None:
+            self.plotter.add_point_top(spread, ts=now)
+            self.plotter.add_point_bottom(spread_pct, ts=now)
+        for a, b, spread, spread_pct in results:
+            for handler in self.spread_handlers:
+                handler(symbol, a, b, spread, spread_pct)
+        SPREAD_EMITS.inc()
+        self._record_latency(recv_ns, exch_ts, now)
+
+    def _record_latency(self, recv_ns, exch_ts, now):
+        self.latency.record('spread', 'recv_to_emit', (time.monotonic_ns() - recv_ns) / 1e6)
+        if exch_ts:
+            self.latency.record('spread', 'exch_to_emit', now * 1000 - float(exch_ts))
 
     def print_and_plot_latest(self):
         """
-        每秒打印一次两个通道的最新值，并更新同一图中的两条曲线。
+        每秒打印一次主交易对两个通道的最新值与各交易所延迟统计；poll 模式下同时更新同一图中的两条曲线，
+        event 模式下曲线由 emit_spreads 实时更新。
+        有盘口时打印主交易对两个方向的可成交价差；跟踪多个 symbol 时额外打印价差百分比最大的几组。
         """
-        self.prev_output = {ch: None for ch in self.channels}
         ch_a, ch_b = self.channels
 
         while not self._stop_event.is_set():
             time.sleep(1)
-            output = {}
             with self.lock:
-                for ch in self.channels:
-                    output[ch] = self.latest_data.get(ch, self.prev_output[ch])
-                self.latest_data.clear()
-
-            print(output)
-            self.prev_output = output.copy()
-
-            a = output.get(ch_a)
-            b = output.get(ch_b)
-            if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a is not None and b is not None:
-                spread = a - b
-                self.plotter.add_point_top(spread)
-
-                # 百分比（默认相对 B）。如需改为相对 mid，请参见注释。
-                # mid = (a + b) / 2.0
-                # spread_pct = (a - b) / mid * 100.0 if mid != 0 else 0.0
-                if b != 0:
-                    spread_pct = (a - b) / b * 100.0
-                else:
-                    spread_pct = 0.0
-                self.plotter.add_point_bottom(spread_pct)
+                output = {
+                    ch_a: self.engine.price(self.exchange_1, self.symbol),
+                    ch_b: self.engine.price(self.exchange_2, self.symbol),
+                }
+                spread, spread_pct = self.engine.get(self.symbol, self.exchange_1, self.exchange_2)
+                skew_ms = self.engine.leg_skew_ms(self.symbol, self.exchange_1, self.exchange_2)
+                ab, ab_pct, ba, ba_pct = self.engine.get_executable(self.symbol, self.exchange_1, self.exchange_2)
+                top = self.engine.top_spreads(5) if len(self.engine.symbols) > 1 else None
+                top_exec = self.engine.top_executable(5) if len(self.engine.symbols) > 1 else None
+
+            self._print(output, f"leg skew: {skew_ms}ms" if skew_ms is not None else "")
+            if ab is not None or ba is not None:
+                self._print("executable:",
+                            f"sell {self.exchange_1} buy {self.exchange_2} {ab:+.6g} ({ab_pct:+.4f}%)" if ab is not None else "",
+                            f"sell {self.exchange_2} buy {self.exchange_1} {ba:+.6g} ({ba_pct:+.4f}%)" if ba is not None else "")
+            if top:
+                self._print("top spreads:", [f"{s} {a}-{b} {pct:+.4f}%" for s, a, b, _, pct in top])
+            if top_exec:
+                self._print("top executable:", [f"{s} sell {a} buy {b} {pct:+.4f}%" for s, a, b, _, pct in top_exec])
+            for venue, stages in self.latency.summary(reset=True).items():
+                self._print(f"latency[{venue}]:", {stage: f"p50={st.get('p50')} p99={st.get('p99')} max={st.get('max')}"
+                                                   for stage, st in stages.items()})
+            if self.mode == 'event':
+                continue
+
+            # 百分比相对 B：(A - B) / B * 100
+            if spread is not None:
+                if self.plotter is not None:
+                    self.plotter.add_point_top(spread)
+                    self.plotter.add_point_bottom(spread_pct)
+                for handler in self.spread_handlers:
+                    handler(self.symbol, self.exchange_1, self.exchange_2, spread, spread_pct)
 
     def start(self):
         self._stop_event.clear()
+        self.seed_latest()
         # 主线程启动 UI
-        self.plotter.start(block=False)
+        for ui in self.uis:
+            ui.start(block=False)
 
         # 后台线程
-        self.t_listen = threading.Thread(target=self.listen_redis, name="redis-listener", daemon=True)
+        if self.transport == 'shm':
+            self.t_listen = threading.Thread(target=self.listen_shm, name="tickbus-listener", daemon=True)
+        elif self.transport == 'stream':
+            self.t_listen = threading.Thread(target=self.listen_stream, name="stream-listener", daemon=True)
+        else:
+            self.t_listen = threading.Thread(target=self.listen_redis, name="redis-listener", daemon=True)
         self.t_print = threading.Thread(target=self.print_and_plot_latest, name="printer-plotter", daemon=True)
         self.t_listen.start()
         self.t_print.start()
+        if self.mode == 'event' and self.conflate_ms > 0:
+            self.t_conflate = threading.Thread(target=self.conflate_loop, name="spread-conflater", daemon=True)
+            self.t_conflate.start()
 
     def stop(self):
+        if self._stop_event.is_set():
+            return
         self._stop_event.set()
-        self.plotter.stop()
+        for ui in self.uis:
+            ui.stop()
+        for handler in self.spread_handlers:
+            if handler not in self.uis and hasattr(handler, 'close'):
+                handler.close()
 
     def run_forever(self):
         self.start()
 
         def _sigint_handler(signum, frame):
-            print("Stopping...")
+            self._print("Stopping...")
             self.stop()
             sys.exit(0)
 
@@ -264,12 +384,69 @@ class RedisTickerListener:
 
         try:
             while not self._stop_event.is_set():
-                plt.pause(0.05)
+                if self.uis:
+                    self.uis[0].pause(0.05)
+                else:
+                    self._stop_event.wait(0.5)
         except KeyboardInterrupt:
-            print("Stopping...")
+            self._print("Stopping...")
             self.stop()
 
 
 if __name__ == "__main__":
-    listener = RedisTickerListener(exchange_1="bybit", exchange_2="bitget", symbol="TNSRUSDT")
+    parser = argparse.ArgumentParser(description="跨交易所价差监听")
+    parser.add_argument('--exchange-1', default="bybit")
+    parser.add_argument('--exchange-2', default="bitget")
+    parser.add_argument('--symbol', default="TNSRUSDT")
+    parser.add_argument('--symbols', nargs='*', default=None, help='额外跟踪的 symbol')
+    parser.add_argument('--mode', choices=['poll', 'event'], default='event')
+    parser.add_argument('--conflate-ms', type=int, default=10)
+    parser.add_argument('--headless', action='store_true', help='不启动绘图界面（不导入 matplotlib）')
+    parser.add_argument('--sink', nargs='*', choices=['stdout', 'redis', 'file'], default=[],
+                        help='价差输出，可多选')
+    parser.add_argument('--sink-file', default='spreads.jsonl', help='file sink 的输出路径')
+    parser.add_argument('--exchanges', nargs='*', default=None, help='跟踪的交易所（默认主交易对两个）')
+    parser.add_argument('--dashboard', action='store_true', help='多交易对看板：每个 symbol × 交易所对一个子图（需 event 模式）')
+    parser.add_argument('--dashboard-cols', type=int, default=None)
+    parser.add_argument('--alerts', action='store_true', help='按 config.yml 的 alert_rules 计算价差信号并发布到 Redis')
+    parser.add_argument('--transport', choices=['redis', 'shm', 'stream'], default='redis',
+                        help='行情来源：Redis 频道、同机共享内存总线（采集端需配置 tickbus_dir）或 Redis Stream（采集端 publish_output 为 stream / both）')
+    parser.add_argument('--tickbus-dir', default=None, help='共享内存总线目录（默认取 config.yml 的 tickbus_dir）')
+    parser.add_argument('--stream-group', default=None, help='Redis Stream 消费组名，不填用 XREAD 独立读取')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='在本机该端口提供 /metrics（默认取 config.yml 的 metrics_ports.listener）')
+    parser.add_argument('--stream-consumer', default=None, help='消费组内的 consumer 名，重启后用同一个名字可接着处理未 ack 的消息')
+    args = parser.parse_args()
+
+    tickbus_dir = args.tickbus_dir
+    config = read_config('config.yml')
+    if args.transport == 'shm' and not tickbus_dir:
+        tickbus_dir = config.get('tickbus_dir')
+    listener = RedisTickerListener(exchange_1=args.exchange_1, exchange_2=args.exchange_2, symbol=args.symbol,
+                                   symbols=args.symbols, exchanges=args.exchanges, mode=args.mode,
+                                   conflate_ms=args.conflate_ms, headless=args.headless or args.dashboard,
+                                   transport=args.transport, tickbus_dir=tickbus_dir,
+                                   stream_group=args.stream_group, stream_consumer=args.stream_consumer,
+                                   stream_per_symbol=config.get('stream_per_symbol', False),
+                                   status_stream=sys.stderr if 'stdout' in args.sink else None)
+    if args.dashboard:
+        listener.attach_dashboard(cols=args.dashboard_cols)
+    if 'stdout' in args.sink:
+        listener.add_spread_handler(StdoutSink())
+    if 'redis' in args.sink:
+        sink_publisher = BatchPublisher(listener.redis)
+        watch_publisher('spread_sink', sink_publisher)
+        listener.add_spread_handler(RedisSink(sink_publisher))
+    if 'file' in args.sink:
+        listener.add_spread_handler(FileSink(args.sink_file))
+    if args.alerts:
+        alert_publisher = BatchPublisher(listener.redis)
+        watch_publisher('alerts', alert_publisher)
+        alerts = build_alert_engine(config, alert_publisher, setup_logger('alerts'))
+        if alerts is not None:
+            listener.add_spread_handler(alerts)
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, host=config.get('metrics_host', '127.0.0.1'))
+    else:
+        serve_metrics(config, 'listener')
     listener.run_forever()
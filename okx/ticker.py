@@ -6,6 +6,13 @@ import logging
 from datetime import datetime
 import redis
 from utils.utils import *
+from utils.collector import ExchangeAdapter
+from utils.publisher import build_publisher
+from utils.metrics import FeedMetrics, build_log_sampler, serve_metrics
+from utils.quotes import build_quote_table
+from utils.ticker_store import receive_stamp
+from utils.decoder import Struct, make_frame_parser
+from typing import List
 
 def extract_symbol(pair_str):
     """
@@ -17,24 +24,62 @@ def extract_symbol(pair_str):
     return ''.join(parts[:2])
 
 
-def save_ticker_to_redis(rds, symbol, last_price):
+def save_ticker_to_redis(publisher, symbol, record, recv):
     """
-    只推送ticker数据到 Redis Channel（不做缓存）
+    推送ticker数据到 Redis Channel，并更新 okx:ticker:latest 最新值缓存，publisher 负责批量发送
+    record 含 last_price 与交易所事件时间 ts（毫秒），recv 为 receive_stamp() 的本地收到时间
     """
-    value = json.dumps({
-        "last_price": last_price,
-    }, ensure_ascii=False)
-    rds.publish(f"okx:channel:ticker:{symbol}", value)
+    record.update(recv)
+    publisher.publish_ticker("okx", symbol, record)
+
+def parse_ticker(data):
+    """
+    解析 tickers 频道数据消息，返回 [(symbol, record), ...]，symbol 已转换为 'LINKUSDT' 形式
+    record: last_price, bid, bid_size, ask, ask_size（买一 / 卖一，空串视为缺失）, ts（毫秒）
+    """
+    if "data" in data and "arg" in data:
+        return [
+            (extract_symbol(item.get("instId")),
+             {"last_price": item.get("last"), "bid": item.get("bidPx") or None, "bid_size": item.get("bidSz") or None,
+              "ask": item.get("askPx") or None, "ask_size": item.get("askSz") or None,
+              "ts": int(item["ts"]) if item.get("ts") else None})
+            for item in data["data"]
+        ]
+    return None
+
+class TickerData(Struct):
+    instId: str
+    last: str
+    bidPx: str = ""
+    bidSz: str = ""
+    askPx: str = ""
+    askSz: str = ""
+    ts: str = ""
+
+class TickerMsg(Struct):
+    data: List[TickerData]
+
+def typed_ticks(msg):
+    return [(extract_symbol(t.instId), {"last_price": t.last, "bid": t.bidPx or None, "bid_size": t.bidSz or None,
+                                        "ask": t.askPx or None, "ask_size": t.askSz or None,
+                                        "ts": int(t.ts) if t.ts else None})
+            for t in msg.data]
+
+# 有 msgspec 时按 TickerMsg 只解出用到的字段，事件类消息不匹配 schema，整帧解码后走 parse_ticker
+parse_frame = make_frame_parser(parse_ticker, TickerMsg, typed_ticks)
 
 def on_message(ws, message):
+    recv = receive_stamp()
+    started = time.perf_counter()
     try:
-        data = json.loads(message)
+        ticks, data = parse_frame(message)
     except Exception as e:
         logger.error(f"JSON 解析错误: {e} | 原始: {message[:200]}")
         return
+    feed.frame(time.perf_counter() - started)
 
     # 事件类消息
-    if isinstance(data, dict) and data.get("event"):
+    if ticks is None and isinstance(data, dict) and data.get("event"):
         event = data.get("event")
         if event == "subscribe":
             logger.info(f"订阅成功: {data.get('arg')}")
@@ -45,18 +90,23 @@ def on_message(ws, message):
         return
 
     # 数据消息
-    if "data" in data and "arg" in data:
-        for item in data["data"]:
-            inst_id = item.get("instId")
-            inst_id=extract_symbol(inst_id)
-            last_price = item.get("last")
-
-            if debug:
-                logger.info(f"交易对: {inst_id} 最新价: {last_price}")
-
-            save_ticker_to_redis(rds, inst_id, last_price)
+    if ticks is not None:
+        for inst_id, record in ticks:
+            feed.tick(inst_id)
+            record.update(recv)
+            if quotes.update(inst_id, record, recv["recv_ms"]) is None:
+                continue
+            if debug and tick_log.due(inst_id):
+                logger.info(f"交易对: {inst_id} 最新价: {record['last_price']}")
+
+            save_ticker_to_redis(publisher, inst_id, record, recv)
+            feed.published(inst_id)
     else:
         logger.warning(f"收到未知消息: {str(data)[:200]}")
+    # 限频窗口内推迟的记录：该连接收到任意一帧时检查是否到期（collector.py 中由定时任务补发）
+    for inst_id, record in quotes.due():
+        save_ticker_to_redis(publisher, inst_id, record, {})
+        feed.published(inst_id)
 
 def on_error(ws, error):
     logger.error(f"Error: {error}")
@@ -71,6 +121,33 @@ def on_close(ws, close_status_code, close_msg):
 def on_open(ws):
     logger.info("WebSocket连接已打开。")
 
+class OkxAdapter(ExchangeAdapter):
+    name = "okx"
+    url = "wss://ws.okx.com:8443/ws/v5/public"
+    app_ping = "ping"
+    max_symbols_per_conn = 100
+
+    def build_subscribe(self, symbols):
+        return [{
+            "op": "subscribe",
+            "args": [{"channel": "tickers", "instId": convert_symbol(sym)} for sym in symbols]
+        }]
+
+    def build_unsubscribe(self, symbols):
+        return [{
+            "op": "unsubscribe",
+            "args": [{"channel": "tickers", "instId": convert_symbol(sym)} for sym in symbols]
+        }]
+
+    frame_parser = staticmethod(parse_frame)
+
+    def on_other(self, data):
+        if isinstance(data, dict) and data.get("event"):
+            if data.get("event") == "error":
+                self.logger.error(f"[{self.name}] 订阅错误: {data}")
+            return
+        self.logger.warning(f"[{self.name}] 收到未知消息: {str(data)[:200]}")
+
 def run_ws(symbols, use_proxy=False, proxy_host=None, proxy_port=None, proxy_type=None):
     url = "wss://ws.okx.com:8443/ws/v5/public"
     ws = websocket.WebSocketApp(
@@ -109,7 +186,13 @@ if __name__ == "__main__":
     logger = setup_logger('okx_ticker')
 
     rds = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+    publisher = build_publisher(rds, config, logger)
+    quotes = build_quote_table(config)
     debug = config['debug']
+    # 采集指标与逐条行情日志采样（见 utils/metrics.py）
+    feed = FeedMetrics('okx')
+    tick_log = build_log_sampler(config)
+    serve_metrics(config, 'okx', logger)
 
     while True:
         try:
@@ -121,6 +204,7 @@ if __name__ == "__main__":
             )
         except Exception as e:
             logger.error(f"连接异常: {e}")
+        feed.reconnect()
         logger.info("5秒后重试连接...")
         time.sleep(5)
 
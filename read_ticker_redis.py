@@ -1,25 +1,37 @@
 import redis
 import threading
 import time
-import json
+
+from utils.codec import decode_record
+from utils.command import write_command
+from utils.ticker_store import load_latest, ticker_channel
 
 class RedisTickerListener:
     def __init__(self, exchange_1="binance",exchange_2="bybit", symbol="BTCUSDT", host='localhost', port=6379, db=0):
         self.exchange_name_list=['binance','bybit','okx','bitget']
 
         self.redis = redis.Redis(host=host, port=port, db=db)
-        self.channels = [f'{exchange_1}:channel:ticker:{symbol}', f'{exchange_2}:channel:ticker:{symbol}']
+        self.legs = [(exchange_1, symbol), (exchange_2, symbol)]
+        self.channels = [ticker_channel(exchange, sym) for exchange, sym in self.legs]
         self.publish_command(exchange_1,exchange_2,symbol)
         self.latest_data = {}
         self.lock = threading.Lock()
         self._stop_event = threading.Event()
 
     def publish_command(self, exchange_a, exchange_b, symbol):
-        self.redis.set('exchange_a', exchange_a)
-        self.redis.set('exchange_b', exchange_b)
-        self.redis.set('symbol', symbol)
-        print(f"已发布: exchange_a={exchange_a}, exchange_b={exchange_b}, symbol={symbol}")
+        version = write_command(self.redis, exchange_a, exchange_b, symbol)
+        print(f"已发布: exchange_a={exchange_a}, exchange_b={exchange_b}, symbol={symbol}, version={version}")
+
 
+    def seed_latest(self):
+        """
+        启动时从 latest hash 读取两个通道的最新价
+        """
+        for (exchange, symbol), ch in zip(self.legs, self.channels):
+            record = load_latest(self.redis, exchange, [symbol]).get(symbol)
+            if record:
+                with self.lock:
+                    self.latest_data.setdefault(ch, record.get('last_price'))
 
     def listen_redis(self):
 
@@ -34,9 +46,11 @@ class RedisTickerListener:
                 channel = message['channel'].decode()
                 for ch in self.channels:
                     if ch in channel:
-                        data = json.loads(message['data'])['last_price']
+                        record = decode_record(message['data'])
+                        if record is None or record.get('last_price') is None:
+                            continue
                         with self.lock:
-                            self.latest_data[ch] = data
+                            self.latest_data[ch] = record['last_price']
 
     def print_latest(self):
 
@@ -53,6 +67,7 @@ class RedisTickerListener:
 
     def start(self):
         self._stop_event.clear()
+        self.seed_latest()
         self.t1 = threading.Thread(target=self.listen_redis)
         self.t2 = threading.Thread(target=self.print_latest)
         self.t1.daemon = True
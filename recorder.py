@@ -0,0 +1,55 @@
+import argparse
+import time
+
+import redis
+
+from utils.utils import *
+from utils.recorder import build_recorder
+
+
+def run_recorder(config, logger, pattern='*:channel:ticker:*'):
+    """
+    订阅全部 ticker 频道并写入磁盘段文件（见 utils/recorder.py）；Redis 断开后自动重连
+    """
+    recorder = build_recorder(config, logger)
+    rds = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+    count = 0
+    last_report = time.monotonic()
+    try:
+        while True:
+            pubsub = rds.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(pattern)
+                logger.info(f"开始录制: {pattern} -> {recorder.data_dir}")
+                while True:
+                    message = pubsub.get_message(timeout=recorder.flush_interval)
+                    if message is not None and message['type'] == 'pmessage':
+                        if recorder.write(message['channel'], message['data']):
+                            count += 1
+                    recorder.maintain()
+                    if time.monotonic() - last_report >= 60:
+                        logger.info(f"最近 {time.monotonic() - last_report:.0f} 秒录制 {count} 条")
+                        count = 0
+                        last_report = time.monotonic()
+            except redis.RedisError as e:
+                logger.error(f"Redis 异常: {e}，5秒后重连")
+                recorder.flush()
+                time.sleep(5)
+            finally:
+                pubsub.close()
+    finally:
+        recorder.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ticker 录制进程：订阅 Redis 频道写入磁盘段文件")
+    parser.add_argument('--pattern', default='*:channel:ticker:*', help='订阅的频道模式')
+    args = parser.parse_args()
+
+    config = read_config('config.yml')
+    logger = setup_logger('recorder')
+
+    try:
+        run_recorder(config, logger, args.pattern)
+    except KeyboardInterrupt:
+        logger.info("Stopping...")
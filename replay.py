@@ -0,0 +1,77 @@
+import argparse
+import datetime
+import threading
+
+import redis
+
+from utils.utils import *
+from utils.replay import TickReplayer, listener_sink, redis_sink
+
+
+def parse_speed(value):
+    return None if value == 'max' else float(value)
+
+
+def parse_time_ms(value):
+    """
+    毫秒时间戳或 ISO 时间（UTC，如 2025-01-01T08:00:00）
+    """
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    dt = datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def replay_to_listener(replayer, args):
+    """
+    进程内回放：直接驱动 RedisTickerListener 的处理路径（不需要 Redis），结束后输出吞吐与延迟统计
+    """
+    from main import RedisTickerListener
+
+    listener = RedisTickerListener(exchange_1=args.exchanges[0], exchange_2=args.exchanges[1], symbol=args.symbols[0],
+                                   symbols=args.symbols, exchanges=args.exchanges, mode='event',
+                                   conflate_ms=args.conflate_ms, send_command=False,
+                                   headless=True)
+    if args.conflate_ms > 0:
+        threading.Thread(target=listener.conflate_loop, name="spread-conflater", daemon=True).start()
+    emitted = [0]
+    listener.add_spread_handler(lambda *a: emitted.__setitem__(0, emitted[0] + 1))
+    result = replayer.run(listener_sink(listener))
+    listener.stop()
+    result['spreads'] = emitted[0]
+    return result, listener.latency.summary()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回放 recorder 录制的 tick：重新发布到 Redis，或进程内直接驱动价差计算")
+    parser.add_argument('--symbols', nargs='+', required=True, help='回放的 symbol，如 TNSRUSDT')
+    parser.add_argument('--exchanges', nargs='+', default=None, help='回放的交易所，listener 模式下前两个为主交易对')
+    parser.add_argument('--start', default=None, help='开始时间：毫秒时间戳或 UTC ISO 时间')
+    parser.add_argument('--end', default=None, help='结束时间：毫秒时间戳或 UTC ISO 时间')
+    parser.add_argument('--speed', type=parse_speed, default=1.0, help='倍速，如 1 / 10；max 为最快速度')
+    parser.add_argument('--target', choices=['redis', 'listener'], default='redis')
+    parser.add_argument('--wire-format', choices=['binary', 'json'], default='binary', help='redis 模式下发布的编码')
+    parser.add_argument('--conflate-ms', type=int, default=0, help='listener 模式下的价差合并窗口')
+    parser.add_argument('--data-dir', default=None, help='录制目录，默认读取 config.yml 的 recorder_dir')
+    args = parser.parse_args()
+
+    config = read_config('config.yml')
+    logger = setup_logger('replay')
+    replayer = TickReplayer(args.data_dir or config.get('recorder_dir', 'data/ticks'), symbols=args.symbols,
+                            exchanges=args.exchanges, start_ms=parse_time_ms(args.start), end_ms=parse_time_ms(args.end),
+                            speed=args.speed, logger=logger)
+
+    if args.target == 'listener':
+        if not args.exchanges or len(args.exchanges) < 2:
+            parser.error("listener 模式需要至少两个 --exchanges")
+        result, latency = replay_to_listener(replayer, args)
+        for venue, stages in latency.items():
+            logger.info(f"latency[{venue}]: {stages}")
+    else:
+        rds = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
+        result = replayer.run(redis_sink(rds, args.wire_format))
+    logger.info(f"回放完成: {result}")
@@ -1,60 +1,172 @@
 import redis
 import subprocess
+import threading
 import yaml
 import time
 
-class RedisDockerMonitor:
-    def __init__(self, redis_host='localhost', redis_port=6379, redis_db=0, check_interval=5):
+from utils.command import COMMAND_CHANNEL, COMMAND_KEY, read_command
+from utils.control import CONTROL_CHANNEL, send_control
+from utils.latency import LatencyTracker
+from utils.metrics import REGISTRY, serve_metrics
+from utils.ticker_store import EXCHANGES, ticker_channel
+from utils.utils import read_config
+
+
+# 调度指标（切换耗时由 LatencyTracker 写入 stage_latency_seconds，见 utils/metrics.py）
+COMMANDS = REGISTRY.counter('schedual_commands_total', '读到的新命令数（version 递增）')
+SWITCHES = REGISTRY.counter('schedual_switches_total', '实际执行的切换次数')
+SWITCH_TIMEOUTS = REGISTRY.counter('schedual_switch_timeouts_total', '切换计时超时次数')
+REDIS_ERRORS = REGISTRY.counter('schedual_redis_errors_total', 'Redis 异常次数')
+
+
+class SwitchTimer:
+    """
+    交易对切换耗时（命令被看到 -> 两条腿各自收到第一条 tick），作为切换延迟 SLO 的度量：
+        command_to_first_tick  每条腿单独记录（venue 为交易所名）
+        command_to_both_legs   两条腿都到齐的耗时（venue 为 'switch'）
+    新的切换开始后，尚未完成的上一次计时作废。
+    """
+    def __init__(self, redis_client, slo_ms=1000, timeout=30):
+        self.redis_client = redis_client
+        self.slo_ms = slo_ms
+        self.timeout = timeout
+        self.latency = LatencyTracker()
+        self.timeouts = 0
+        self._generation = 0
+
+    def begin(self, exchange_a, exchange_b, symbol, seen_ns):
+        """
+        在下发切换之前订阅两条腿的频道（避免漏掉第一条 tick），返回 start() 用的计时线程
+        """
+        self._generation += 1
+        legs = {ticker_channel(ex, symbol.upper()): ex for ex in dict.fromkeys([exchange_a, exchange_b])}
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(*legs)
+        return threading.Thread(target=self._wait_first_ticks, daemon=True,
+                                args=(pubsub, legs, seen_ns, self._generation, f"{exchange_a}/{exchange_b} {symbol}"))
+
+    def _wait_first_ticks(self, pubsub, legs, seen_ns, generation, label):
+        deadline = seen_ns + int(self.timeout * 1e9)
+        first = {}
+        try:
+            while len(first) < len(legs) and generation == self._generation:
+                remaining = (deadline - time.monotonic_ns()) / 1e9
+                if remaining <= 0:
+                    self.timeouts += 1
+                    SWITCH_TIMEOUTS.inc()
+                    missing = [ex for ch, ex in legs.items() if ex not in first]
+                    print(f"切换计时超时：{label}，{self.timeout}秒内未收到 {missing} 的行情")
+                    return
+                message = pubsub.get_message(timeout=min(remaining, 0.5))
+                if message is None or message['type'] != 'message':
+                    continue
+                ex = legs.get(message['channel'].decode('utf-8'))
+                if ex is not None and ex not in first:
+                    first[ex] = (time.monotonic_ns() - seen_ns) / 1e6
+                    self.latency.record(ex, 'command_to_first_tick', first[ex])
+            if generation != self._generation:
+                return
+            total = max(first.values())
+            self.latency.record('switch', 'command_to_both_legs', total)
+            legs_text = ", ".join(f"{ex} {ms:.1f}ms" for ex, ms in first.items())
+            print(f"切换完成：{label}，两腿到齐 {total:.1f}ms（{legs_text}）")
+            if total > self.slo_ms:
+                print(f"切换耗时超出 SLO（{self.slo_ms}ms）：{total:.1f}ms")
+            print(f"切换耗时统计：{self.latency.summary().get('switch')}，超时 {self.timeouts} 次")
+        except redis.RedisError as e:
+            print(f"切换计时异常：{e}")
+        finally:
+            pubsub.close()
 
+class RedisDockerMonitor:
+    def __init__(self, redis_host='localhost', redis_port=6379, redis_db=0, check_interval=5, use_control_channel=False,
+                 switch_slo_ms=1000):
+        """
+        :param check_interval: 兜底轮询间隔（秒），正常情况下命令通过 pub/sub 通知即时生效
+        :param use_control_channel: True 时为 supervisor 模式：常驻的 collector 对所有交易所保持热连接（未选中的交易所零订阅），
+                                    通过 Redis 控制频道在现有连接上切换订阅，不再重启容器；False 保持原来的 docker 启停方式
+        :param switch_slo_ms: 切换耗时（命令被看到 -> 两条腿都收到第一条 tick）的目标，超出时打印告警
+        """
         self.redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
         self.check_interval = check_interval
+        self.use_control_channel = use_control_channel
         self.last_exchange_a = None
         self.last_exchange_b = None
         self.last_symbol = None
+        self.last_version = 0
+        self.switch_timer = SwitchTimer(self.redis_client, slo_ms=switch_slo_ms)
+
+    def run_commands(self, cmds):
+        """
+        并发执行一组 docker 命令并等待全部结束，耗时取决于最慢的一条而不是总和
+        """
+        procs = []
+        for cmd in cmds:
+            try:
+                procs.append((cmd, subprocess.Popen(cmd)))
+            except OSError as e:
+                print(f"执行失败：{cmd}，错误：{e}")
+        for cmd, proc in procs:
+            if proc.wait() != 0:
+                print(f"执行失败：{cmd}，返回码：{proc.returncode}")
 
     def run_docker_compose(self,exchange_a,exchange_b):
+        # 先并发停止上一对交易所的容器（容器启动时才读取 symbols_list.yml，交易所不变也要重启），再并发启动新的一对
+        self.run_commands([["docker", "compose", "-f", f"docker_compose_ticker_{ex}.yml", "stop"]
+                           for ex in dict.fromkeys([self.last_exchange_a, self.last_exchange_b]) if ex is not None])
+        self.run_commands([["docker", "compose", "-f", f"docker_compose_ticker_{ex}.yml", "start"]
+                           for ex in dict.fromkeys([exchange_a, exchange_b])])
 
-        sub_cmds=[]
-        if self.last_exchange_a!=None:
-            cmd= ["docker", "compose", "-f", f"docker_compose_ticker_{self.last_exchange_a}.yml", "stop"]
-            sub_cmds.append(cmd)
-        if self.last_exchange_b != None:
-            cmd = ["docker", "compose", "-f", f"docker_compose_ticker_{self.last_exchange_b}.yml", "stop"]
-            sub_cmds.append(cmd)
+    def stop_all_containers(self):
+        files = [f"docker_compose_ticker_{ex}.yml" for ex in ('binance', 'bitget', 'bybit', 'okx')]
+        self.run_commands([["docker", "compose", "-f", f, "up", "-d"] for f in files])
+        self.run_commands([["docker", "compose", "-f", f, "stop"] for f in files])
 
+    def start_collector(self):
+        """
+        确保常驻的多交易所 collector 容器在运行
+        """
+        self.run_commands([["docker", "compose", "-f", "docker_compose_collector.yml", "up", "-d"]])
 
-        time.sleep(3)
-        for cmd in sub_cmds:
-            try:
-                subprocess.run(cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"执行失败：{cmd}，错误：{e}")
+    def wait_collector(self, timeout=30):
+        """
+        等待 collector 订阅上控制频道，返回是否就绪
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            (_, receivers), = self.redis_client.pubsub_numsub(CONTROL_CHANNEL)
+            if receivers:
+                return True
+            time.sleep(0.2)
+        print(f"collector {timeout}秒内未就绪")
+        return False
 
-        cmd1=["docker", "compose", "-f", f"docker_compose_ticker_{exchange_a}.yml", "start"]
-        cmd2=["docker", "compose", "-f", f"docker_compose_ticker_{exchange_b}.yml", "start"]
+    def warm_standby(self):
+        """
+        supervisor 模式启动：拉起 collector，并按当前命令设置订阅（没有命令时所有交易所零订阅），
+        各交易所连接保持打开，切换时只需在现有连接上订阅
+        """
+        self.start_collector()
+        self.wait_collector()
+        command = read_command(self.redis_client) or {'exchange_a': '', 'exchange_b': '', 'symbol': '', 'version': 0}
+        self.switch_subscription(command['exchange_a'], command['exchange_b'], command['symbol'])
+        self.last_exchange_a = command['exchange_a']
+        self.last_exchange_b = command['exchange_b']
+        self.last_symbol = command['symbol']
+        self.last_version = command['version']
 
-        sub_cmds=[cmd1,cmd2]
-        for cmd in sub_cmds:
-            try:
-                subprocess.run(cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"执行失败：{cmd}，错误：{e}")
-    def stop_all_containers(self):
-        cmds=[
-            ["docker", "compose", "-f", f"docker_compose_ticker_binance.yml", "up","-d"],
-            ["docker", "compose", "-f", f"docker_compose_ticker_bitget.yml", "up","-d"],
-            ["docker", "compose", "-f", f"docker_compose_ticker_bybit.yml", "up","-d"],
-            ["docker", "compose", "-f", f"docker_compose_ticker_okx.yml", "up","-d"],
-            ["docker", "compose", "-f", f"docker_compose_ticker_binance.yml", "stop"],
-            ["docker", "compose", "-f", f"docker_compose_ticker_bitget.yml", "stop"],
-            ["docker", "compose", "-f", f"docker_compose_ticker_bybit.yml", "stop"],
-            ["docker", "compose", "-f", f"docker_compose_ticker_okx.yml", "stop"]
-        ]
-        for cmd in cmds:
-            try:
-                subprocess.run(cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"执行失败：{cmd}，错误：{e}")
+    def switch_subscription(self, exchange_a, exchange_b, symbol):
+        """
+        通过控制频道切换订阅：exchange_a / exchange_b 只保留 symbol，其余交易所清空订阅
+        """
+        for exchange in EXCHANGES:
+            symbols = [symbol] if symbol and exchange in (exchange_a, exchange_b) else []
+            receivers = send_control(self.redis_client, 'set', exchange, symbols)
+            if not receivers:
+                print(f"控制命令无人接收，collector 可能未运行：{exchange} {symbols}")
+                # collector 启动时按 symbols_list.yml 订阅，拉起即可，无需重发命令
+                self.start_collector()
+                return
 
     def write_symbol_to_yaml(self, file_path, symbol):
         """
@@ -71,31 +183,77 @@ class RedisDockerMonitor:
         print(f"处理新命令: exchange_a={exchange_a}, exchange_b={exchange_b}, symbol={symbol}")
         # 使用示例
         self.write_symbol_to_yaml('symbols_list.yml', symbol)
-        self.run_docker_compose(exchange_a,exchange_b)
+        if self.use_control_channel:
+            # collector 重启后仍按 symbols_list.yml 订阅，因此文件照常更新
+            self.switch_subscription(exchange_a, exchange_b, symbol)
+        else:
+            self.run_docker_compose(exchange_a,exchange_b)
 
-    def monitor_redis_command(self):
-        self.stop_all_containers()
+    def switch(self, exchange_a, exchange_b, symbol):
+        """
+        执行切换并计时：先订阅两条腿的频道，再下发切换
+        """
+        seen_ns = time.monotonic_ns()
+        SWITCHES.inc()
+        timer = self.switch_timer.begin(exchange_a, exchange_b, symbol, seen_ns) if exchange_a and exchange_b and symbol else None
+        self.process_command(exchange_a, exchange_b, symbol)
+        if timer is not None:
+            timer.start()
 
-        while True:
+    def check_command(self):
+        """
+        读取完整命令（单次 HGETALL，不会读到写了一半的命令），version 变化且内容变化时执行；
+        version 比上次小说明命令 hash 被清空后重新计数（Redis 重启未持久化、FLUSHDB 等），按新命令处理
+        """
+        command = read_command(self.redis_client)
+        if command is None or command['version'] == self.last_version:
+            return
+        if command['version'] < self.last_version:
+            print(f"命令 version 回退（{self.last_version} -> {command['version']}），{COMMAND_KEY} 可能已被重置，按新命令处理")
+        self.last_version = command['version']
+        COMMANDS.inc()
+        exchange_a, exchange_b, symbol = command['exchange_a'], command['exchange_b'], command['symbol']
+        # 检查是否有变化
+        if (exchange_a != self.last_exchange_a or
+            exchange_b != self.last_exchange_b or
+            symbol != self.last_symbol):
+            self.last_symbol = symbol
+            self.switch(exchange_a, exchange_b, symbol)
+            self.last_exchange_a = exchange_a
+            self.last_exchange_b = exchange_b
 
-            exchange_a = self.redis_client.get('exchange_a')
-            exchange_b = self.redis_client.get('exchange_b')
-            symbol = self.redis_client.get('symbol')
-            # 解码为字符串
-            exchange_a = exchange_a.decode('utf-8') if exchange_a else ''
-            exchange_b = exchange_b.decode('utf-8') if exchange_b else ''
-            symbol = symbol.decode('utf-8') if symbol else ''
-            # 检查是否有变化
-            if (exchange_a != self.last_exchange_a or
-                exchange_b != self.last_exchange_b or
-                symbol != self.last_symbol):
-                self.last_symbol = symbol
-                self.process_command(exchange_a, exchange_b, symbol)
-                self.last_exchange_a = exchange_a
-                self.last_exchange_b = exchange_b
-            time.sleep(self.check_interval)
+    def wait_notify(self, pubsub):
+        """
+        等待命令通知，最多 check_interval 秒（超时即兜底轮询）；连续到达的多条通知合并为一次读取
+        """
+        message = pubsub.get_message(timeout=self.check_interval)
+        while message is not None:
+            message = pubsub.get_message(timeout=0)
+
+    def monitor_redis_command(self):
+        if self.use_control_channel:
+            self.warm_standby()
+        else:
+            self.stop_all_containers()
 
+        pubsub = None
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(COMMAND_CHANNEL)
+                # 先订阅再读取，订阅之前写入的命令也不会漏掉
+                self.check_command()
+                self.wait_notify(pubsub)
+            except redis.RedisError as e:
+                REDIS_ERRORS.inc()
+                print(f"Redis 异常：{e}，{self.check_interval}秒后重试")
+                if pubsub is not None:
+                    pubsub.close()
+                    pubsub = None
+                time.sleep(self.check_interval)
 
 if __name__ == "__main__":
-    monitor = RedisDockerMonitor()
+    serve_metrics(read_config('config.yml'), 'schedual_bot')
+    monitor = RedisDockerMonitor(use_control_channel=True)
     monitor.monitor_redis_command()
@@ -0,0 +1,196 @@
+import collections
+import fnmatch
+import json
+import math
+import time
+
+
+# 价差信号频道
+SIGNAL_CHANNEL = 'signal:channel:spread'
+
+RULE_TYPES = ('threshold', 'zscore')
+RULE_OPS = ('above', 'below', 'abs')
+
+
+class RollingStats:
+    """
+    时间窗口内的滚动均值 / 方差：每个点进出窗口各一次，增删均为 O(1)（Welford 增量公式）
+    """
+    def __init__(self, window_ms):
+        self.window_ms = window_ms
+        self._points = collections.deque()
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, ts_ms, value):
+        self._points.append((ts_ms, value))
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.expire(ts_ms)
+
+    def expire(self, now_ms):
+        left = now_ms - self.window_ms
+        while self._points and self._points[0][0] < left:
+            _, value = self._points.popleft()
+            if self.count == 1:
+                self.count, self.mean, self._m2 = 0, 0.0, 0.0
+                continue
+            delta = value - self.mean
+            self.count -= 1
+            self.mean -= delta / self.count
+            self._m2 -= delta * (value - self.mean)
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(self._m2, 0.0) / (self.count - 1))
+
+
+class AlertRule:
+    """
+    一条告警规则（通常来自 config.yml 的 alert_rules）：
+        name         规则名，写入信号
+        type         threshold：field 的值与 value 比较；zscore：field 在 window_ms 内的 z 分数与 value 比较
+        field        spread / spread_pct
+        op           above（> value）/ below（< value）/ abs（|x| > value）
+        value        阈值
+        window_ms    zscore 的滚动窗口，min_samples 为窗口内最少样本数
+        hold_ms      条件需持续成立的时长，0 为立即触发
+        debounce_ms  同一规则 × 交易对两次信号的最小间隔
+        symbols      适用的 symbol（支持通配符），默认全部
+        pairs        适用的交易所对，如 ['bybit-bitget']，默认全部
+    """
+    def __init__(self, name, type='threshold', field='spread_pct', op='abs', value=0.0, window_ms=60_000,
+                 min_samples=30, hold_ms=0, debounce_ms=5_000, symbols=None, pairs=None):
+        if type not in RULE_TYPES:
+            raise ValueError(f"type must be one of {RULE_TYPES}, got {type!r}")
+        if op not in RULE_OPS:
+            raise ValueError(f"op must be one of {RULE_OPS}, got {op!r}")
+        if field not in ('spread', 'spread_pct'):
+            raise ValueError(f"field must be 'spread' or 'spread_pct', got {field!r}")
+        self.name = name
+        self.type = type
+        self.field = field
+        self.op = op
+        self.value = float(value)
+        self.window_ms = window_ms
+        self.min_samples = min_samples
+        self.hold_ms = hold_ms
+        self.debounce_ms = debounce_ms
+        self.symbols = [s.upper() for s in symbols] if symbols else None
+        self.pairs = set(pairs) if pairs else None
+
+    def matches(self, symbol, exchange_a, exchange_b):
+        if self.pairs is not None and f"{exchange_a}-{exchange_b}" not in self.pairs:
+            return False
+        return self.symbols is None or any(fnmatch.fnmatchcase(symbol, p) for p in self.symbols)
+
+    def check(self, x):
+        if self.op == 'above':
+            return x > self.value
+        if self.op == 'below':
+            return x < self.value
+        return abs(x) > self.value
+
+
+class _RuleState:
+    __slots__ = ('stats', 'since_ms', 'fired', 'last_signal_ms')
+
+    def __init__(self, rule):
+        self.stats = RollingStats(rule.window_ms) if rule.type == 'zscore' else None
+        self.since_ms = None
+        self.fired = False
+        self.last_signal_ms = None
+
+
+class AlertEngine:
+    """
+    价差告警：作为 RedisTickerListener 的 spread handler，对每个 规则 × (symbol, A, B) 维护独立状态，
+    条件持续 hold_ms 后发出一次信号（同一次持续只发一次），两次信号至少间隔 debounce_ms。
+    信号经 BatchPublisher 发布到 SIGNAL_CHANNEL，不阻塞价差计算线程。
+    """
+    def __init__(self, rules, publisher=None, logger=None):
+        self.rules = list(rules)
+        self.publisher = publisher
+        self.logger = logger
+        self.handlers = []
+        self._states = {}
+        # (symbol, A, B) -> 适用的规则，首次出现时匹配一次
+        self._matched = {}
+        self.signals = 0
+
+    def add_handler(self, handler):
+        """
+        注册信号回调 handler(signal_dict)，与 Redis 发布并行
+        """
+        self.handlers.append(handler)
+
+    def __call__(self, symbol, exchange_a, exchange_b, spread, spread_pct):
+        self.update(symbol, exchange_a, exchange_b, spread, spread_pct)
+
+    def update(self, symbol, exchange_a, exchange_b, spread, spread_pct, now_ms=None):
+        key = (symbol, exchange_a, exchange_b)
+        rules = self._matched.get(key)
+        if rules is None:
+            rules = self._matched[key] = [r for r in self.rules if r.matches(symbol, exchange_a, exchange_b)]
+        if not rules:
+            return
+        if now_ms is None:
+            now_ms = time.time() * 1000
+        for rule in rules:
+            state = self._states.get((rule.name, key))
+            if state is None:
+                state = self._states[(rule.name, key)] = _RuleState(rule)
+            x = spread_pct if rule.field == 'spread_pct' else spread
+            metric = x
+            if state.stats is not None:
+                stats = state.stats
+                # 当前值与此前窗口比较，再加入窗口
+                stats.expire(now_ms)
+                std = stats.std
+                metric = (x - stats.mean) / std if stats.count >= rule.min_samples and std > 0 else None
+                stats.add(now_ms, x)
+            if metric is None or not rule.check(metric):
+                state.since_ms = None
+                state.fired = False
+                continue
+            if state.since_ms is None:
+                state.since_ms = now_ms
+            if state.fired or now_ms - state.since_ms < rule.hold_ms:
+                continue
+            if state.last_signal_ms is not None and now_ms - state.last_signal_ms < rule.debounce_ms:
+                continue
+            state.fired = True
+            state.last_signal_ms = now_ms
+            self._emit({
+                "rule": rule.name, "type": rule.type, "symbol": symbol, "a": exchange_a, "b": exchange_b,
+                "spread": spread, "spread_pct": spread_pct, "metric": metric,
+                "held_ms": round(now_ms - state.since_ms, 3), "ts": round(now_ms, 3),
+            })
+
+    def _emit(self, signal):
+        self.signals += 1
+        if self.logger:
+            self.logger.info(f"价差信号: {signal}")
+        if self.publisher is not None:
+            self.publisher.publish(SIGNAL_CHANNEL, json.dumps(signal))
+        for handler in self.handlers:
+            handler(signal)
+
+    def close(self):
+        if self.publisher is not None:
+            self.publisher.close()
+
+
+def build_alert_engine(config, publisher=None, logger=None):
+    """
+    按 config.yml 的 alert_rules 创建 AlertEngine；没有配置规则时返回 None
+    """
+    rules = [AlertRule(**rule) for rule in config.get('alert_rules') or []]
+    if not rules:
+        return None
+    return AlertEngine(rules, publisher=publisher, logger=logger)
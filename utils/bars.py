@@ -0,0 +1,176 @@
+import collections
+import math
+import time
+
+from utils.ticker_store import EXCHANGES
+
+
+# 默认 K 线周期（秒）
+DEFAULT_INTERVALS = (1, 60, 300)
+
+
+class RollingWindow:
+    """
+    最近 n 个值的滚动均值 / 标准差 / 最小 / 最大，每次 add 均摊 O(1)（最值用单调队列）
+    """
+    def __init__(self, n):
+        self.n = n
+        self._values = collections.deque()
+        self._min = collections.deque()
+        self._max = collections.deque()
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._seq = 0
+
+    def add(self, x):
+        self._values.append(x)
+        self._sum += x
+        self._sumsq += x * x
+        while self._min and self._min[-1][1] >= x:
+            self._min.pop()
+        self._min.append((self._seq, x))
+        while self._max and self._max[-1][1] <= x:
+            self._max.pop()
+        self._max.append((self._seq, x))
+        self._seq += 1
+        if len(self._values) > self.n:
+            old = self._values.popleft()
+            self._sum -= old
+            self._sumsq -= old * old
+        first = self._seq - len(self._values)
+        while self._min[0][0] < first:
+            self._min.popleft()
+        while self._max[0][0] < first:
+            self._max.popleft()
+
+    def summary(self):
+        count = len(self._values)
+        if not count:
+            return None
+        mean = self._sum / count
+        var = max(self._sumsq / count - mean * mean, 0.0) * count / (count - 1) if count > 1 else 0.0
+        return {"n": count, "mean": mean, "std": math.sqrt(var), "min": self._min[0][1], "max": self._max[0][1]}
+
+
+class _Bar:
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'count', 'sum', 'sumsq')
+
+    def __init__(self, start, value):
+        self.start = start
+        self.open = self.high = self.low = self.close = value
+        self.count = 1
+        self.sum = value
+        self.sumsq = value * value
+
+    def add(self, value):
+        if value > self.high:
+            self.high = value
+        if value < self.low:
+            self.low = value
+        self.close = value
+        self.count += 1
+        self.sum += value
+        self.sumsq += value * value
+
+
+class BarAggregator:
+    """
+    增量 OHLC 聚合：每个 series × 周期只保留当前一根未完成的 K 线，新值落入下一周期或 sweep 发现周期已过时收线，
+    收线时附带 K 线内的均值 / 标准差，以及最近 rolling_bars 根收盘价的滚动统计，交给 on_bar(interval, series, bar)。
+    时间使用数据自带的事件时间（毫秒），迟到的值计入当前 K 线；所属周期已收线且还没有下一根 K 线时丢弃（计入 late），
+    已收线的周期不会重新打开。
+    sweep 按事件时间水位（已见到的最大 ts）收线，与采集延迟、本地时钟偏差无关；
+    超过 idle_ms 没有新值的 series 才按本地时钟收线（行情整体中断时 K 线也能结束）
+    """
+    def __init__(self, intervals=DEFAULT_INTERVALS, rolling_bars=60, on_bar=None, idle_ms=5000):
+        self.intervals = [int(i) for i in intervals]
+        self.rolling_bars = rolling_bars
+        self.on_bar = on_bar
+        self._bars = {}
+        self._rolling = {}
+        # (series, interval) -> 最后一根已收线 K 线的 start
+        self._closed = {}
+        self.late = 0
+        self.idle_ms = idle_ms
+        # 事件时间水位，以及每个 series 最后一次收到值的本地单调时钟
+        self.watermark = None
+        self._touched = {}
+
+    def update(self, series, value, ts_ms):
+        if self.watermark is None or ts_ms > self.watermark:
+            self.watermark = ts_ms
+        self._touched[series] = time.monotonic()
+        for interval in self.intervals:
+            span = interval * 1000
+            start = int(ts_ms // span) * span
+            key = (series, interval)
+            bar = self._bars.get(key)
+            if bar is None:
+                closed = self._closed.get(key)
+                if closed is not None and start <= closed:
+                    self.late += 1
+                    continue
+                self._bars[key] = _Bar(start, value)
+            elif start > bar.start:
+                self._close(key, bar)
+                self._bars[key] = _Bar(start, value)
+            else:
+                bar.add(value)
+
+    def sweep(self, now_ms, grace_ms=200):
+        """
+        收掉结束时间 + grace_ms 不晚于事件时间水位的 K 线；超过 idle_ms 没有新值的 series 改用本地时钟 now_ms 判断
+        """
+        idle_before = time.monotonic() - self.idle_ms / 1000.0
+        for key, bar in list(self._bars.items()):
+            end = bar.start + key[1] * 1000 + grace_ms
+            if (self.watermark is not None and end <= self.watermark) or \
+                    (self._touched.get(key[0], 0.0) <= idle_before and end <= now_ms):
+                del self._bars[key]
+                self._close(key, bar)
+
+    def _close(self, key, bar):
+        series, interval = key
+        self._closed[key] = bar.start
+        rolling = self._rolling.get(key)
+        if rolling is None:
+            rolling = self._rolling[key] = RollingWindow(self.rolling_bars)
+        rolling.add(bar.close)
+        mean = bar.sum / bar.count
+        var = max(bar.sumsq / bar.count - mean * mean, 0.0)
+        result = {
+            "series": series, "interval": interval, "start": bar.start, "end": bar.start + interval * 1000,
+            "open": bar.open, "high": bar.high, "low": bar.low, "close": bar.close,
+            "count": bar.count, "mean": mean, "std": math.sqrt(var),
+            "rolling": rolling.summary(),
+        }
+        if self.on_bar is not None:
+            self.on_bar(interval, series, result)
+
+
+class CrossVenueSpreads:
+    """
+    记录每个 symbol 在各交易所的最新价，某个交易所更新时算出它与其他交易所的价差百分比（A - B 相对 B，
+    A / B 按 EXCHANGES 顺序，与 SpreadEngine 默认的交易所对一致）
+    """
+    def __init__(self, exchanges=EXCHANGES):
+        self.order = {ex: i for i, ex in enumerate(exchanges)}
+        self._prices = {}
+
+    def update(self, exchange, symbol, price, ts_ms):
+        """
+        返回 [(exchange_a, exchange_b, spread, spread_pct, ts_ms), ...]，ts_ms 取两条腿中较新的事件时间
+        """
+        legs = self._prices.setdefault(symbol, {})
+        legs[exchange] = (price, ts_ms)
+        result = []
+        for other, (other_price, other_ts) in legs.items():
+            if other == exchange or other not in self.order or exchange not in self.order:
+                continue
+            if self.order[exchange] < self.order[other]:
+                (a, pa), (b, pb) = (exchange, price), (other, other_price)
+            else:
+                (a, pa), (b, pb) = (other, other_price), (exchange, price)
+            spread = pa - pb
+            result.append((a, b, spread, spread / pb * 100.0 if pb else 0.0, max(ts_ms, other_ts)))
+        return result
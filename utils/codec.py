@@ -0,0 +1,129 @@
+import json
+import struct
+import zlib
+
+
+# 二进制 ticker 记录 v1（小端，定长 64 字节）：
+#   B  版本号 BINARY_V1（同时作为魔数，JSON 以 '{' 开头，可据首字节区分）
+#   B  交易所 id（见 VENUE_IDS，0 为未知）
+#   H  保留
+#   I  symbol id（crc32，用于校验/离线存储，symbol 本身由频道名给出）
+#   d  last_price
+#   q  ts        交易所事件时间（毫秒，0 表示缺失）
+#   d  recv_ms   本地收到时间（墙上时钟毫秒）
+#   q  recv_ns   本地收到时间（单调时钟纳秒）
+#   q  pub_ns    发布时间（单调时钟纳秒）
+#   Q  seq       本地发布序号
+#   q  xseq      交易所序号（-1 表示缺失）
+BINARY_V1 = 0xB1
+TICK_V1 = struct.Struct('<BBHIdqdqqQq')
+
+# v2（96 字节）：v1 之后追加盘口，版本号为 BINARY_V2，缺失的盘口字段写 NaN
+#   d  bid       买一价
+#   d  ask       卖一价
+#   d  bid_size  买一量
+#   d  ask_size  卖一量
+BINARY_V2 = 0xB2
+TICK_V2 = struct.Struct('<BBHIdqdqqQqdddd')
+
+BOOK_FIELDS = ('bid', 'ask', 'bid_size', 'ask_size')
+_NAN = float('nan')
+
+WIRE_FORMATS = ('json', 'binary')
+
+# 线上协议的一部分，只能追加不能改号
+VENUE_IDS = {'binance': 1, 'bybit': 2, 'okx': 3, 'bitget': 4}
+VENUE_NAMES = {i: ex for ex, i in VENUE_IDS.items()}
+
+_symbol_ids = {}
+
+
+def symbol_id(symbol):
+    sid = _symbol_ids.get(symbol)
+    if sid is None:
+        sid = _symbol_ids[symbol] = zlib.crc32(symbol.upper().encode())
+    return sid
+
+
+def _book_value(value):
+    return float(value) if value is not None and value != '' else _NAN
+
+
+def encode_binary(exchange, symbol, record, version=None):
+    """
+    编码为定长二进制记录；version 为 None 时有盘口（bid / ask）用 v2，否则用 v1
+    """
+    if version is None:
+        version = 2 if record.get('bid') is not None or record.get('ask') is not None else 1
+    xseq = record.get('xseq')
+    head = (
+        VENUE_IDS.get(exchange, 0),
+        0,
+        symbol_id(symbol),
+        float(record['last_price']),
+        int(record.get('ts') or 0),
+        float(record.get('recv_ms') or 0.0),
+        record.get('recv_ns') or 0,
+        record.get('pub_ns') or 0,
+        record.get('seq') or 0,
+        int(xseq) if xseq is not None else -1,
+    )
+    if version == 1:
+        return TICK_V1.pack(BINARY_V1, *head)
+    return TICK_V2.pack(BINARY_V2, *head, *(_book_value(record.get(f)) for f in BOOK_FIELDS))
+
+
+def is_binary(payload):
+    """
+    是否为 v1 / v2 二进制记录（JSON 以 '{' 开头，不会与版本号冲突）
+    """
+    n = len(payload)
+    return (n == TICK_V1.size and payload[0] == BINARY_V1) or (n == TICK_V2.size and payload[0] == BINARY_V2)
+
+
+def decode_binary(payload):
+    (_, venue, _, sid, price, ts, recv_ms, recv_ns, pub_ns, seq, xseq) = TICK_V1.unpack_from(payload)
+    record = {
+        'last_price': price,
+        'ts': ts or None,
+        'recv_ms': recv_ms or None,
+        'recv_ns': recv_ns or None,
+        'pub_ns': pub_ns or None,
+        'seq': seq,
+        'xseq': xseq if xseq >= 0 else None,
+        'venue': VENUE_NAMES.get(venue),
+        'symbol_id': sid,
+    }
+    if payload[0] == BINARY_V2:
+        book = TICK_V2.unpack_from(payload)[-4:]
+        for field, value in zip(BOOK_FIELDS, book):
+            record[field] = None if value != value else value
+    return record
+
+
+def encode_record(exchange, symbol, record, wire_format='json'):
+    """
+    按 wire_format 序列化一条 ticker 记录，生产者（BatchPublisher）使用
+    """
+    if wire_format == 'binary':
+        return encode_binary(exchange, symbol, record)
+    return json.dumps(record, ensure_ascii=False)
+
+
+def decode_record(payload):
+    """
+    解码一条 ticker 记录（频道消息或 latest hash 中的值），根据首字节自动识别 JSON / 二进制，
+    返回 dict；无法解码返回 None
+    """
+    if payload is None:
+        return None
+    raw = isinstance(payload, (bytes, bytearray, memoryview))
+    if raw and is_binary(payload):
+        return decode_binary(payload)
+    try:
+        if raw:
+            payload = bytes(payload).decode('utf-8')
+        record = json.loads(payload)
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return record if isinstance(record, dict) else None
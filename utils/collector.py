@@ -0,0 +1,327 @@
+import asyncio
+import json
+import time
+
+import websockets
+
+from utils.metrics import FeedMetrics, LogSampler
+from utils.quotes import QuoteTable
+from utils.ticker_store import receive_stamp
+from utils.utils import shard_symbols
+
+
+class Shard:
+    """
+    一条 websocket 连接，负责某个交易所的一部分 symbol，拥有独立的重连循环。
+    """
+    def __init__(self, adapter, index, symbols):
+        self.adapter = adapter
+        self.index = index
+        self.symbols = list(symbols)
+        self.name = f"{adapter.name}#{index}"
+        self.ws = None
+        # 连续失败次数：连接失败或连上后尚未收到行情就断开都算一次，收到行情后清零
+        self.failures = 0
+        self._stop_event = asyncio.Event()
+
+    @property
+    def connected(self):
+        return self.ws is not None
+
+    async def add_symbols(self, symbols):
+        """
+        把 symbol 加入本分片；已连接时直接在现有连接上订阅，未连接（或发送失败）时在下次连接时订阅
+        """
+        self.symbols.extend(symbols)
+        await self._send_ops(self.adapter.build_resubscribe(symbols), "已追加订阅")
+
+    async def remove_symbols(self, symbols):
+        """
+        从本分片移除 symbol；已连接时直接在现有连接上取消订阅
+        """
+        drop = set(symbols)
+        self.symbols = [s for s in self.symbols if s not in drop]
+        await self._send_ops(self.adapter.build_unsubscribe(symbols), "已取消订阅")
+
+    async def _send_ops(self, ops, action):
+        ws = self.ws
+        if ws is None:
+            return
+        try:
+            for op in ops:
+                await ws.send(json.dumps(op))
+                self.adapter.logger.info(f"[{self.name}] {action}: {op}")
+        except Exception as e:
+            # 连接已断开，重连时会按当前 symbols 重新订阅
+            self.adapter.logger.error(f"[{self.name}] {action}失败: {e}")
+
+    async def _heartbeat(self, ws):
+        adapter = self.adapter
+        while True:
+            await asyncio.sleep(adapter.app_ping_interval)
+            await ws.send(adapter.app_ping if isinstance(adapter.app_ping, str) else json.dumps(adapter.app_ping))
+
+    async def _run_once(self):
+        adapter = self.adapter
+        url = adapter.build_url(self.symbols)
+        adapter.logger.info(f"[{self.name}] 连接URL: {url}")
+        kwargs = {"ping_interval": 20, "ping_timeout": 10, "max_queue": None}
+        if adapter.proxy:
+            kwargs["proxy"] = adapter.proxy
+        async with websockets.connect(url, **kwargs) as ws:
+            adapter.logger.info(f"[{self.name}] WebSocket连接已打开，symbol 数: {len(self.symbols)}")
+            if self.symbols:
+                for sub in adapter.build_subscribe(self.symbols):
+                    await ws.send(json.dumps(sub))
+                    adapter.logger.info(f"[{self.name}] 已发送订阅: {sub}")
+            self.ws = ws
+            heartbeat = asyncio.create_task(self._heartbeat(ws)) if adapter.app_ping else None
+            try:
+                async for message in ws:
+                    if adapter.on_message(message) and self.failures:
+                        self.failures = 0
+            finally:
+                self.ws = None
+                if heartbeat:
+                    heartbeat.cancel()
+        adapter.logger.warning(f"[{self.name}] ### closed ###")
+
+    async def run_forever(self):
+        """
+        独立的重连循环：连接断开或异常后等待 reconnect_delay 秒重连；
+        连续失败达到 max_failures 且还有其他分片存活时，把本分片的 symbol 交给 adapter 重新分配后退出
+        """
+        adapter = self.adapter
+        while not self._stop_event.is_set():
+            try:
+                await self._run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                adapter.logger.error(f"[{self.name}] 连接异常: {e}")
+            if self._stop_event.is_set():
+                break
+            adapter.feed.reconnect()
+            self.failures += 1
+            if self.failures >= adapter.max_failures and await adapter.retire_shard(self):
+                break
+            adapter.logger.info(f"[{self.name}] {adapter.reconnect_delay}秒后重试连接...")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=adapter.reconnect_delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class ExchangeAdapter:
+    """
+    asyncio 版交易所行情适配器基类，一个实例对应一个交易所。
+    symbol 按 max_symbols_per_conn 分到多条连接（Shard），每条连接独立重连，某条连接持续失败时其 symbol 会重新分配。
+    运行中可通过 subscribe / unsubscribe / set_symbols 在现有连接上增减订阅，无需重启进程；
+    没有任何 symbol 时也保持一条空连接，随时可以订阅。
+    子类需要提供 name / url / frame_parser（见 utils/decoder.make_frame_parser），按需实现 build_subscribe 与 on_other。
+    """
+    name = None
+    url = None
+    # 交易所要求的应用层心跳（None 表示只依赖协议层 ping）
+    app_ping = None
+    app_ping_interval = 20
+    reconnect_delay = 5
+    # frame_parser(message) -> (ticks, data)，ticks 为 [(symbol, record), ...]，非行情消息为 None
+    frame_parser = None
+    # 单条连接最多承载的 symbol 数（受 URL 长度 / 单连接订阅数限制）
+    max_symbols_per_conn = 100
+    # 分片连续失败多少次后判定为失效并重新分配其 symbol
+    max_failures = 3
+
+    def __init__(self, symbols, publisher, logger, debug=False, proxy=None, max_symbols_per_conn=None, quotes=None,
+                 log_sampler=None):
+        self.symbols = [s.lower() for s in symbols]
+        self.publisher = publisher
+        self.logger = logger
+        self.debug = debug
+        self.proxy = proxy
+        if max_symbols_per_conn:
+            self.max_symbols_per_conn = max_symbols_per_conn
+        self.shards = []
+        self._tasks = {}
+        self._next_index = 0
+        self._stop_event = asyncio.Event()
+        # per-symbol 状态表：补齐缺失字段、去掉未变化的记录、按配置限频（见 utils/quotes.py）
+        self.quotes = quotes if quotes is not None else QuoteTable()
+        # 采集指标（见 utils/metrics.py）；debug 时逐条行情日志按 symbol 采样输出
+        self.feed = FeedMetrics(self.name)
+        self.tick_log = log_sampler if log_sampler is not None else LogSampler()
+
+    def build_url(self, symbols):
+        return self.url
+
+    def build_subscribe(self, symbols):
+        """
+        返回连接建立后需要发送的订阅消息列表
+        """
+        return []
+
+    def build_resubscribe(self, symbols):
+        """
+        返回在已连接的 websocket 上追加订阅 symbols 的消息列表，默认与 build_subscribe 相同
+        """
+        return self.build_subscribe(symbols)
+
+    def build_unsubscribe(self, symbols):
+        """
+        返回在已连接的 websocket 上取消订阅 symbols 的消息列表
+        """
+        return []
+
+    def on_other(self, data):
+        """
+        处理非行情消息（订阅回执、心跳回复、错误事件等），data 为整帧解码后的 dict
+        """
+        pass
+
+    def save_ticker_to_redis(self, symbol, record, recv=None):
+        """
+        推送ticker数据到 Redis Channel 并更新最新值缓存，入队后由 publisher 批量发送
+        """
+        if recv:
+            record.update(recv)
+        self.publisher.publish_ticker(self.name, symbol, record)
+
+    def on_message(self, message):
+        """
+        处理一帧消息，返回是否包含行情
+        """
+        if message == 'pong':
+            return False
+        recv = receive_stamp()
+        started = time.perf_counter()
+        try:
+            ticks, data = self.frame_parser(message)
+        except Exception as e:
+            self.logger.error(f"[{self.name}] 消息解析错误: {e} | 原始: {message[:200]}")
+            return False
+        feed = self.feed
+        feed.frame(time.perf_counter() - started)
+        if ticks is None:
+            self.on_other(data)
+            return False
+        for symbol, record in ticks:
+            feed.tick(symbol)
+            # 先打上收到时间，限频推迟发布的记录仍保留真实的收到时间
+            record.update(recv)
+            if self.quotes.update(symbol, record, recv["recv_ms"]) is None:
+                continue
+            if self.debug and self.tick_log.due(symbol):
+                self.logger.info(f"[{self.name}] 交易对: {symbol} 最新价: {record['last_price']}")
+            self.save_ticker_to_redis(symbol, record)
+            feed.published(symbol)
+        return True
+
+    async def flush_quotes(self):
+        """
+        限频开启时定期补发窗口已结束的最后一条记录
+        """
+        interval = self.quotes.min_interval_ms / 1000.0 / 4
+        while True:
+            await asyncio.sleep(interval)
+            for symbol, record in self.quotes.due():
+                self.save_ticker_to_redis(symbol, record)
+                self.feed.published(symbol)
+
+    def _start_shard(self, symbols):
+        shard = Shard(self, self._next_index, symbols)
+        self._next_index += 1
+        self.shards.append(shard)
+        self._tasks[shard] = asyncio.create_task(shard.run_forever())
+        return shard
+
+    async def retire_shard(self, shard):
+        """
+        把失效分片的 symbol 分给仍在连接中的分片（按剩余容量，从最空的开始），放不下的开一条新连接。
+        没有存活分片时返回 False，由该分片继续自行重连。
+        """
+        alive = [s for s in self.shards if s is not shard and s.connected]
+        if not alive:
+            return False
+        self.logger.warning(f"[{shard.name}] 连续失败 {shard.failures} 次，重新分配 {len(shard.symbols)} 个 symbol")
+        self.shards.remove(shard)
+        self._tasks.pop(shard, None)
+        await self._assign(shard.symbols, alive)
+        return True
+
+    async def _assign(self, symbols, targets):
+        """
+        按剩余容量把 symbols 分给 targets（从最空的分片开始），放不下的开新连接
+        """
+        pending = list(symbols)
+        for target in sorted(targets, key=lambda s: len(s.symbols)):
+            room = self.max_symbols_per_conn - len(target.symbols)
+            if room <= 0 or not pending:
+                continue
+            moved, pending = pending[:room], pending[room:]
+            await target.add_symbols(moved)
+        for group in shard_symbols(pending, self.max_symbols_per_conn):
+            self._start_shard(group)
+
+    async def subscribe(self, symbols):
+        """
+        运行时追加订阅，返回实际新增的 symbol
+        """
+        new = []
+        for s in symbols:
+            s = s.lower()
+            if s not in self.symbols and s not in new:
+                new.append(s)
+        if new:
+            self.symbols.extend(new)
+            await self._assign(new, self.shards)
+            self.logger.info(f"[{self.name}] 新增订阅: {new}")
+        return new
+
+    async def unsubscribe(self, symbols):
+        """
+        运行时取消订阅，返回实际移除的 symbol；分片变空后保留连接，供后续订阅使用
+        """
+        drop = {s.lower() for s in symbols} & set(self.symbols)
+        if not drop:
+            return []
+        self.symbols = [s for s in self.symbols if s not in drop]
+        self.quotes.forget(drop)
+        self.feed.forget(drop)
+        for shard in self.shards:
+            removed = [s for s in shard.symbols if s in drop]
+            if removed:
+                await shard.remove_symbols(removed)
+        self.logger.info(f"[{self.name}] 取消订阅: {sorted(drop)}")
+        return sorted(drop)
+
+    async def set_symbols(self, symbols):
+        """
+        把订阅集合替换为 symbols（只对差异部分做订阅/取消订阅）
+        """
+        target = [s.lower() for s in symbols]
+        removed = await self.unsubscribe([s for s in self.symbols if s not in target])
+        added = await self.subscribe(target)
+        return added, removed
+
+    async def run_forever(self):
+        for group in shard_symbols(self.symbols, self.max_symbols_per_conn) or [[]]:
+            self._start_shard(group)
+        self.logger.info(f"[{self.name}] {len(self.symbols)} 个 symbol 分为 {len(self.shards)} 条连接")
+        flusher = asyncio.create_task(self.flush_quotes()) if self.quotes.min_interval_ms > 0 else None
+        try:
+            await self._stop_event.wait()
+        finally:
+            if flusher is not None:
+                flusher.cancel()
+            for shard in self.shards:
+                shard.stop()
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,34 @@
+import json
+
+
+# 交易对切换命令：一个 hash 保存 exchange_a / exchange_b / symbol / version，写入与通知在同一个 MULTI 中完成
+COMMAND_KEY = 'arb:command'
+COMMAND_CHANNEL = 'arb:command:notify'
+COMMAND_FIELDS = ('exchange_a', 'exchange_b', 'symbol')
+
+
+def write_command(rds, exchange_a, exchange_b, symbol):
+    """
+    原子写入切换命令并通知监听方，返回新的 version。
+    HSET 三个字段、version 自增、PUBLISH 通知在同一事务里执行，读方不会读到写了一半的命令。
+    """
+    pipe = rds.pipeline(transaction=True)
+    pipe.hset(COMMAND_KEY, mapping={'exchange_a': exchange_a, 'exchange_b': exchange_b, 'symbol': symbol})
+    pipe.hincrby(COMMAND_KEY, 'version', 1)
+    pipe.publish(COMMAND_CHANNEL, json.dumps({'exchange_a': exchange_a, 'exchange_b': exchange_b, 'symbol': symbol}))
+    _, version, _ = pipe.execute()
+    return version
+
+
+def read_command(rds):
+    """
+    一次 HGETALL 读取完整命令，返回 {'exchange_a', 'exchange_b', 'symbol', 'version'}；尚无命令返回 None
+    """
+    raw = rds.hgetall(COMMAND_KEY)
+    if not raw:
+        return None
+    raw = {(k.decode('utf-8') if isinstance(k, bytes) else k): (v.decode('utf-8') if isinstance(v, bytes) else v)
+           for k, v in raw.items()}
+    command = {field: raw.get(field, '') for field in COMMAND_FIELDS}
+    command['version'] = int(raw.get('version') or 0)
+    return command
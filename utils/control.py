@@ -0,0 +1,36 @@
+import json
+
+
+# collector 运行时控制频道
+CONTROL_CHANNEL = 'collector:control'
+CONTROL_OPS = ('subscribe', 'unsubscribe', 'set')
+
+
+def send_control(rds, op, exchange, symbols):
+    """
+    向 collector 发送订阅控制命令：
+        subscribe   追加订阅 symbols
+        unsubscribe 取消订阅 symbols
+        set         把订阅集合替换为 symbols（只对差异部分操作）
+    exchange 为 '*' 时作用于所有交易所；返回收到命令的 collector 数量
+    """
+    if op not in CONTROL_OPS:
+        raise ValueError(f"op must be one of {CONTROL_OPS}, got {op!r}")
+    payload = json.dumps({"op": op, "exchange": exchange, "symbols": list(symbols)})
+    return rds.publish(CONTROL_CHANNEL, payload)
+
+
+def parse_control(payload):
+    """
+    解析控制命令，返回 (op, exchange, symbols)；格式不正确时抛出 ValueError
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    cmd = json.loads(payload)
+    op = cmd.get('op')
+    if op not in CONTROL_OPS:
+        raise ValueError(f"unknown control op: {op!r}")
+    symbols = cmd.get('symbols') or []
+    if not isinstance(symbols, list):
+        raise ValueError("symbols must be a list")
+    return op, cmd.get('exchange') or '*', [str(s) for s in symbols]
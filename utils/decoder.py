@@ -0,0 +1,51 @@
+import json
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 整帧 JSON 解码：orjson > msgspec > 标准库，均返回 dict/list
+if orjson is not None:
+    loads = orjson.loads
+    BACKEND = 'orjson'
+elif msgspec is not None:
+    loads = msgspec.json.decode
+    BACKEND = 'msgspec'
+else:
+    loads = json.loads
+    BACKEND = 'json'
+
+# 各交易所的消息 schema 继承 Struct；没有 msgspec 时退化为普通类，只作为类型说明
+Struct = msgspec.Struct if msgspec is not None else object
+
+
+def make_frame_parser(parse_ticker, schema=None, to_ticks=None):
+    """
+    生成 parse_frame(message) -> (ticks, data)：
+    - 有 msgspec 且提供 schema 时，先按 schema 只解码用到的字段（symbol / 价格 / ts 等），
+      再由 to_ticks 转成 [(symbol, record), ...]，此时 data 为 None
+    - schema 不匹配（订阅回执、心跳回复等）、to_ticks 返回 None 或没有 msgspec 时，
+      用 loads 整帧解码后交给 parse_ticker，data 为解码后的 dict
+    ticks 为 None 表示非行情消息。
+    """
+    typed = msgspec.json.Decoder(schema) if msgspec is not None and schema is not None else None
+
+    def parse_frame(message):
+        if typed is not None:
+            try:
+                ticks = to_ticks(typed.decode(message))
+            except (msgspec.ValidationError, msgspec.DecodeError):
+                ticks = None
+            if ticks is not None:
+                return ticks, None
+        data = loads(message)
+        return parse_ticker(data), data
+
+    return parse_frame
@@ -0,0 +1,110 @@
+import bisect
+import threading
+
+from utils.metrics import STAGE_LATENCY
+
+
+# 对数分桶边界（毫秒）：0.01ms ~ 60s，每个数量级 10 个桶
+BUCKET_EDGES_MS = [round(10 ** (e / 10.0), 4) for e in range(-20, 48)]
+
+
+class LatencyHistogram:
+    """
+    固定对数分桶的延迟直方图，记录 O(log 桶数)，分位数为所在桶的上边界（近似值）
+    """
+    def __init__(self, edges=BUCKET_EDGES_MS):
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.min = None
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(self.edges, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+        if self.min is None or ms < self.min:
+            self.min = ms
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        target = self.count * p / 100.0
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(self.edges[i], round(self.max, 3)) if i < len(self.edges) else round(self.max, 3)
+        return round(self.max, 3)
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3),
+            "min": round(self.min, 3),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": round(self.max, 3),
+        }
+
+
+class LatencyTracker:
+    """
+    按 (交易所, 阶段) 分组的延迟直方图，线程安全
+    阶段约定：
+        exch_to_recv   交易所事件时间 -> 采集端收到（墙上时钟，含两端时钟偏差）
+        recv_to_pub    采集端收到 -> 批量发布（单调时钟）
+        pub_to_consume 发布 -> 消费端收到（单调时钟，仅同机部署有效）
+    """
+    STAGES = ('exch_to_recv', 'recv_to_pub', 'pub_to_consume')
+
+    def __init__(self, metric=STAGE_LATENCY):
+        self._hists = {}
+        self._lock = threading.Lock()
+        # 同时写入进程指标（秒），summary(reset=True) 不影响指标的累计值
+        self.metric = metric
+        self._children = {}
+
+    def record(self, venue, stage, ms):
+        with self._lock:
+            hist = self._hists.get((venue, stage))
+            if hist is None:
+                hist = self._hists[(venue, stage)] = LatencyHistogram()
+            hist.record(ms)
+        if self.metric is not None:
+            child = self._children.get((venue, stage))
+            if child is None:
+                child = self._children[(venue, stage)] = self.metric.labels(venue, stage)
+            child.observe(ms / 1000.0)
+
+    def record_tick(self, venue, record, consume_ns):
+        """
+        根据一条 ticker 记录中的 ts / recv_ms / recv_ns / pub_ns 记录三个阶段的延迟，缺失字段的阶段跳过
+        """
+        ts, recv_ms = record.get('ts'), record.get('recv_ms')
+        recv_ns, pub_ns = record.get('recv_ns'), record.get('pub_ns')
+        if ts and recv_ms:
+            self.record(venue, 'exch_to_recv', recv_ms - float(ts))
+        if recv_ns and pub_ns:
+            self.record(venue, 'recv_to_pub', (pub_ns - recv_ns) / 1e6)
+        if pub_ns:
+            self.record(venue, 'pub_to_consume', (consume_ns - pub_ns) / 1e6)
+
+    def summary(self, reset=False):
+        """
+        返回 {venue: {stage: 统计}}；reset=True 时清空，便于按周期输出
+        """
+        with self._lock:
+            hists = dict(self._hists)
+            if reset:
+                self._hists = {}
+        result = {}
+        for (venue, stage), hist in sorted(hists.items()):
+            result.setdefault(venue, {})[stage] = hist.summary()
+        return result
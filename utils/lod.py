@@ -0,0 +1,113 @@
+import numpy as np
+
+from utils.ring_buffer import RingBuffer
+
+
+# 预聚合层：(覆盖时长秒, 桶宽秒)；原始点之外，长窗口从这些层取数
+DEFAULT_TIERS = ((3600, 1.0), (86400, 30.0))
+
+
+def m4(ts, values, left, right, n_buckets):
+    """
+    M4 抽稀：把 [left, right] 均分为 n_buckets 个像素桶，每桶只保留首点、最小值、最大值、末点，
+    折线在像素级与原始数据完全一致；点数不超过 4 * n_buckets 时原样返回。ts 需单调递增。
+    """
+    n = len(ts)
+    if n <= 4 * n_buckets or n_buckets <= 0:
+        return ts, values
+    edges = left + (right - left) * np.arange(1, n_buckets) / n_buckets
+    bounds = np.searchsorted(ts, edges, side='left')
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [n]))
+    keep = starts < ends
+    starts, ends = starts[keep], ends[keep]
+    last = ends - 1
+    mid = (ts[starts] + ts[last]) / 2.0
+    xs = np.column_stack((ts[starts], mid, mid, ts[last])).ravel()
+    ys = np.column_stack((values[starts],
+                          np.minimum.reduceat(values, starts),
+                          np.maximum.reduceat(values, starts),
+                          values[last])).ravel()
+    return xs, ys
+
+
+class _Tier:
+    """
+    一个预聚合层：按 bucket 秒分桶，桶结束时把 首/最小/最大/末 点（按时间排序、去重）写入环形缓冲区
+    """
+    def __init__(self, window_seconds, bucket_seconds):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.buf = RingBuffer(int(window_seconds / bucket_seconds) * 4 + 8)
+        self._bucket = None
+        self._first = self._last = self._min = self._max = None
+        # 已写入缓冲区的最后一个桶的结束时间，之后的数据从原始缓冲区补齐
+        self.closed_until = -np.inf
+
+    def add(self, ts, value):
+        bucket = int(ts // self.bucket_seconds)
+        if bucket != self._bucket:
+            self._close()
+            self._bucket = bucket
+            self._first = self._last = self._min = self._max = (ts, value)
+            return
+        self._last = (ts, value)
+        if value < self._min[1]:
+            self._min = (ts, value)
+        if value > self._max[1]:
+            self._max = (ts, value)
+
+    def _close(self):
+        if self._bucket is None:
+            return
+        for t, v in sorted({self._first, self._min, self._max, self._last}):
+            self.buf.append(t, v)
+        self.closed_until = (self._bucket + 1) * self.bucket_seconds
+
+
+class LodSeries:
+    """
+    多分辨率时间序列：原始点存在 raw 环形缓冲区，同时写入若干预聚合层（见 DEFAULT_TIERS）。
+    window() 选择能覆盖整个窗口的最细一层，尚未结束的最后一个桶用原始点补齐，
+    再按像素宽度做 M4 抽稀，交给 matplotlib 的点数与数据量无关。
+    """
+    def __init__(self, raw_capacity=100_000, tiers=DEFAULT_TIERS):
+        self.raw = RingBuffer(raw_capacity)
+        self.tiers = [_Tier(w, b) for w, b in sorted(tiers)]
+
+    def append(self, ts, value):
+        self.raw.append(ts, value)
+        ts = self.raw.last_ts
+        for tier in self.tiers:
+            tier.add(ts, value)
+
+    def _covers(self, buf, left):
+        ts, _ = buf.view()
+        return len(buf) < buf.capacity or (len(ts) and ts[0] <= left)
+
+    def window(self, left, right, n_buckets):
+        """
+        返回 [left, right] 内抽稀后的 (ts, values, (最小值, 最大值))；ts 为数组副本，可直接交给绘图
+        """
+        tier = None
+        if not self._covers(self.raw, left):
+            for candidate in self.tiers:
+                if candidate.window_seconds >= right - left:
+                    tier = candidate
+                    break
+            else:
+                tier = self.tiers[-1] if self.tiers else None
+
+        if tier is None:
+            ts, values = self.raw.window(left)
+            bounds = self.raw.window_minmax(left)
+        else:
+            ts_t, values_t = tier.buf.window(left)
+            split = max(left, tier.closed_until)
+            ts_r, values_r = self.raw.window(split)
+            ts = np.concatenate((ts_t, ts_r))
+            values = np.concatenate((values_t, values_r))
+            parts = [b for b in (tier.buf.window_minmax(left), self.raw.window_minmax(split)) if b[0] is not None]
+            bounds = (min(b[0] for b in parts), max(b[1] for b in parts)) if parts else (None, None)
+        xs, ys = m4(ts, values, left, right, n_buckets)
+        return xs.copy(), ys.copy(), bounds
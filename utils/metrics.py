@@ -0,0 +1,348 @@
+import bisect
+import http.server
+import math
+import threading
+import time
+
+
+# 直方图默认分桶（秒）：10us ~ 10s
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    一个指标族（counter / gauge / histogram），labels(...) 返回某组标签值的子指标，调用方可缓存后在热路径上直接使用。
+    更新不加锁（依赖 GIL），多线程并发更新同一个子指标时计数可能有极少量偏差，对监控无影响。
+    """
+    def __init__(self, name, help, type, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = _Histogram(self.buckets) if self.type == 'histogram' else _Value()
+                    self._children[values] = child
+        return child
+
+    # 无标签指标的快捷方法
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, child in sorted(self._children.copy().items()):
+            if self.type != 'histogram':
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+                continue
+            cumulative = 0
+            for edge, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = ('le', _format_value(edge))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+
+class _FunctionMetric:
+    """
+    抓取时才计算的指标：fn() 返回数值，或 {标签值元组: 数值}
+    """
+    def __init__(self, name, help, fn, labelnames=(), type='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.type = type
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            result = self.fn()
+        except Exception:
+            return lines
+        if result is None:
+            return lines
+        if not isinstance(result, dict):
+            result = {(): result}
+        for values, value in sorted(result.items()):
+            if value is None:
+                continue
+            values = values if isinstance(values, tuple) else (values,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表，render() 输出 Prometheus 文本格式（见 start_metrics_server）；
+    同名指标重复注册时返回已有的指标，各模块可以各自声明用到的指标
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(name, lambda: Metric(name, help, 'counter', labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(name, lambda: Metric(name, help, 'gauge', labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda: Metric(name, help, 'histogram', labelnames, buckets))
+
+    def function(self, name, help, fn, labelnames=(), type='gauge'):
+        """
+        注册抓取时计算的指标（队列深度、距最后一条 tick 的时间、已有对象上的计数器等）；同名时替换为新的 fn
+        """
+        with self._lock:
+            self._metrics[name] = _FunctionMetric(name, help, fn, labelnames, type)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 默认注册表，一个进程一份
+REGISTRY = MetricsRegistry()
+
+# 行情采集（四个交易所模块与 collector.py 共用，见 FeedMetrics）
+FRAMES = REGISTRY.counter('ticker_frames_total', 'websocket 帧数', ('venue',))
+PARSE_SECONDS = REGISTRY.histogram('ticker_parse_seconds', '单帧解析耗时', ('venue',))
+MESSAGES = REGISTRY.counter('ticker_messages_total', '解析出的行情记录数', ('venue', 'symbol'))
+PUBLISHED = REGISTRY.counter('ticker_published_total', '去重 / 限频后实际发布的记录数', ('venue', 'symbol'))
+RECONNECTS = REGISTRY.counter('ticker_reconnects_total', 'websocket 重连次数', ('venue',))
+
+# 发布端（utils/publisher.py）
+PUBLISH_LATENCY = REGISTRY.histogram('publish_latency_seconds', '采集端收到 -> 批量发送的延迟', ('venue',))
+FLUSH_SECONDS = REGISTRY.histogram('publish_flush_seconds', '一次 Redis pipeline 发送耗时')
+
+# 阶段延迟（utils/latency.py 的 LatencyTracker 同时写入）
+STAGE_LATENCY = REGISTRY.histogram('stage_latency_seconds', '按交易所 / 阶段的延迟（消费延迟、切换耗时等）',
+                                   ('venue', 'stage'))
+
+
+# (venue, symbol) -> 最后一条行情的墙上时钟时间
+_last_tick = {}
+
+
+def _tick_ages():
+    now = time.time()
+    return {key: round(now - ts, 3) for key, ts in _last_tick.copy().items()}
+
+
+REGISTRY.function('ticker_last_tick_age_seconds', '距该 symbol 最后一条行情的秒数', _tick_ages, ('venue', 'symbol'))
+
+# 进程内的 BatchPublisher（见 watch_publisher）
+_publishers = {}
+
+
+def _publisher_stat(field):
+    return lambda: {(name,): p.stats()[field] for name, p in _publishers.copy().items()}
+
+
+REGISTRY.function('publisher_queue_depth', '发送队列深度', _publisher_stat('queue_depth'), ('publisher',))
+REGISTRY.function('publisher_max_queue_depth', '发送队列历史最大深度', _publisher_stat('max_queue_depth'), ('publisher',))
+REGISTRY.function('publisher_messages_total', '已发送的消息数', _publisher_stat('published'), ('publisher',), 'counter')
+REGISTRY.function('publisher_dropped_total', '队列满时丢弃的消息数', _publisher_stat('dropped'), ('publisher',), 'counter')
+REGISTRY.function('publisher_encode_errors_total', '无法编码而丢弃的记录数', _publisher_stat('encode_errors'),
+                  ('publisher',), 'counter')
+REGISTRY.function('publisher_flush_errors_total', 'Redis 发送失败次数', _publisher_stat('flush_errors'), ('publisher',),
+                  'counter')
+
+
+def watch_publisher(name, publisher):
+    """
+    把 BatchPublisher 的队列深度与计数器暴露为指标（标签 publisher=name）
+    """
+    _publishers[name] = publisher
+
+
+class FeedMetrics:
+    """
+    一个交易所采集的指标：帧数、解析耗时、每个 symbol 的记录数 / 发布数、重连次数，
+    以及抓取时计算的每个 symbol 距最后一条行情的秒数（ticker_last_tick_age_seconds）
+    """
+    def __init__(self, venue):
+        self.venue = venue
+        self._frames = FRAMES.labels(venue)
+        self._parse = PARSE_SECONDS.labels(venue)
+        self._reconnects = RECONNECTS.labels(venue)
+        self._messages = {}
+        self._published = {}
+
+    def frame(self, parse_seconds):
+        self._frames.inc()
+        self._parse.observe(parse_seconds)
+
+    def tick(self, symbol):
+        child = self._messages.get(symbol)
+        if child is None:
+            child = self._messages[symbol] = MESSAGES.labels(self.venue, symbol)
+        child.inc()
+        _last_tick[(self.venue, symbol)] = time.time()
+
+    def published(self, symbol):
+        child = self._published.get(symbol)
+        if child is None:
+            child = self._published[symbol] = PUBLISHED.labels(self.venue, symbol)
+        child.inc()
+
+    def reconnect(self):
+        self._reconnects.inc()
+
+    def forget(self, symbols):
+        """
+        取消订阅时不再导出这些 symbol 的 ticker_last_tick_age_seconds（否则年龄一直增长，陈旧告警持续触发）；
+        计数器保留累计值
+        """
+        for symbol in symbols:
+            _last_tick.pop((self.venue, symbol.upper()), None)
+
+
+class LogSampler:
+    """
+    逐条行情日志的采样：同一个 key（通常为 symbol）每 interval 秒最多输出一次，
+    调用方先判断 due(key) 再格式化日志，不输出时不产生字符串开销
+    """
+    def __init__(self, interval=10.0):
+        self.interval = interval
+        self._last = {}
+
+    def due(self, key):
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last[key] = now
+        return True
+
+
+def build_log_sampler(config):
+    return LogSampler(config.get('log_sample_interval', 10.0))
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=REGISTRY):
+    """
+    在后台线程启动 HTTP 服务，GET /metrics 返回 Prometheus 文本格式；返回 server（server.server_port 为实际端口）
+    """
+    handler = type('MetricsHandler', (_Handler,), {'registry': registry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def serve_metrics(config, name, logger=None):
+    """
+    按 config.yml 的 metrics_ports[name] 启动指标服务，未配置或为 0 时不启动；端口被占用时只记录错误
+    """
+    port = (config.get('metrics_ports') or {}).get(name)
+    if not port:
+        return None
+    try:
+        server = start_metrics_server(port, host=config.get('metrics_host', '127.0.0.1'))
+    except OSError as e:
+        if logger:
+            logger.error(f"指标服务启动失败（端口 {port}）: {e}")
+        return None
+    if logger:
+        logger.info(f"指标服务: http://{config.get('metrics_host', '127.0.0.1')}:{port}/metrics")
+    return server
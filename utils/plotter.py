@@ -0,0 +1,297 @@
+import math
+import threading
+import time
+
+import matplotlib
+matplotlib.use('tkagg')  # 可改为 'qt5agg' 或 'agg'（无界面）
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
+
+from utils.lod import LodSeries
+
+
+def style_axis(ax, title, xlabel, ylabel):
+    ax.set_facecolor('#0c0f12')
+    ax.grid(True, color='#2a2f36', linestyle='--', linewidth=0.6)
+    ax.set_title(title, color='white')
+    ax.set_xlabel(xlabel, color='white')
+    ax.set_ylabel(ylabel, color='white')
+    for spine in ax.spines.values():
+        spine.set_color('#3a4048')
+    ax.tick_params(colors='white')
+
+
+def padded_ylim(ymin, ymax, cushion):
+    """
+    按 cushion 比例在上下留白；最小值与最大值相等时各扩 1
+    """
+    if math.isclose(ymin, ymax):
+        ymin -= 1
+        ymax += 1
+    span = ymax - ymin
+    return ymin - span * cushion, ymax + span * cushion
+
+
+class DualOscilloscopePlotter:
+    """
+    一个窗口内绘制两条实时曲线（上下两个子图，等高）：
+    - 上图：价差（A - B）
+    - 下图：价差百分比（默认相对 B： (A - B)/B * 100）
+    - x 轴为相对时间（秒），固定 [-window, 0]
+    - 数据存放在预分配的 numpy 环形缓冲区，并预聚合为 1s / 30s 两层（utils/lod.py），
+      每帧按窗口长度选层、按像素宽度做 M4 抽稀，交给 matplotlib 的点数不随数据量增长
+    - 按键切换窗口：1 -> 1 分钟，5 -> 5 分钟，h -> 1 小时，d -> 24 小时
+    """
+    WINDOW_KEYS = {'1': 60, '5': 300, 'h': 3600, 'd': 86400}
+
+    def __init__(self, window_seconds=300, fps=25,
+                 title_top="Spread A - B", title_bottom="Spread% vs B",
+                 y_label_top="Spread", y_label_bottom="Spread (%)",
+                 color_top='lime', color_bottom='deepskyblue', capacity=100_000):
+        self.window_seconds = window_seconds
+        self.fps = fps
+
+        # 两条曲线的缓冲区
+        self.buf_top = LodSeries(capacity)     # spread
+        self.buf_bottom = LodSeries(capacity)  # spread%
+        self.lock = threading.Lock()
+
+        # 图形与子图（等高）
+        self.fig, (self.ax_top, self.ax_bottom) = plt.subplots(
+            2, 1, figsize=(15, 8), sharex=True, gridspec_kw={'height_ratios': [1, 1]}
+        )
+        self.fig.patch.set_facecolor('#0c0f12')
+
+        # 上图
+        self.line_top, = self.ax_top.plot([], [], color=color_top, linewidth=1.5)
+        style_axis(self.ax_top, title_top, "Time (s)", y_label_top)
+
+        # 下图
+        self.line_bottom, = self.ax_bottom.plot([], [], color=color_bottom, linewidth=1.5)
+        style_axis(self.ax_bottom, title_bottom, "Time (s)", y_label_bottom)
+
+        plt.tight_layout()
+        # matplotlib 默认把 h 绑定为复位视图（keymap.home），从默认快捷键中去掉窗口切换用的按键
+        for name in [k for k in plt.rcParams if k.startswith('keymap.')]:
+            plt.rcParams[name] = [k for k in plt.rcParams[name] if k not in self.WINDOW_KEYS]
+        self.fig.canvas.mpl_connect('key_press_event', self._on_key)
+
+        self.anim = None
+        self._running = False
+
+        # y 轴自适应参数（分别独立）
+        self._last_ylim_update_top = 0
+        self._last_ylim_update_bottom = 0
+        self._ylim_cushion = 0.1
+        self._ylim_min_refresh = 0.2
+
+    def add_point_top(self, value, ts=None):
+        if ts is None:
+            ts = time.time()
+        with self.lock:
+            self.buf_top.append(ts, value)
+
+    def add_point_bottom(self, value, ts=None):
+        if ts is None:
+            ts = time.time()
+        with self.lock:
+            self.buf_bottom.append(ts, value)
+
+    def set_window(self, seconds):
+        self.window_seconds = seconds
+        # x 轴刻度变化，blit 不会重画坐标轴，需要整图重绘一次
+        self._last_ylim_update_top = self._last_ylim_update_bottom = 0
+        self.fig.canvas.draw_idle()
+
+    def _on_key(self, event):
+        seconds = self.WINDOW_KEYS.get(event.key)
+        if seconds is not None and seconds != self.window_seconds:
+            self.set_window(seconds)
+
+    def _get_windowed(self, buf, ax):
+        """
+        返回窗口内抽稀后的 (相对时间, 数值, (最小值, 最大值))；数据在锁内复制，写线程覆盖旧点不影响绘图
+        """
+        now = time.time()
+        n_buckets = max(int(ax.bbox.width), 1)
+        with self.lock:
+            ts, ys, bounds = buf.window(now - self.window_seconds, now, n_buckets)
+        return ts - now, ys, bounds  # 相对时间：负值在左
+
+    def _update_ylim_axis(self, ax, bounds, is_top=True):
+        ymin, ymax = bounds
+        if ymin is None:
+            return
+        now = time.time()
+        last_update = self._last_ylim_update_top if is_top else self._last_ylim_update_bottom
+        if now - last_update < self._ylim_min_refresh:
+            return
+        ax.set_ylim(*padded_ylim(ymin, ymax, self._ylim_cushion))
+        if is_top:
+            self._last_ylim_update_top = now
+        else:
+            self._last_ylim_update_bottom = now
+
+    def _update(self, _frame):
+        # 上图数据
+        xs_top, ys_top, bounds_top = self._get_windowed(self.buf_top, self.ax_top)
+        self.line_top.set_data(xs_top, ys_top)
+        self.ax_top.set_xlim(-self.window_seconds, 0)
+        self._update_ylim_axis(self.ax_top, bounds_top, is_top=True)
+
+        # 下图数据
+        xs_bottom, ys_bottom, bounds_bottom = self._get_windowed(self.buf_bottom, self.ax_bottom)
+        self.line_bottom.set_data(xs_bottom, ys_bottom)
+        self.ax_bottom.set_xlim(-self.window_seconds, 0)
+        self._update_ylim_axis(self.ax_bottom, bounds_bottom, is_top=False)
+
+        return self.line_top, self.line_bottom
+
+    def start(self, block=False):
+        if self._running:
+            return
+        self._running = True
+        interval_ms = 1000 / self.fps
+        self.anim = FuncAnimation(self.fig, self._update, interval=interval_ms, blit=True)
+        plt.show(block=block)
+
+    def stop(self):
+        self._running = False
+        plt.close(self.fig)
+
+    def pause(self, interval):
+        """
+        在主线程处理界面事件 interval 秒
+        """
+        plt.pause(interval)
+
+
+class _Panel:
+    def __init__(self, ax, line, label, capacity):
+        self.ax = ax
+        self.line = line
+        self.label = label
+        self.series = LodSeries(capacity)
+        self.background = None
+        # version 每写入一个点加一，与 rendered_version 相同表示上一帧之后没有新数据
+        self.version = 0
+        self.rendered_version = -1
+        self.rendered_at = 0.0
+
+
+class SpreadDashboard:
+    """
+    一个窗口内按网格排列 N 个交易对的价差百分比曲线：
+    - 可直接作为 RedisTickerListener 的 spread handler：dashboard(symbol, exchange_a, exchange_b, spread, spread_pct)
+    - 所有子图共用一个渲染定时器，曲线为 animated 艺术家，逐子图 blit，不重绘坐标轴
+    - 上一帧之后没有新数据的子图跳过，最多每 idle_refresh 秒刷新一次以推进时间轴
+    - y 轴范围需要变化时才整图重绘（最多每 ylim_min_refresh 秒一次），重绘后重新缓存各子图背景
+    """
+    def __init__(self, pairs, window_seconds=300, fps=25, cols=None, capacity=20_000, idle_refresh=1.0,
+                 color='deepskyblue'):
+        """
+        :param pairs: [(symbol, exchange_a, exchange_b), ...]
+        """
+        self.window_seconds = window_seconds
+        self.fps = fps
+        self.idle_refresh = idle_refresh
+        self.lock = threading.Lock()
+        self._ylim_cushion = 0.1
+        self._ylim_min_refresh = 1.0
+        self._last_full_draw = 0.0
+
+        pairs = [(sym.upper(), a, b) for sym, a, b in pairs]
+        n = max(len(pairs), 1)
+        cols = cols or math.ceil(math.sqrt(n))
+        rows = math.ceil(n / cols)
+        self.fig, axes = plt.subplots(rows, cols, figsize=(min(4 * cols, 24), min(2.6 * rows, 14)),
+                                      sharex=True, squeeze=False)
+        self.fig.patch.set_facecolor('#0c0f12')
+        self.panels = {}
+        axes = axes.ravel()
+        for ax, (sym, a, b) in zip(axes, pairs):
+            line, = ax.plot([], [], color=color, linewidth=1.0, animated=True)
+            label = ax.text(0.01, 0.92, "", transform=ax.transAxes, color='white', fontsize=8, animated=True)
+            style_axis(ax, f"{sym} {a}-{b} (%)", "", "")
+            ax.title.set_fontsize(9)
+            ax.tick_params(labelsize=7)
+            ax.set_xlim(-window_seconds, 0)
+            self.panels[(sym, a, b)] = _Panel(ax, line, label, capacity)
+        for ax in axes[len(pairs):]:
+            ax.set_visible(False)
+        plt.tight_layout()
+
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.timer = None
+        self._running = False
+
+    def __call__(self, symbol, exchange_a, exchange_b, spread, spread_pct):
+        panel = self.panels.get((symbol, exchange_a, exchange_b))
+        if panel is None:
+            return
+        with self.lock:
+            panel.series.append(time.time(), spread_pct)
+            panel.version += 1
+
+    def _on_draw(self, _event):
+        # 整图重绘后（含窗口缩放）缓存每个子图不含曲线的背景，并把曲线画回去
+        canvas = self.fig.canvas
+        for panel in self.panels.values():
+            panel.background = canvas.copy_from_bbox(panel.ax.bbox)
+            panel.ax.draw_artist(panel.line)
+            panel.ax.draw_artist(panel.label)
+            panel.rendered_version = -1
+
+    def _render(self):
+        canvas = self.fig.canvas
+        now = time.time()
+        left = now - self.window_seconds
+        need_full_draw = False
+        for panel in self.panels.values():
+            if panel.rendered_version == panel.version and now - panel.rendered_at < self.idle_refresh:
+                continue
+            n_buckets = max(int(panel.ax.bbox.width), 1)
+            with self.lock:
+                version = panel.version
+                ts, ys, (ymin, ymax) = panel.series.window(left, now, n_buckets)
+            panel.line.set_data(ts - now, ys)
+            if len(ys):
+                panel.label.set_text(f"{ys[-1]:+.4f}%")
+            if ymin is not None:
+                lo, hi = panel.ax.get_ylim()
+                target = padded_ylim(ymin, ymax, self._ylim_cushion)
+                # 超出当前范围，或当前范围过宽（数据只占不到 1/4）时调整；
+                # 数据是一条水平线时跨度按 padded_ylim 扩出的 ±1 计算，否则每秒都会判定过宽并整图重绘
+                span = 2.0 if math.isclose(ymin, ymax) else ymax - ymin
+                if ymin < lo or ymax > hi or span * 4 < (hi - lo):
+                    if now - self._last_full_draw >= self._ylim_min_refresh:
+                        panel.ax.set_ylim(*target)
+                        need_full_draw = True
+            panel.rendered_version = version
+            panel.rendered_at = now
+            if panel.background is not None and not need_full_draw:
+                canvas.restore_region(panel.background)
+                panel.ax.draw_artist(panel.line)
+                panel.ax.draw_artist(panel.label)
+                canvas.blit(panel.ax.bbox)
+        if need_full_draw:
+            self._last_full_draw = now
+            canvas.draw_idle()
+
+    def start(self, block=False):
+        if self._running:
+            return
+        self._running = True
+        self.timer = self.fig.canvas.new_timer(interval=int(1000 / self.fps))
+        self.timer.add_callback(self._render)
+        self.timer.start()
+        plt.show(block=block)
+
+    def stop(self):
+        self._running = False
+        if self.timer is not None:
+            self.timer.stop()
+        plt.close(self.fig)
+
+    def pause(self, interval):
+        plt.pause(interval)
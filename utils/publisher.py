@@ -0,0 +1,254 @@
+import collections
+import threading
+import time
+
+from utils.codec import WIRE_FORMATS, encode_record
+from utils.metrics import FLUSH_SECONDS, PUBLISH_LATENCY, watch_publisher
+from utils.tickbus import build_tickbus_writer
+from utils.ticker_store import ticker_channel, ticker_stream, latest_key
+
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+# ticker 记录的输出方式：pubsub 频道 / Redis Stream / 两者都发
+OUTPUT_MODES = ('pubsub', 'stream', 'both')
+
+
+class BatchPublisher:
+    """
+    批量推送到 Redis Channel：
+    - publish() 只入队，不在 websocket 回调线程上等待 Redis 往返
+    - 后台线程在队列达到 batch_size 或首条消息等待超过 flush_interval 秒时，用 pipeline 一次发送
+    - 队列有界（max_queue），满时按 overflow 策略处理：
+        drop_oldest: 丢弃最旧的一条（默认，行情只关心最新值）
+        drop_newest: 丢弃当前这条
+        block:       阻塞调用方直到有空位（不要在 asyncio 事件循环里使用）
+    publish(channel, value) 与 redis.Redis.publish 参数一致，可直接替换原 rds；
+    publish_ticker() 额外在同一个 pipeline 中更新 latest hash（见 utils/ticker_store.py），
+    并在进程内保留每个 symbol 的最新记录（snapshot()）。
+    wire_format 为 ticker 记录的编码：'json'（默认）或 'binary'（定长 64 字节，带盘口时 96 字节，见 utils/codec.py）。
+    tickbus 为同机共享内存总线的写端（见 utils/tickbus.py），publish_ticker() 在入队前直接写入，不等待批量发送。
+    output 为 ticker 记录的输出方式（见 OUTPUT_MODES）：stream 时 XADD 到 ticker_stream() 并按 MAXLEN ~ stream_maxlen 裁剪，
+    消费端断线期间的数据留在流里，重连后从上次的 ID 继续读（见 utils/streams.py）；其他消息始终走 pubsub。
+    """
+    def __init__(self, rds, batch_size=256, flush_interval=0.0005, max_queue=10000,
+                 overflow='drop_oldest', logger=None, stats_interval=60, wire_format='json', tickbus=None,
+                 output='pubsub', stream_maxlen=100_000, stream_per_symbol=False):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        if output not in OUTPUT_MODES:
+            raise ValueError(f"output must be one of {OUTPUT_MODES}, got {output!r}")
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"wire_format must be one of {WIRE_FORMATS}, got {wire_format!r}")
+        self.rds = rds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.logger = logger
+        self.stats_interval = stats_interval
+        self.wire_format = wire_format
+        self.tickbus = tickbus
+        self.output = output
+        self.stream_maxlen = stream_maxlen
+        self.stream_per_symbol = stream_per_symbol
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._running = True
+
+        # 每个频道的本地发布序号与进程内最新值
+        self._seq = {}
+        self._latest = {}
+
+        # 计数器
+        self.published = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.encode_errors = 0
+        self.max_queue_depth = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+        self._thread = threading.Thread(target=self._flush_loop, name="redis-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, channel, value, latest=None):
+        """
+        入队一条消息，返回是否成功入队；latest=(hash_key, field) 时同时写入最新值 hash
+        """
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                if self.overflow == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                elif self.overflow == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self.max_queue and self._running:
+                        self._cond.wait()
+            self._queue.append((channel, value, latest))
+            depth = len(self._queue)
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+            # 队列由空变非空时启动定时器，达到批量阈值时立即唤醒
+            if depth == 1 or depth >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def publish_ticker(self, exchange, symbol, record):
+        """
+        推送一条 ticker 记录：补充本地序号 seq，发布到频道并更新 latest hash；
+        记录在 flush 时才按 wire_format 序列化，并写入发布时间 pub_ns（单调时钟纳秒）
+        """
+        channel = ticker_channel(exchange, symbol)
+        seq = self._seq.get(channel, 0) + 1
+        self._seq[channel] = seq
+        record["seq"] = seq
+        self._latest.setdefault(exchange, {})[symbol] = record
+        if self.tickbus is not None:
+            # 共享内存中的记录以写入时刻为发布时间，Redis 发送时会再覆盖为 flush 时刻
+            record["pub_ns"] = time.monotonic_ns()
+            self.tickbus.write(exchange, symbol, record)
+        # 发送线程会写入 pub_ns，入队副本，避免与 snapshot() 读取的同一个 dict 竞争
+        return self.publish(channel, (exchange, symbol, dict(record)), latest=(latest_key(exchange), symbol))
+
+    def snapshot(self):
+        """
+        进程内最新值快照 {exchange: {symbol: record}}
+        """
+        return {exchange: dict(records) for exchange, records in self._latest.items()}
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and self._running:
+                self._cond.wait(timeout=self.stats_interval)
+                self._maybe_log_stats()
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        return batch
+
+    def _send(self, batch):
+        start = time.perf_counter()
+        try:
+            pipe = self.rds.pipeline(transaction=False)
+            pub_ns = time.monotonic_ns()
+            # 同一批次内 latest hash 只保留每个 symbol 的最后一条
+            latest = {}
+            sent = 0
+            for channel, value, latest_field in batch:
+                if isinstance(value, tuple):
+                    exchange, symbol, record = value
+                    record["pub_ns"] = pub_ns
+                    try:
+                        value = encode_record(exchange, symbol, record, self.wire_format)
+                    except Exception as e:
+                        # 单条记录无法编码时只丢弃这一条，不影响同批其他消息
+                        self.encode_errors += 1
+                        if self.logger:
+                            self.logger.error(f"ticker 记录编码失败，已丢弃: {exchange}:{symbol} {e} | {str(record)[:200]}")
+                        continue
+                    if record.get("recv_ns"):
+                        PUBLISH_LATENCY.labels(exchange).observe((pub_ns - record["recv_ns"]) / 1e9)
+                    if self.output != 'pubsub':
+                        stream = ticker_stream(exchange, symbol if self.stream_per_symbol else None)
+                        pipe.xadd(stream, {"symbol": symbol, "data": value}, maxlen=self.stream_maxlen, approximate=True)
+                        if self.output == 'stream':
+                            channel = None
+                if channel is not None:
+                    pipe.publish(channel, value)
+                if latest_field is not None:
+                    key, field = latest_field
+                    latest.setdefault(key, {})[field] = value
+                sent += 1
+            for key, mapping in latest.items():
+                pipe.hset(key, mapping=mapping)
+            pipe.execute()
+        except Exception as e:
+            self.flush_errors += 1
+            if self.logger:
+                self.logger.error(f"Redis 批量推送失败({len(batch)}条): {e}")
+            return
+        cost_ms = (time.perf_counter() - start) * 1000
+        FLUSH_SECONDS.observe(cost_ms / 1000.0)
+        self.flushes += 1
+        self.published += sent
+        self.last_flush_ms = cost_ms
+        self.total_flush_ms += cost_ms
+        if cost_ms > self.max_flush_ms:
+            self.max_flush_ms = cost_ms
+
+    def _flush_loop(self):
+        self._last_stats_log = time.monotonic()
+        while self._running or self._queue:
+            batch = self._take_batch()
+            if batch:
+                self._send(batch)
+            self._maybe_log_stats()
+
+    def _maybe_log_stats(self):
+        if not self.logger or not self.stats_interval:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_log >= self.stats_interval:
+            self._last_stats_log = now
+            self.logger.info(f"publisher stats: {self.stats()}")
+
+    def stats(self):
+        """
+        返回计数器快照：队列深度与 flush 耗时（毫秒）
+        """
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self.max_queue_depth,
+            "published": self.published,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "encode_errors": self.encode_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
+
+    def close(self, timeout=5):
+        """
+        停止后台线程，尽量把队列中剩余消息发送完
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        if self.tickbus is not None:
+            self.tickbus.close()
+
+
+def build_publisher(rds, config, logger=None, name='ticker'):
+    """
+    按 config.yml 中的 publish_* 配置创建 BatchPublisher，队列深度等计数器以 publisher=name 暴露为指标
+    """
+    publisher = BatchPublisher(
+        rds,
+        batch_size=config.get('publish_batch_size', 256),
+        flush_interval=config.get('publish_flush_interval', 0.0005),
+        max_queue=config.get('publish_max_queue', 10000),
+        overflow=config.get('publish_overflow', 'drop_oldest'),
+        logger=logger,
+        stats_interval=config.get('publish_stats_interval', 60),
+        wire_format=config.get('wire_format', 'json'),
+        tickbus=build_tickbus_writer(config, logger),
+        output=config.get('publish_output', 'pubsub'),
+        stream_maxlen=config.get('stream_maxlen', 100_000),
+        stream_per_symbol=config.get('stream_per_symbol', False),
+    )
+    watch_publisher(name, publisher)
+    return publisher
@@ -0,0 +1,110 @@
+import time
+
+from utils.codec import BOOK_FIELDS
+
+
+# 按 symbol 沿用上一条记录的字段：成交价与盘口可能来自不同的流 / 增量帧
+QUOTE_FIELDS = ('last_price',) + BOOK_FIELDS
+
+
+class _Quote:
+    __slots__ = ('values', 'published', 'last_pub_ms')
+
+    def __init__(self, fields):
+        self.values = dict.fromkeys(fields)
+        self.published = None
+        self.last_pub_ms = None
+
+
+class QuoteTable:
+    """
+    采集端的 per-symbol 状态表，每个采集连接 / 适配器一份：
+    - 合并：帧中缺失（None 或空串）的成交价 / 盘口字段用该 symbol 上一次的值补齐（Bybit delta 帧、Binance 分流）
+    - 去重：suppress_unchanged=True 时，合并后与上次发布的值完全相同的记录不再发布
+    - 限频：min_interval_ms > 0 时同一 symbol 两次发布至少间隔 min_interval_ms，窗口内的变化只保留最后一条，
+            由 due() 在窗口结束后发出，不会丢掉最终价格
+    update / due 返回需要发布的记录（即传入的 record，已补齐字段），不需要发布时返回 None / 空列表
+    """
+    def __init__(self, fields=QUOTE_FIELDS, suppress_unchanged=True, min_interval_ms=0):
+        self.fields = tuple(fields)
+        self.suppress_unchanged = suppress_unchanged
+        self.min_interval_ms = min_interval_ms
+        self._state = {}
+        # symbol -> 限频窗口内等待发布的最后一条记录
+        self._pending = {}
+        self.suppressed = 0
+        self.conflated = 0
+
+    def update(self, symbol, record, now_ms=None):
+        quote = self._state.get(symbol)
+        if quote is None:
+            quote = self._state[symbol] = _Quote(self.fields)
+        values = quote.values
+        for field in self.fields:
+            value = record.get(field)
+            if value is None or value == '':
+                record[field] = values[field]
+            else:
+                values[field] = value
+        if record.get('last_price') is None:
+            return None
+
+        if self.suppress_unchanged and quote.published is not None and \
+                all(values[f] == quote.published[f] for f in self.fields):
+            # 窗口内的变化又回到了已发布的值，等待中的记录也不必再发
+            self._pending.pop(symbol, None)
+            self.suppressed += 1
+            return None
+        if self.min_interval_ms > 0:
+            if now_ms is None:
+                now_ms = time.time() * 1000
+            if quote.last_pub_ms is not None and now_ms - quote.last_pub_ms < self.min_interval_ms:
+                if symbol in self._pending:
+                    self.conflated += 1
+                self._pending[symbol] = record
+                return None
+        self._pending.pop(symbol, None)
+        self._mark(quote, now_ms)
+        return record
+
+    def _mark(self, quote, now_ms):
+        quote.published = dict(quote.values)
+        quote.last_pub_ms = now_ms
+
+    def due(self, now_ms=None):
+        """
+        返回限频窗口已结束、需要补发的 [(symbol, record), ...]
+        """
+        if not self._pending:
+            return []
+        if now_ms is None:
+            now_ms = time.time() * 1000
+        result = []
+        for symbol, record in list(self._pending.items()):
+            quote = self._state[symbol]
+            if now_ms - quote.last_pub_ms >= self.min_interval_ms:
+                # 等待中的总是最新一条，quote.values 即其字段
+                del self._pending[symbol]
+                self._mark(quote, now_ms)
+                result.append((symbol, record))
+        return result
+
+    def forget(self, symbols):
+        """
+        取消订阅时清掉 symbol 的状态，重新订阅后的第一条记录总会发布
+        """
+        for symbol in symbols:
+            self._state.pop(symbol.upper(), None)
+            self._pending.pop(symbol.upper(), None)
+
+    def stats(self):
+        return {"symbols": len(self._state), "pending": len(self._pending),
+                "suppressed": self.suppressed, "conflated": self.conflated}
+
+
+def build_quote_table(config):
+    """
+    按 config.yml 的 quote_suppress_unchanged / quote_min_interval_ms 创建 QuoteTable
+    """
+    return QuoteTable(suppress_unchanged=config.get('quote_suppress_unchanged', True),
+                      min_interval_ms=config.get('quote_min_interval_ms', 0))
@@ -0,0 +1,391 @@
+import concurrent.futures
+import datetime
+import glob
+import gzip
+import json
+import os
+import shutil
+import struct
+import time
+
+import numpy as np
+
+from utils.codec import BINARY_V1, BINARY_V2, TICK_V1, TICK_V2, VENUE_IDS, VENUE_NAMES, decode_record, encode_binary, symbol_id
+from utils.ticker_store import split_channel
+
+
+# 段文件的行格式即 codec 中的 96 字节 v2 二进制记录（含盘口，缺失为 NaN），可直接按列读成 numpy 结构化数组
+TICK_DTYPE = np.dtype([
+    ('ver', '<u1'), ('venue', '<u1'), ('reserved', '<u2'), ('symbol_id', '<u4'),
+    ('last_price', '<f8'), ('ts', '<i8'), ('recv_ms', '<f8'), ('recv_ns', '<i8'),
+    ('pub_ns', '<i8'), ('seq', '<u8'), ('xseq', '<i8'),
+    ('bid', '<f8'), ('ask', '<f8'), ('bid_size', '<f8'), ('ask_size', '<f8'),
+])
+assert TICK_DTYPE.itemsize == TICK_V2.size
+
+# 早期段文件的行格式：64 字节 v1 记录（无盘口），读取时按首字节识别并补成 TICK_DTYPE
+TICK_DTYPE_V1 = np.dtype(TICK_DTYPE.descr[:11])
+assert TICK_DTYPE_V1.itemsize == TICK_V1.size
+
+SEGMENT_DTYPES = {BINARY_V1: TICK_DTYPE_V1, BINARY_V2: TICK_DTYPE}
+
+_RECV_MS = struct.Struct('<d')
+_RECV_MS_OFFSET = 24
+
+SEGMENT_SUFFIX = '.ticks'
+INDEX_FILE = 'index.jsonl'
+
+
+def segment_dtype(first_byte):
+    """
+    按段文件首字节（第一行的版本号）返回行格式，无法识别时返回 None；一个段内只有一种行格式
+    """
+    return SEGMENT_DTYPES.get(first_byte)
+
+
+def upcast_ticks(rows):
+    """
+    v1 行补成 TICK_DTYPE（盘口字段为 NaN，版本号改为 v2，tobytes() 即合法的 v2 记录）；已是 TICK_DTYPE 时原样返回
+    """
+    if rows.dtype == TICK_DTYPE:
+        return rows
+    out = np.empty(len(rows), dtype=TICK_DTYPE)
+    for name in rows.dtype.names:
+        out[name] = rows[name]
+    out['ver'] = BINARY_V2
+    for name in ('bid', 'ask', 'bid_size', 'ask_size'):
+        out[name] = np.nan
+    return out
+
+
+def _day(ms):
+    return datetime.datetime.fromtimestamp(ms / 1000.0, tz=datetime.timezone.utc).strftime('%Y%m%d')
+
+
+class TickRecorder:
+    """
+    把 ticker 记录追加写入按天分目录、滚动切换的定长二进制段文件：
+        <data_dir>/<YYYYMMDD>/ticks-<HHMMSS>-<pid>-<n>.ticks  写入中的段（每行 96 字节，见 utils/codec.py）
+        <data_dir>/<YYYYMMDD>/....ticks.gz               滚动后压缩的段
+        <data_dir>/<YYYYMMDD>/....symbols.json           写入中的段内出现的 symbol（名称 -> symbol id），完成后并入索引
+        <data_dir>/<YYYYMMDD>/index.jsonl                每个已完成的段一行：行数、recv_ms 范围、每个 symbol × 交易所的行数与时间范围
+    - 写入先进入内存缓冲，超过 flush_bytes 或 flush_interval 秒写入文件，fsync 每 fsync_interval 秒一次，内存占用有上限
+    - 段文件超过 segment_bytes、存在超过 segment_seconds 秒或跨天（UTC）时滚动，压缩在后台线程完成
+    - 进程异常退出留下的未建索引段，在下次启动时补建索引并压缩（同一 data_dir 只应有一个 recorder 进程）
+    """
+    def __init__(self, data_dir, segment_bytes=256 * 1024 * 1024, segment_seconds=3600, flush_bytes=1024 * 1024,
+                 flush_interval=0.2, fsync_interval=1.0, compress=True, logger=None):
+        self.data_dir = data_dir
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.compress = compress
+        self.logger = logger
+
+        self._buf = bytearray()
+        self._file = None
+        self._path = None
+        self._opened_at = 0.0
+        self._day = None
+        self._size = 0
+        self._rows = 0
+        self._stats = {}
+        self._symbols = {}
+        self._last_flush = time.monotonic()
+        self._last_fsync = time.monotonic()
+        self._seq = 0
+        self._finisher = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='recorder-finish')
+        self.recover()
+
+    def _log(self, level, msg):
+        if self.logger:
+            getattr(self.logger, level)(msg)
+
+    def write(self, channel, payload):
+        """
+        记录一条频道消息（JSON 或二进制记录均可），返回是否写入
+        """
+        exchange, symbol = split_channel(channel)
+        if len(payload) == TICK_V2.size and payload[0] == BINARY_V2:
+            row = bytes(payload)
+            recv_ms = _RECV_MS.unpack_from(row, _RECV_MS_OFFSET)[0]
+        else:
+            record = decode_record(payload)
+            if record is None or record.get('last_price') is None:
+                return False
+            if not record.get('recv_ms'):
+                record['recv_ms'] = round(time.time() * 1000, 3)
+            recv_ms = record['recv_ms']
+            row = encode_binary(exchange, symbol, record, version=2)
+
+        if self._file is None or _day(recv_ms) != self._day:
+            self.rotate(recv_ms)
+        self._buf += row
+        self._rows += 1
+        if symbol not in self._symbols:
+            self._symbols[symbol] = symbol_id(symbol)
+            self._write_symbols()
+        key = (symbol, exchange)
+        stat = self._stats.get(key)
+        if stat is None:
+            self._stats[key] = [1, recv_ms, recv_ms]
+        else:
+            stat[0] += 1
+            if recv_ms < stat[1]:
+                stat[1] = recv_ms
+            if recv_ms > stat[2]:
+                stat[2] = recv_ms
+        if len(self._buf) >= self.flush_bytes:
+            self.flush()
+        return True
+
+    def maintain(self):
+        """
+        周期调用（空闲时也要调用）：按时间 flush / fsync，按大小与时长滚动
+        """
+        now = time.monotonic()
+        if self._buf and now - self._last_flush >= self.flush_interval:
+            self.flush()
+        if self._file is not None:
+            if now - self._last_fsync >= self.fsync_interval:
+                self.fsync()
+            if self._size >= self.segment_bytes or now - self._opened_at >= self.segment_seconds:
+                self.rotate()
+
+    def flush(self):
+        if self._buf and self._file is not None:
+            self._file.write(self._buf)
+            self._size += len(self._buf)
+            self._buf.clear()
+        self._last_flush = time.monotonic()
+
+    def fsync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def rotate(self, recv_ms=None):
+        """
+        结束当前段（写入、fsync、交给后台线程建索引与压缩），并按 recv_ms 所在日期开启新段
+        """
+        self._close_segment()
+        if recv_ms is None:
+            return
+        self._day = _day(recv_ms)
+        day_dir = os.path.join(self.data_dir, self._day)
+        os.makedirs(day_dir, exist_ok=True)
+        self._seq += 1
+        stamp = datetime.datetime.fromtimestamp(recv_ms / 1000.0, tz=datetime.timezone.utc).strftime('%H%M%S')
+        self._path = os.path.join(day_dir, f"ticks-{stamp}-{os.getpid()}-{self._seq}{SEGMENT_SUFFIX}")
+        self._file = open(self._path, 'ab')
+        self._opened_at = time.monotonic()
+        self._size = 0
+        self._log('info', f"开始写入段文件: {self._path}")
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self.flush()
+        self.fsync()
+        self._file.close()
+        entry = self._index_entry(self._path, self._rows, self._stats, self._symbols)
+        self._finisher.submit(self._finish, self._path, entry)
+        self._file = None
+        self._path = None
+        self._rows = 0
+        self._stats = {}
+        self._symbols = {}
+
+    def _write_symbols(self):
+        with open(self._path[:-len(SEGMENT_SUFFIX)] + '.symbols.json', 'w', encoding='utf-8') as f:
+            json.dump(self._symbols, f)
+
+    @staticmethod
+    def _index_entry(path, rows, stats, symbols):
+        symbol_stats = {}
+        for (symbol, exchange), (count, t_min, t_max) in stats.items():
+            symbol_stats.setdefault(symbol, {})[exchange] = [count, t_min, t_max]
+        t_values = [v for s in stats.values() for v in s[1:]]
+        return {
+            'file': os.path.basename(path),
+            'rows': rows,
+            't_min': min(t_values) if t_values else None,
+            't_max': max(t_values) if t_values else None,
+            'symbol_ids': symbols,
+            'symbols': symbol_stats,
+        }
+
+    def _finish(self, path, entry):
+        """
+        压缩段文件并追加索引；先写压缩文件再删原文件，任一步失败时原段保留，下次启动会补做
+        """
+        try:
+            if entry['rows'] == 0:
+                os.remove(path)
+                return
+            if self.compress:
+                with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(path + '.gz.tmp', path + '.gz')
+                entry['file'] += '.gz'
+            with open(os.path.join(os.path.dirname(path), INDEX_FILE), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            if self.compress:
+                os.remove(path)
+            # symbol 表已写入索引
+            symbols_path = path[:-len(SEGMENT_SUFFIX)] + '.symbols.json'
+            if os.path.exists(symbols_path):
+                os.remove(symbols_path)
+            self._log('info', f"段文件已完成: {entry['file']} 行数={entry['rows']}")
+        except Exception as e:
+            self._log('error', f"段文件收尾失败: {path} {e}")
+
+    def recover(self):
+        """
+        为上次异常退出留下的、尚未进入索引的段文件补建索引并压缩
+        """
+        for path in sorted(glob.glob(os.path.join(self.data_dir, '*', '*' + SEGMENT_SUFFIX))):
+            indexed = {e['file'] for e in _read_index(os.path.dirname(path))}
+            name = os.path.basename(path)
+            if name in indexed or name + '.gz' in indexed:
+                continue
+            with open(path, 'rb') as f:
+                first = f.read(1)
+            dtype = segment_dtype(first[0]) if first else None
+            if dtype is None:
+                # 空段直接收尾；无法识别行格式的段原样保留，不截断也不建索引
+                if first:
+                    self._log('error', f"段文件行格式无法识别，跳过: {path}")
+                    continue
+                dtype = TICK_DTYPE
+            size = os.path.getsize(path)
+            if size % dtype.itemsize:
+                # 截掉崩溃时写了一半的最后一行
+                with open(path, 'r+b') as f:
+                    f.truncate(size - size % dtype.itemsize)
+            symbols = _read_symbols(path)
+            names = {sid: sym for sym, sid in symbols.items()}
+            rows = np.fromfile(path, dtype=dtype)
+            stats = {}
+            for (sid, venue) in set(zip(rows['symbol_id'].tolist(), rows['venue'].tolist())):
+                mask = (rows['symbol_id'] == sid) & (rows['venue'] == venue)
+                t = rows['recv_ms'][mask]
+                key = (names.get(sid, str(sid)), VENUE_NAMES.get(venue, str(venue)))
+                stats[key] = [int(mask.sum()), float(t.min()), float(t.max())]
+            self._log('warning', f"补建段文件索引: {path} 行数={len(rows)}")
+            self._finish(path, self._index_entry(path, len(rows), stats, symbols))
+
+    def close(self):
+        self._close_segment()
+        self._finisher.shutdown(wait=True)
+
+
+def _read_symbols(segment_path):
+    try:
+        with open(segment_path[:-len(SEGMENT_SUFFIX)] + '.symbols.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_index(day_dir):
+    try:
+        with open(os.path.join(day_dir, INDEX_FILE), encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def find_segments(data_dir, symbol=None, exchange=None, start_ms=None, end_ms=None):
+    """
+    按索引筛选包含 symbol（/ 交易所）且 recv_ms 与 [start_ms, end_ms] 有交集的已完成段，返回索引条目列表（附 path）
+    """
+    symbol = symbol.upper() if symbol else None
+    start_day = _day(start_ms) if start_ms is not None else None
+    end_day = _day(end_ms) if end_ms is not None else None
+    result = []
+    for day_dir in sorted(glob.glob(os.path.join(data_dir, '[0-9]' * 8))):
+        day = os.path.basename(day_dir)
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        for entry in _read_index(day_dir):
+            if symbol is not None:
+                ranges = entry['symbols'].get(symbol, {})
+                if exchange is not None:
+                    ranges = {exchange: ranges[exchange]} if exchange in ranges else {}
+                if not ranges:
+                    continue
+                t_min = min(r[1] for r in ranges.values())
+                t_max = max(r[2] for r in ranges.values())
+            elif exchange is not None:
+                spans = [v[exchange] for v in entry['symbols'].values() if exchange in v]
+                if not spans:
+                    continue
+                t_min, t_max = min(s[1] for s in spans), max(s[2] for s in spans)
+            else:
+                t_min, t_max = entry['t_min'], entry['t_max']
+            if (start_ms is not None and t_max < start_ms) or (end_ms is not None and t_min > end_ms):
+                continue
+            result.append(dict(entry, path=os.path.join(day_dir, entry['file'])))
+    return result
+
+
+def read_segment(path):
+    """
+    读取一个段文件（.ticks 或 .ticks.gz）为 TICK_DTYPE 结构化数组，v1 段按 upcast_ticks 补齐盘口字段；
+    行格式无法识别时抛出 ValueError
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            data = f.read()
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    if not data:
+        return np.empty(0, dtype=TICK_DTYPE)
+    dtype = segment_dtype(data[0])
+    if dtype is None:
+        raise ValueError(f"unknown tick segment layout (first byte 0x{data[0]:02x}): {path}")
+    return upcast_ticks(np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize))
+
+
+def load_ticks(data_dir, symbol=None, exchange=None, start_ms=None, end_ms=None):
+    """
+    读取 symbol / 交易所 / recv_ms 时间范围内的全部 tick，返回按 recv_ms 排序的 TICK_DTYPE 数组；
+    只打开索引命中的段
+    """
+    parts = []
+    for entry in find_segments(data_dir, symbol, exchange, start_ms, end_ms):
+        rows = read_segment(entry['path'])
+        mask = np.ones(len(rows), dtype=bool)
+        if symbol is not None:
+            mask &= rows['symbol_id'] == symbol_id(symbol.upper())
+        if exchange is not None:
+            mask &= rows['venue'] == VENUE_IDS.get(exchange, 0)
+        if start_ms is not None:
+            mask &= rows['recv_ms'] >= start_ms
+        if end_ms is not None:
+            mask &= rows['recv_ms'] <= end_ms
+        parts.append(rows[mask])
+    if not parts:
+        return np.empty(0, dtype=TICK_DTYPE)
+    ticks = np.concatenate(parts)
+    return ticks[np.argsort(ticks['recv_ms'], kind='stable')]
+
+
+def build_recorder(config, logger=None):
+    """
+    按 config.yml 中的 recorder_* 配置创建 TickRecorder
+    """
+    return TickRecorder(
+        data_dir=config.get('recorder_dir', 'data/ticks'),
+        segment_bytes=int(config.get('recorder_segment_mb', 256)) * 1024 * 1024,
+        segment_seconds=config.get('recorder_segment_seconds', 3600),
+        flush_interval=config.get('recorder_flush_interval', 0.2),
+        fsync_interval=config.get('recorder_fsync_interval', 1.0),
+        compress=config.get('recorder_compress', True),
+        logger=logger,
+    )
@@ -0,0 +1,177 @@
+import gzip
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from utils.codec import VENUE_IDS, VENUE_NAMES, decode_binary
+from utils.recorder import TICK_DTYPE, find_segments, segment_dtype, upcast_ticks
+from utils.ticker_store import ticker_channel
+
+
+def open_segment(path):
+    """
+    以内存映射方式打开段文件，返回 TICK_DTYPE 的只读 memmap；
+    压缩段先流式解压到临时文件再映射，内存占用与段大小无关。
+    早期的 v1 段（64 字节行）按首字节识别，补齐盘口字段后以内存数组返回；行格式无法识别时抛出 ValueError
+    """
+    if not path.endswith('.gz'):
+        return _map_rows(path, path)
+    with gzip.open(path, 'rb') as src, tempfile.TemporaryFile() as tmp:
+        shutil.copyfileobj(src, tmp, 1024 * 1024)
+        tmp.flush()
+        return _map_rows(tmp, path)
+
+
+def _map_rows(f, path):
+    if isinstance(f, str):
+        with open(f, 'rb') as src:
+            first = src.read(1)
+    else:
+        f.seek(0)
+        first = f.read(1)
+    if not first:
+        return np.empty(0, dtype=TICK_DTYPE)
+    dtype = segment_dtype(first[0])
+    if dtype is None:
+        raise ValueError(f"unknown tick segment layout (first byte 0x{first[0]:02x}): {path}")
+    return upcast_ticks(np.memmap(f, dtype=dtype, mode='r'))
+
+
+class TickReplayer:
+    """
+    回放 recorder 录制的 tick（见 utils/recorder.py），按录制顺序交给 sink：
+    - speed 为倍速（1 为原速，按 recv_ms 间隔等待）；None / 0 为最快速度，不等待，用于测量消费端吞吐上限
+    - sink(items) 每次收到一批 [(channel, payload), ...]，payload 为 96 字节 v2 二进制记录
+    - restamp=True 时发送前把 recv_ns / pub_ns 改为当前单调时钟，消费端的延迟统计反映回放链路本身；
+      ts / recv_ms 保持录制值
+    """
+    def __init__(self, data_dir, symbols=None, exchanges=None, start_ms=None, end_ms=None, speed=1.0,
+                 batch_size=500, restamp=True, logger=None):
+        self.data_dir = data_dir
+        self.symbols = [s.upper() for s in symbols] if symbols else None
+        self.exchanges = list(exchanges) if exchanges else None
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.speed = speed or None
+        self.batch_size = batch_size
+        self.restamp = restamp
+        self.logger = logger
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.info(msg)
+
+    def segments(self):
+        """
+        索引命中的段，按时间排序
+        """
+        entries = {}
+        for symbol in self.symbols or [None]:
+            for exchange in self.exchanges or [None]:
+                for entry in find_segments(self.data_dir, symbol, exchange, self.start_ms, self.end_ms):
+                    entries[entry['path']] = entry
+        return sorted(entries.values(), key=lambda e: (e['t_min'], e['path']))
+
+    def _select(self, rows, entry):
+        """
+        返回段内需要回放的行号，以及 (venue id, symbol id) -> 频道名 的映射
+        """
+        names = {sid: sym for sym, sid in entry['symbol_ids'].items()}
+        mask = np.ones(len(rows), dtype=bool)
+        if self.symbols is not None:
+            wanted = [sid for sym, sid in entry['symbol_ids'].items() if sym in self.symbols]
+            mask &= np.isin(rows['symbol_id'], wanted)
+        if self.exchanges is not None:
+            mask &= np.isin(rows['venue'], [VENUE_IDS[ex] for ex in self.exchanges if ex in VENUE_IDS])
+        if self.start_ms is not None:
+            mask &= rows['recv_ms'] >= self.start_ms
+        if self.end_ms is not None:
+            mask &= rows['recv_ms'] <= self.end_ms
+        idx = np.flatnonzero(mask)
+        channels = {}
+        for venue, sid in set(zip(rows['venue'][idx].tolist(), rows['symbol_id'][idx].tolist())):
+            exchange, symbol = VENUE_NAMES.get(venue), names.get(sid)
+            if exchange is not None and symbol is not None:
+                channels[(venue, sid)] = ticker_channel(exchange, symbol)
+        return idx, channels
+
+    def _emit(self, rows, idx, channels, sink):
+        chunk = rows[idx]  # 花式索引得到副本，可以改写时间戳
+        if self.restamp:
+            now = time.monotonic_ns()
+            chunk['recv_ns'] = now
+            chunk['pub_ns'] = now
+        items = []
+        for k in range(len(chunk)):
+            channel = channels.get((int(chunk['venue'][k]), int(chunk['symbol_id'][k])))
+            if channel is not None:
+                items.append((channel, chunk[k].tobytes()))
+        if items:
+            sink(items)
+        return len(items)
+
+    def run(self, sink):
+        """
+        执行回放，返回 {'ticks', 'seconds', 'rate'}
+        """
+        count = 0
+        started = time.monotonic()
+        origin = None
+        for entry in self.segments():
+            rows = open_segment(entry['path'])
+            idx, channels = self._select(rows, entry)
+            self._log(f"回放段文件: {entry['file']} 行数={len(idx)}")
+            if len(idx) == 0:
+                continue
+            if self.speed is None:
+                for i in range(0, len(idx), self.batch_size):
+                    count += self._emit(rows, idx[i:i + self.batch_size], channels, sink)
+                continue
+
+            recv_ms = rows['recv_ms'][idx]
+            if origin is None:
+                origin = (float(recv_ms[0]), time.monotonic())
+            # 每行的计划发送时刻（相对回放开始），同一时刻到期的行合并成一批
+            # 多个采集进程写入的 recv_ms 可能有少量乱序，取前缀最大值保证单调
+            due = np.maximum.accumulate(origin[1] + (recv_ms - origin[0]) / 1000.0 / self.speed)
+            i = 0
+            while i < len(idx):
+                delay = due[i] - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                j = min(int(np.searchsorted(due, time.monotonic(), side='right')), i + self.batch_size)
+                j = max(j, i + 1)
+                count += self._emit(rows, idx[i:j], channels, sink)
+                i = j
+        seconds = time.monotonic() - started
+        return {'ticks': count, 'seconds': round(seconds, 3), 'rate': round(count / seconds, 1) if seconds > 0 else None}
+
+
+def redis_sink(rds, wire_format='binary'):
+    """
+    通过 Redis pipeline 重新发布到原频道；wire_format='json' 时转为 JSON 记录，供只认 JSON 的旧消费端使用
+    """
+    def sink(items):
+        pipe = rds.pipeline(transaction=False)
+        for channel, payload in items:
+            if wire_format == 'json':
+                record = decode_binary(payload)
+                record.pop('venue', None)
+                record.pop('symbol_id', None)
+                payload = json.dumps(record)
+            pipe.publish(channel, payload)
+        pipe.execute()
+    return sink
+
+
+def listener_sink(listener):
+    """
+    不经过 Redis，直接交给 RedisTickerListener.handle_tick（与 listen_redis 相同的处理路径）
+    """
+    def sink(items):
+        for channel, payload in items:
+            listener.handle_tick(channel, payload)
+    return sink
@@ -0,0 +1,102 @@
+import operator
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    预分配的 numpy 环形时间序列缓冲区（不线程安全，由调用方加锁）：
+    - 时间戳与数值各一块 2 * capacity 的数组，每个点同时写入 i 与 i + capacity 两处，
+      最近 capacity 个点始终是一段连续切片，取窗口不需要拼接
+    - 时间戳强制单调不减，窗口左边界用 searchsorted 二分定位
+    - 窗口最小 / 最大值用单调队列（同样是预分配的 numpy 数组，存点的序号）增量维护，查询均摊 O(1)
+    """
+    def __init__(self, capacity=10_000):
+        self.capacity = capacity
+        self._ts = np.zeros(2 * capacity)
+        self._values = np.zeros(2 * capacity)
+        self._count = 0
+        self.last_ts = -np.inf
+        self._min_q = _MonotonicQueue(capacity, operator.le)
+        self._max_q = _MonotonicQueue(capacity, operator.ge)
+        # 单调队列已经弹出了早于该时间的点，更早的左边界只能退回到切片上计算
+        self._mm_left = -np.inf
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, ts, value):
+        if ts < self.last_ts:
+            ts = self.last_ts
+        self.last_ts = ts
+        i = self._count % self.capacity
+        self._ts[i] = self._ts[i + self.capacity] = ts
+        self._values[i] = self._values[i + self.capacity] = value
+        self._min_q.push(self._count, value, self._values, self.capacity)
+        self._max_q.push(self._count, value, self._values, self.capacity)
+        self._count += 1
+
+    def _span(self):
+        n = len(self)
+        start = self._count % self.capacity if self._count >= self.capacity else 0
+        return start, start + n
+
+    def view(self):
+        """
+        按时间顺序返回全部点 (ts, values)，为内部数组的视图，不要修改
+        """
+        start, end = self._span()
+        return self._ts[start:end], self._values[start:end]
+
+    def window(self, left):
+        """
+        返回 ts >= left 的点 (ts, values) 视图，O(log n)
+        """
+        ts, values = self.view()
+        k = int(np.searchsorted(ts, left, side='left'))
+        return ts[k:], values[k:]
+
+    def window_minmax(self, left):
+        """
+        返回 ts >= left 的点的 (min, max)，没有点时返回 (None, None)
+        """
+        ts, values = self.view()
+        k = int(np.searchsorted(ts, left, side='left'))
+        if k >= len(ts):
+            return None, None
+        if left < self._mm_left:
+            return float(values[k:].min()), float(values[k:].max())
+        self._mm_left = left
+        first_seq = self._count - len(ts) + k
+        return (self._min_q.front(first_seq, self._values, self.capacity),
+                self._max_q.front(first_seq, self._values, self.capacity))
+
+
+class _MonotonicQueue:
+    """
+    存放点序号的单调队列（环形 numpy 数组），队首为窗口内的最小（或最大）值
+    """
+    def __init__(self, capacity, keep):
+        self._q = np.zeros(capacity, dtype=np.int64)
+        self._head = 0
+        self._tail = 0
+        self._cap = capacity
+        # keep(队尾值, 新值) 为真时保留队尾
+        self._keep = keep
+
+    def push(self, seq, value, values, capacity):
+        q, cap = self._q, self._cap
+        while self._tail > self._head and not self._keep(values[q[(self._tail - 1) % cap] % capacity], value):
+            self._tail -= 1
+        q[self._tail % cap] = seq
+        self._tail += 1
+        if self._tail - self._head > cap:
+            self._head += 1
+
+    def front(self, first_seq, values, capacity):
+        q, cap = self._q, self._cap
+        while self._tail > self._head and q[self._head % cap] < first_seq:
+            self._head += 1
+        if self._tail == self._head:
+            return None
+        return float(values[q[self._head % cap] % capacity])
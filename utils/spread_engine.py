@@ -0,0 +1,204 @@
+import itertools
+
+import numpy as np
+
+from utils.ticker_store import EXCHANGES, ticker_channel
+
+
+class SpreadEngine:
+    """
+    多 symbol × 多交易所价差引擎：
+    - prices[i, j] 为第 i 个 symbol 在第 j 个交易所的最新价（NaN 表示尚无报价），ts[i, j] 为对应的交易所事件时间（毫秒）
+    - pairs 为交易所对 (A, B)，默认所有两两组合；价差 = A - B，价差百分比相对 B
+    - 频道名通过 dict 直接映射到 (i, j)，不做线性扫描
+    - 每次更新只重算该 symbol 一行，所有交易所对在一次向量化运算中完成
+    - 有盘口时 bids / asks 记录买一 / 卖一，另算两个方向的可成交价差（吃单即可锁定的价差）：
+        exec_ab = bid_A - ask_B（A 卖出、B 买入），exec_ba = bid_B - ask_A（B 卖出、A 买入），百分比相对买入腿的卖一价
+    """
+    def __init__(self, symbols, exchanges=None, pairs=None):
+        self.symbols = [s.upper() for s in symbols]
+        self.exchanges = list(exchanges or EXCHANGES)
+        if pairs is None:
+            pairs = itertools.combinations(self.exchanges, 2)
+        self.pairs = [tuple(p) for p in pairs]
+
+        ex_index = {ex: j for j, ex in enumerate(self.exchanges)}
+        self.symbol_index = {sym: i for i, sym in enumerate(self.symbols)}
+        self.pair_index = {pair: k for k, pair in enumerate(self.pairs)}
+        self._pair_a = np.array([ex_index[a] for a, _ in self.pairs], dtype=np.intp)
+        self._pair_b = np.array([ex_index[b] for _, b in self.pairs], dtype=np.intp)
+
+        n_sym, n_ex, n_pair = len(self.symbols), len(self.exchanges), len(self.pairs)
+        self.prices = np.full((n_sym, n_ex), np.nan)
+        self.ts = np.full((n_sym, n_ex), np.nan)
+        self.spread = np.full((n_sym, n_pair), np.nan)
+        self.spread_pct = np.full((n_sym, n_pair), np.nan)
+        self.bids = np.full((n_sym, n_ex), np.nan)
+        self.asks = np.full((n_sym, n_ex), np.nan)
+        self.exec_ab = np.full((n_sym, n_pair), np.nan)
+        self.exec_ab_pct = np.full((n_sym, n_pair), np.nan)
+        self.exec_ba = np.full((n_sym, n_pair), np.nan)
+        self.exec_ba_pct = np.full((n_sym, n_pair), np.nan)
+
+        # 频道 -> (symbol 行, 交易所列)，同时登记 str 与 bytes，省去 decode
+        self.slots = {}
+        for i, sym in enumerate(self.symbols):
+            for j, ex in enumerate(self.exchanges):
+                ch = ticker_channel(ex, sym)
+                self.slots[ch] = (i, j)
+                self.slots[ch.encode()] = (i, j)
+
+    def channels(self):
+        """
+        需要订阅的全部频道
+        """
+        return [ch for ch in self.slots if isinstance(ch, str)]
+
+    def update(self, channel, price, ts=None, bid=None, ask=None):
+        """
+        写入一条报价（可带买一 / 卖一）并重算该 symbol 的所有交易所对，返回行号；未跟踪的频道返回 None
+        """
+        slot = self.slots.get(channel)
+        if slot is None:
+            return None
+        i, j = slot
+        self.prices[i, j] = price
+        if ts is not None:
+            self.ts[i, j] = ts
+        if bid is not None:
+            self.bids[i, j] = bid
+        if ask is not None:
+            self.asks[i, j] = ask
+        self._recompute_row(i)
+        return i
+
+    def _recompute_row(self, i):
+        row = self.prices[i]
+        a = row[self._pair_a]
+        b = row[self._pair_b]
+        diff = a - b
+        self.spread[i] = diff
+        bids, asks = self.bids[i], self.asks[i]
+        ask_a, ask_b = asks[self._pair_a], asks[self._pair_b]
+        ab = bids[self._pair_a] - ask_b
+        ba = bids[self._pair_b] - ask_a
+        self.exec_ab[i] = ab
+        self.exec_ba[i] = ba
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.spread_pct[i] = np.where(b != 0, diff / b * 100.0, 0.0)
+            self.exec_ab_pct[i] = np.where(ask_b != 0, ab / ask_b * 100.0, 0.0)
+            self.exec_ba_pct[i] = np.where(ask_a != 0, ba / ask_a * 100.0, 0.0)
+
+    def recompute(self):
+        """
+        全量重算所有 symbol × 交易所对
+        """
+        a = self.prices[:, self._pair_a]
+        b = self.prices[:, self._pair_b]
+        self.spread = a - b
+        ask_a = self.asks[:, self._pair_a]
+        ask_b = self.asks[:, self._pair_b]
+        self.exec_ab = self.bids[:, self._pair_a] - ask_b
+        self.exec_ba = self.bids[:, self._pair_b] - ask_a
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.spread_pct = np.where(b != 0, self.spread / b * 100.0, 0.0)
+            self.exec_ab_pct = np.where(ask_b != 0, self.exec_ab / ask_b * 100.0, 0.0)
+            self.exec_ba_pct = np.where(ask_a != 0, self.exec_ba / ask_a * 100.0, 0.0)
+
+    def price(self, exchange, symbol):
+        v = self.prices[self.symbol_index[symbol.upper()], self.exchanges.index(exchange)]
+        return None if np.isnan(v) else float(v)
+
+    def get(self, symbol, exchange_a, exchange_b):
+        """
+        返回 (spread, spread_pct)，任一腿没有报价时返回 (None, None)
+        """
+        i = self.symbol_index[symbol.upper()]
+        k = self.pair_index.get((exchange_a, exchange_b))
+        if k is not None:
+            spread, pct = self.spread[i, k], self.spread_pct[i, k]
+        else:
+            a, b = self.price(exchange_a, symbol), self.price(exchange_b, symbol)
+            if a is None or b is None:
+                return None, None
+            spread = a - b
+            pct = spread / b * 100.0 if b != 0 else 0.0
+        if np.isnan(spread):
+            return None, None
+        return float(spread), float(pct)
+
+    def quote(self, exchange, symbol):
+        """
+        返回 (bid, ask)，缺失的一侧为 None
+        """
+        i, j = self.symbol_index[symbol.upper()], self.exchanges.index(exchange)
+        bid, ask = self.bids[i, j], self.asks[i, j]
+        return (None if np.isnan(bid) else float(bid)), (None if np.isnan(ask) else float(ask))
+
+    def get_executable(self, symbol, exchange_a, exchange_b):
+        """
+        返回可成交价差 (bid_A - ask_B, 百分比, bid_B - ask_A, 百分比)，缺少盘口的方向为 None
+        """
+        i = self.symbol_index[symbol.upper()]
+        k = self.pair_index.get((exchange_a, exchange_b))
+        if k is not None:
+            values = (self.exec_ab[i, k], self.exec_ab_pct[i, k], self.exec_ba[i, k], self.exec_ba_pct[i, k])
+        else:
+            k = self.pair_index.get((exchange_b, exchange_a))
+            if k is None:
+                raise KeyError((exchange_a, exchange_b))
+            values = (self.exec_ba[i, k], self.exec_ba_pct[i, k], self.exec_ab[i, k], self.exec_ab_pct[i, k])
+        ab, ab_pct, ba, ba_pct = (float(v) for v in values)
+        if np.isnan(ab):
+            ab = ab_pct = None
+        if np.isnan(ba):
+            ba = ba_pct = None
+        return ab, ab_pct, ba, ba_pct
+
+    def leg_skew_ms(self, symbol, exchange_a, exchange_b):
+        """
+        两条腿报价的交易所事件时间差（A - B，毫秒），用于判断价差是否由时间错位造成；缺少时间戳返回 None
+        """
+        i = self.symbol_index[symbol.upper()]
+        skew = self.ts[i, self.exchanges.index(exchange_a)] - self.ts[i, self.exchanges.index(exchange_b)]
+        return None if np.isnan(skew) else float(skew)
+
+    def top_spreads(self, n=10):
+        """
+        按 |spread_pct| 从大到小返回前 n 个 (symbol, exchange_a, exchange_b, spread, spread_pct)
+        """
+        flat = np.abs(self.spread_pct).ravel()
+        valid = np.flatnonzero(~np.isnan(flat))
+        if valid.size == 0:
+            return []
+        order = valid[np.argsort(flat[valid])[::-1][:n]]
+        n_pair = len(self.pairs)
+        result = []
+        for idx in order:
+            i, k = divmod(int(idx), n_pair)
+            a, b = self.pairs[k]
+            result.append((self.symbols[i], a, b, float(self.spread[i, k]), float(self.spread_pct[i, k])))
+        return result
+
+    def top_executable(self, n=10):
+        """
+        按可成交价差百分比从大到小返回前 n 个 (symbol, 卖出交易所, 买入交易所, edge, edge_pct)，
+        两个方向分别排序；edge > 0 表示按对手价同时成交即有正价差（未计手续费）
+        """
+        n_pair = len(self.pairs)
+        flat = np.concatenate((self.exec_ab_pct.ravel(), self.exec_ba_pct.ravel()))
+        valid = np.flatnonzero(~np.isnan(flat))
+        if valid.size == 0:
+            return []
+        order = valid[np.argsort(flat[valid])[::-1][:n]]
+        size = self.exec_ab_pct.size
+        result = []
+        for idx in order:
+            reverse, idx = divmod(int(idx), size)
+            i, k = divmod(idx, n_pair)
+            a, b = self.pairs[k]
+            if reverse:
+                result.append((self.symbols[i], b, a, float(self.exec_ba[i, k]), float(self.exec_ba_pct[i, k])))
+            else:
+                result.append((self.symbols[i], a, b, float(self.exec_ab[i, k]), float(self.exec_ab_pct[i, k])))
+        return result
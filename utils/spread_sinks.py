@@ -0,0 +1,64 @@
+import json
+import sys
+import time
+
+from utils.ticker_store import SPREAD_LATEST_KEY, spread_channel
+
+
+# 价差输出：每个 sink 都是 RedisTickerListener.add_spread_handler 可用的回调
+# handler(symbol, exchange_a, exchange_b, spread, spread_pct)，close() 在退出时调用
+
+
+def spread_record(symbol, exchange_a, exchange_b, spread, spread_pct):
+    return {"symbol": symbol, "a": exchange_a, "b": exchange_b, "spread": spread, "spread_pct": spread_pct,
+            "ts": round(time.time() * 1000, 3)}
+
+
+class StdoutSink:
+    """
+    每条价差一行 JSON 输出到 stdout，便于管道给其他程序
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def __call__(self, symbol, exchange_a, exchange_b, spread, spread_pct):
+        self.stream.write(json.dumps(spread_record(symbol, exchange_a, exchange_b, spread, spread_pct)) + "\n")
+
+    def close(self):
+        self.stream.flush()
+
+
+class RedisSink:
+    """
+    通过 BatchPublisher 批量发布到 spread:channel:<symbol>:<A>:<B>，同时写入 spread:latest hash
+    """
+    def __init__(self, publisher):
+        self.publisher = publisher
+
+    def __call__(self, symbol, exchange_a, exchange_b, spread, spread_pct):
+        record = json.dumps(spread_record(symbol, exchange_a, exchange_b, spread, spread_pct))
+        self.publisher.publish(spread_channel(symbol, exchange_a, exchange_b), record,
+                               latest=(SPREAD_LATEST_KEY, f"{symbol}:{exchange_a}:{exchange_b}"))
+
+    def close(self):
+        self.publisher.close()
+
+
+class FileSink:
+    """
+    追加写入 JSONL 文件；写入走缓冲区，最多每 flush_interval 秒落盘一次
+    """
+    def __init__(self, path, flush_interval=1.0):
+        self.file = open(path, 'a', encoding='utf-8', buffering=1024 * 1024)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+    def __call__(self, symbol, exchange_a, exchange_b, spread, spread_pct):
+        self.file.write(json.dumps(spread_record(symbol, exchange_a, exchange_b, spread, spread_pct)) + "\n")
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.file.flush()
+            self._last_flush = now
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,164 @@
+import time
+
+import redis
+
+from utils.ticker_store import ticker_channel, ticker_stream
+
+
+def ticker_streams(exchanges, symbols=None, per_symbol=False):
+    """
+    返回 {stream key: exchange}；per_symbol 需与生产端的 stream_per_symbol 一致
+    """
+    if not per_symbol:
+        return {ticker_stream(ex): ex for ex in exchanges}
+    return {ticker_stream(ex, sym): ex for ex in exchanges for sym in symbols or []}
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class StreamReader:
+    """
+    按批读取 ticker Redis Stream（生产端见 BatchPublisher 的 output='stream'）：
+    - group 为空时用 XREAD，每条流记住最后读到的 ID，断线重连后从该 ID 继续，不丢不重；
+      start 为首次读取的起点：'$' 只读新数据，'0' 从流中保留的最早一条开始
+    - group 不为空时用 XREADGROUP（消费组不存在则以 start 为起点创建），同组多个 consumer 分摊消息；
+      read() 返回的消息在 ack() 之前留在 pending 列表，重连后先重读本 consumer 未 ack 的消息；
+      ack 时 Redis 断开则保留这些 ID，之后的 read() / ack() 再重试
+    - 每次最多读 count 条，没有数据时阻塞 block_ms 毫秒
+    read() 返回 [(频道名, 负载, (stream, id)), ...]，频道名与 pubsub 模式一致，可直接交给 handle_tick
+    """
+    def __init__(self, rds, streams, group=None, consumer=None, count=500, block_ms=1000, start='$',
+                 reconnect_delay=1.0, logger=None):
+        self.rds = rds
+        self.exchanges = {_text(k): ex for k, ex in streams.items()}
+        self.group = group
+        self.consumer = consumer or f"consumer-{id(self):x}"
+        self.count = count
+        self.block_ms = block_ms
+        self.start = start
+        self.reconnect_delay = reconnect_delay
+        self.logger = logger
+        self.last_ids = {key: start for key in self.exchanges}
+        # 组模式下先从头读本 consumer 的 pending，读空后切到新消息（'>'）
+        self._backlog = True
+        self._pending_ids = {key: '0' for key in self.exchanges}
+        self._group_ready = False
+        self._resolved = False
+        # 最近一批中最后一条消息的 ID 时间（毫秒），用于估算消费延迟
+        self.last_id_ms = None
+        # 尚未成功 ack 的 (stream, id)
+        self._unacked = []
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.warning(msg)
+        else:
+            print(msg)
+
+    def _ensure_group(self):
+        for key in self.exchanges:
+            try:
+                self.rds.xgroup_create(key, self.group, id=self.start, mkstream=True)
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+        self._group_ready = True
+
+    def _resolve_start(self):
+        # '$' 只在一次 XREAD 内有效，先换成各流当前的最后一个 ID，之后每次都从确定的 ID 继续
+        for key, last_id in self.last_ids.items():
+            if last_id == '$':
+                tail = self.rds.xrevrange(key, count=1)
+                self.last_ids[key] = tail[0][0] if tail else '0-0'
+        self._resolved = True
+
+    def _xread(self):
+        if self.group is None:
+            if not self._resolved:
+                self._resolve_start()
+            return self.rds.xread(self.last_ids, count=self.count, block=self.block_ms)
+        if not self._group_ready:
+            self._ensure_group()
+        if self._backlog:
+            reply = self.rds.xreadgroup(self.group, self.consumer, self._pending_ids, count=self.count)
+            if any(entries for _, entries in reply or []):
+                for key, entries in reply:
+                    if entries:
+                        self._pending_ids[_text(key)] = entries[-1][0]
+                return reply
+            self._backlog = False
+        return self.rds.xreadgroup(self.group, self.consumer, {k: '>' for k in self.exchanges},
+                                   count=self.count, block=self.block_ms)
+
+    def read(self):
+        if self._unacked and not self.ack([]):
+            time.sleep(self.reconnect_delay)
+            return []
+        try:
+            reply = self._xread()
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self._log(f"[stream] Redis 连接异常: {e}，{self.reconnect_delay} 秒后从上次的 ID 继续读取")
+            # 重连后组模式先重读 pending，未 ack 的消息不会丢
+            self._backlog = True
+            self._pending_ids = {key: '0' for key in self.exchanges}
+            time.sleep(self.reconnect_delay)
+            return []
+        except redis.ResponseError as e:
+            if self.group is not None and 'NOGROUP' in str(e):
+                # 流或消费组被删除后重建
+                self._group_ready = False
+                return []
+            raise
+        items = []
+        for key, entries in reply or []:
+            key = _text(key)
+            exchange = self.exchanges.get(key)
+            for entry_id, fields in entries:
+                if not fields:
+                    # pending 中已被裁剪掉的消息只剩 ID，随下一次 ack 一起确认
+                    if self.group is not None:
+                        self._unacked.append((key, entry_id))
+                    continue
+                symbol = _text(fields.get(b'symbol', fields.get('symbol')))
+                payload = fields.get(b'data', fields.get('data'))
+                items.append((ticker_channel(exchange, symbol), payload, (key, entry_id)))
+            if entries:
+                last_id = entries[-1][0]
+                self.last_ids[key] = last_id
+                self.last_id_ms = int(_text(last_id).split('-', 1)[0])
+        return items
+
+    def ack(self, ids):
+        """
+        组模式下确认已处理的消息，ids 为 read() 返回的 (stream, id)；返回是否全部确认成功，
+        Redis 连接异常时 ID 留待下次重试（重连后这些消息也会作为 pending 被重读，消费端需容忍重复）
+        """
+        if self.group is None:
+            return True
+        ids = self._unacked + list(ids)
+        if not ids:
+            return True
+        by_stream = {}
+        for key, entry_id in ids:
+            by_stream.setdefault(key, []).append(entry_id)
+        try:
+            pipe = self.rds.pipeline(transaction=False)
+            for key, entry_ids in by_stream.items():
+                pipe.xack(key, self.group, *entry_ids)
+            pipe.execute()
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self._log(f"[stream] ack 失败: {e}，{len(ids)} 条消息稍后重试")
+            self._unacked = ids
+            return False
+        self._unacked = []
+        return True
+
+    def lag_ms(self):
+        """
+        最近读到的消息距现在的毫秒数（流 ID 的时间部分为 Redis 服务端写入时间）
+        """
+        if self.last_id_ms is None:
+            return None
+        return time.time() * 1000 - self.last_id_ms
@@ -0,0 +1,281 @@
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from utils.codec import TICK_V2, encode_binary
+from utils.ticker_store import ticker_channel
+
+
+# 同机共享内存行情总线：每个交易所一个文件 <tickbus_dir>/<exchange>.tickbus，只有一个写进程（该交易所的采集进程），
+# 文件内每个 symbol 一个定长槽位，保存最新一条 v2 二进制记录（见 utils/codec.py），读端按 seqlock 无锁读取。
+#
+# 文件头（64 字节）：
+#   8s  magic     TICKBUS_MAGIC
+#   I   version
+#   I   capacity  槽位数
+#   I   slot_size
+#   I   used      已分配的槽位数（槽位的 symbol 写好后才递增）
+#   Q   updates   累计写入次数，读端据此快速判断是否有新数据
+#   Q   created_ns
+# 槽位（128 字节）：
+#   Q   seq       写入前 +1（奇数表示正在写），写完再 +1
+#   24s symbol    ASCII，分配后不变
+#   96s 记录      TICK_V2
+TICKBUS_MAGIC = b'ARBTBUS1'
+TICKBUS_VERSION = 1
+TICKBUS_SUFFIX = '.tickbus'
+
+HEADER = struct.Struct('<8sIIIIQQ')
+HEADER_SIZE = 64
+_USED_OFFSET = 20
+_UPDATES_OFFSET = 24
+
+SLOT_SIZE = 128
+_SYMBOL_OFFSET = 8
+_SYMBOL_SIZE = 24
+_TICK_OFFSET = 32
+assert _TICK_OFFSET + TICK_V2.size <= SLOT_SIZE
+
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+SLOT_DTYPE = np.dtype([('seq', '<u8'), ('symbol', f'S{_SYMBOL_SIZE}'), ('tick', f'V{SLOT_SIZE - _SYMBOL_OFFSET - _SYMBOL_SIZE}')])
+assert SLOT_DTYPE.itemsize == SLOT_SIZE
+
+
+def bus_path(bus_dir, exchange):
+    return os.path.join(bus_dir, f"{exchange}{TICKBUS_SUFFIX}")
+
+
+def _read_header(mm):
+    magic, version, capacity, slot_size, used, updates, created_ns = HEADER.unpack_from(mm, 0)
+    if magic != TICKBUS_MAGIC or version != TICKBUS_VERSION or slot_size != SLOT_SIZE:
+        return None
+    return capacity, used, updates
+
+
+class _BusFile:
+    """
+    写端打开的一个交易所文件
+    """
+    def __init__(self, path, capacity):
+        self.path = path
+        self.mm = None
+        self.slots = {}
+        self.seqs = []
+        self.updates = 0
+        self.capacity = capacity
+        self._open()
+
+    def _open(self):
+        # 几何参数一致时沿用已有文件（写进程重启后读端不必重新映射），否则新建后原子替换
+        if os.path.exists(self.path) and os.path.getsize(self.path) == HEADER_SIZE + self.capacity * SLOT_SIZE:
+            with open(self.path, 'r+b') as f:
+                mm = mmap.mmap(f.fileno(), 0)
+            header = _read_header(mm)
+            if header is not None and header[0] == self.capacity:
+                self.mm = mm
+                _, used, self.updates = header
+                for i in range(used):
+                    off = HEADER_SIZE + i * SLOT_SIZE
+                    seq = _U64.unpack_from(mm, off)[0]
+                    if seq & 1:
+                        # 上一个写进程在写入中途退出
+                        seq += 1
+                        _U64.pack_into(mm, off, seq)
+                    self.seqs.append(seq)
+                    symbol = bytes(mm[off + _SYMBOL_OFFSET:off + _SYMBOL_OFFSET + _SYMBOL_SIZE]).rstrip(b'\0').decode()
+                    self.slots[symbol] = i
+                return
+            mm.close()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w+b') as f:
+            f.truncate(HEADER_SIZE + self.capacity * SLOT_SIZE)
+            mm = mmap.mmap(f.fileno(), 0)
+        HEADER.pack_into(mm, 0, TICKBUS_MAGIC, TICKBUS_VERSION, self.capacity, SLOT_SIZE, 0, 0, time.time_ns())
+        os.replace(tmp, self.path)
+        self.mm = mm
+
+    def slot(self, symbol):
+        i = self.slots.get(symbol)
+        if i is not None:
+            return i
+        i = len(self.slots)
+        name = symbol.encode('ascii')
+        if i >= self.capacity or len(name) > _SYMBOL_SIZE:
+            return None
+        off = HEADER_SIZE + i * SLOT_SIZE
+        self.mm[off + _SYMBOL_OFFSET:off + _SYMBOL_OFFSET + _SYMBOL_SIZE] = name.ljust(_SYMBOL_SIZE, b'\0')
+        self.seqs.append(0)
+        self.slots[symbol] = i
+        _U32.pack_into(self.mm, _USED_OFFSET, i + 1)
+        return i
+
+    def write(self, i, payload):
+        off = HEADER_SIZE + i * SLOT_SIZE
+        seq = self.seqs[i]
+        mm = self.mm
+        _U64.pack_into(mm, off, seq + 1)
+        mm[off + _TICK_OFFSET:off + _TICK_OFFSET + TICK_V2.size] = payload
+        _U64.pack_into(mm, off, seq + 2)
+        self.seqs[i] = seq + 2
+        self.updates += 1
+        _U64.pack_into(mm, _UPDATES_OFFSET, self.updates)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+
+class TickBusWriter:
+    """
+    共享内存总线写端，由 BatchPublisher.publish_ticker 在调用线程上直接写入（不经过发送队列）。
+    每个交易所文件只能有一个写进程、一个写线程；槽位写满或 symbol 超过 24 字节时该 symbol 不进总线（仍走 Redis）。
+    """
+    def __init__(self, bus_dir, capacity=4096, logger=None):
+        self.bus_dir = bus_dir
+        self.capacity = capacity
+        self.logger = logger
+        self._files = {}
+        self.written = 0
+        self.skipped = 0
+
+    def write(self, exchange, symbol, record):
+        bus = self._files.get(exchange)
+        if bus is None:
+            bus = self._files[exchange] = _BusFile(bus_path(self.bus_dir, exchange), self.capacity)
+        i = bus.slot(symbol)
+        if i is None:
+            if self.skipped == 0 and self.logger:
+                self.logger.warning(f"tickbus 槽位已满或 symbol 过长，{exchange}:{symbol} 不写入共享内存")
+            self.skipped += 1
+            return False
+        bus.write(i, encode_binary(exchange, symbol, record, version=2))
+        self.written += 1
+        return True
+
+    def close(self):
+        for bus in self._files.values():
+            bus.close()
+        self._files.clear()
+
+
+class _BusReader:
+    """
+    读端映射的一个交易所文件
+    """
+    def __init__(self, path, exchange):
+        self.path = path
+        self.exchange = exchange
+        self.mm = None
+        self.ino = None
+        self.slots = None
+        self.channels = []
+        self.seen = None
+        self.updates = None
+
+    def open(self):
+        try:
+            with open(self.path, 'rb') as f:
+                ino = os.fstat(f.fileno()).st_ino
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        header = _read_header(mm)
+        if header is None:
+            mm.close()
+            return False
+        self.close()
+        capacity = header[0]
+        self.mm, self.ino = mm, ino
+        self.slots = np.frombuffer(mm, dtype=SLOT_DTYPE, count=capacity, offset=HEADER_SIZE)
+        self.seen = np.zeros(capacity, dtype=np.uint64)
+        self.channels = []
+        self.updates = None
+        return True
+
+    def replaced(self):
+        try:
+            return os.stat(self.path).st_ino != self.ino
+        except OSError:
+            return False
+
+    def poll(self, out, spin=100):
+        mm = self.mm
+        updates = _U64.unpack_from(mm, _UPDATES_OFFSET)[0]
+        if updates == self.updates:
+            return
+        used = _U32.unpack_from(mm, _USED_OFFSET)[0]
+        for i in range(len(self.channels), used):
+            symbol = self.slots['symbol'][i].rstrip(b'\0').decode()
+            self.channels.append(ticker_channel(self.exchange, symbol))
+        seqs = self.slots['seq']
+        complete = True
+        for i in np.flatnonzero(seqs[:used] != self.seen[:used]).tolist():
+            off = HEADER_SIZE + i * SLOT_SIZE + _TICK_OFFSET
+            for _ in range(spin):
+                s1 = seqs[i]
+                if s1 & 1:
+                    continue
+                payload = mm[off:off + TICK_V2.size]
+                if seqs[i] == s1:
+                    self.seen[i] = s1
+                    out.append((self.channels[i], payload))
+                    break
+            else:
+                # 一直在被改写，下次 poll 再读
+                complete = False
+        if complete:
+            self.updates = updates
+
+    def close(self):
+        # 释放 numpy 视图后才能关闭 mmap
+        self.slots = None
+        self.seen = None
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+
+class TickBusReader:
+    """
+    共享内存总线读端：poll() 返回自上次调用以来有更新的 [(频道名, 96 字节 v2 记录), ...]，
+    频道名与 Redis 频道一致，可直接交给 RedisTickerListener.handle_tick。
+    每个 symbol 只保留最新值（两次 poll 之间的多次更新只返回最后一条）；写进程重建文件后自动重新映射。
+    """
+    def __init__(self, bus_dir, exchanges, reopen_interval=1.0):
+        self.readers = [_BusReader(bus_path(bus_dir, ex), ex) for ex in exchanges]
+        self.reopen_interval = reopen_interval
+        self._next_check = 0.0
+
+    def poll(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reopen_interval
+            for reader in self.readers:
+                if reader.mm is None or reader.replaced():
+                    reader.open()
+        out = []
+        for reader in self.readers:
+            if reader.mm is not None:
+                reader.poll(out)
+        return out
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+
+def build_tickbus_writer(config, logger=None):
+    """
+    config.yml 配置了 tickbus_dir 时创建写端，否则返回 None
+    """
+    bus_dir = config.get('tickbus_dir')
+    if not bus_dir:
+        return None
+    return TickBusWriter(bus_dir, capacity=config.get('tickbus_slots', 4096), logger=logger)
@@ -0,0 +1,106 @@
+import time
+
+from utils.codec import decode_record
+
+
+EXCHANGES = ['binance', 'bybit', 'okx', 'bitget']
+
+
+def receive_stamp():
+    """
+    收到一帧消息时的本地时间：recv_ms 为墙上时钟毫秒（与交易所时间 ts 同一时钟域，用于计算 交易所->收到 延迟），
+    recv_ns 为单调时钟纳秒（同机进程间可比，用于计算 收到->发布->消费 延迟）
+    """
+    return {"recv_ms": round(time.time() * 1000, 3), "recv_ns": time.monotonic_ns()}
+
+
+def ticker_channel(exchange, symbol):
+    return f"{exchange}:channel:ticker:{symbol}"
+
+
+def ticker_stream(exchange, symbol=None):
+    """
+    Redis Stream 输出模式的 key（见 utils/streams.py）：默认每个交易所一条流，symbol 不为空时每个 symbol 一条流
+    """
+    if symbol is None:
+        return f"{exchange}:stream:ticker"
+    return f"{exchange}:stream:ticker:{symbol}"
+
+
+def latest_key(exchange):
+    """
+    每个交易所一个 Redis hash：field 为 symbol，value 为最近一条 ticker 记录
+    """
+    return f"{exchange}:ticker:latest"
+
+
+def spread_channel(symbol, exchange_a, exchange_b):
+    """
+    价差输出频道（见 utils/spread_sinks.py），价差为 A - B
+    """
+    return f"spread:channel:{symbol}:{exchange_a}:{exchange_b}"
+
+
+# 各价差的最新值：field 为 '<symbol>:<A>:<B>'
+SPREAD_LATEST_KEY = "spread:latest"
+
+
+def bar_channel(interval, series):
+    """
+    已完成 K 线的发布频道（见 aggregator.py），series 为 '<exchange>:<symbol>' 或 'spread:<symbol>:<A>:<B>'
+    """
+    return f"bar:channel:{interval}s:{series}"
+
+
+def bar_latest_key(interval):
+    """
+    每个周期一个 hash：field 为 series，value 为最近一根已完成的 K 线
+    """
+    return f"bar:latest:{interval}s"
+
+
+def split_channel(channel):
+    """
+    'binance:channel:ticker:BTCUSDT' -> ('binance', 'BTCUSDT')
+    """
+    if isinstance(channel, bytes):
+        channel = channel.decode('utf-8')
+    exchange, _, _, symbol = channel.split(':', 3)
+    return exchange, symbol
+
+
+def load_latest(rds, exchange, symbols):
+    """
+    读取单个交易所若干 symbol 的最新记录，返回 {symbol: record}（没有缓存的 symbol 不出现）
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    values = rds.hmget(latest_key(exchange), symbols)
+    result = {}
+    for symbol, value in zip(symbols, values):
+        record = decode_record(value)
+        if record is not None:
+            result[symbol] = record
+    return result
+
+
+def load_snapshot(rds, exchanges=None):
+    """
+    一次 pipeline 读取所有交易所全部 symbol 的最新记录，返回 {exchange: {symbol: record}}
+    """
+    exchanges = list(exchanges or EXCHANGES)
+    pipe = rds.pipeline(transaction=False)
+    for exchange in exchanges:
+        pipe.hgetall(latest_key(exchange))
+    snapshot = {}
+    for exchange, values in zip(exchanges, pipe.execute()):
+        records = {}
+        for symbol, value in values.items():
+            if isinstance(symbol, bytes):
+                symbol = symbol.decode('utf-8')
+            record = decode_record(value)
+            if record is not None:
+                records[symbol] = record
+        snapshot[exchange] = records
+    return snapshot
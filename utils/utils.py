@@ -30,6 +30,16 @@ def load_symbols_from_yaml(path: str) -> list:
     return symbols
 
 
+def shard_symbols(symbols: list, limit: int) -> List[list]:
+    """
+    把 symbol 列表均匀分成 ceil(n / limit) 组，每组不超过 limit 个
+    """
+    if not symbols:
+        return []
+    k = -(-len(symbols) // limit)
+    return [symbols[i::k] for i in range(k)]
+
+
 def build_proxies(use_proxy: bool, proxy_host: Optional[str], proxy_port: Optional[int]) -> Optional[Dict[str, str]]:
     if use_proxy and proxy_host and proxy_port:
         proxy_url = f"http://{proxy_host}:{proxy_port}"